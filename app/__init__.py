@@ -1,10 +1,11 @@
 # app/__init__.py
 import os
+import hmac
 import uuid
 import time
 from datetime import timedelta
 
-from flask import Flask, g, request, current_app
+from flask import Flask, Response, abort, g, request, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect, generate_csrf
@@ -12,6 +13,13 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 
 from config import Config
 from .utils import get_text_color_for_bg
+from .zabbix_api import configure_zabbix_clients
+from .zabbix_cache import configure_zabbix_cache
+from .zabbix_async import configure_async_zabbix
+from .charting import configure_chart_service
+from .pdf_builder import configure_pdf_service
+from .capabilities import configure_capability_cache
+from .metrics import configure_metrics, metrics_enabled, metrics_token, render_metrics, HTTP_REQUEST_SECONDS
 
 # --- Extensões ---
 db = SQLAlchemy()
@@ -64,6 +72,21 @@ def create_app(config_class=Config):
 
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
+    # --- Sessões HTTP com o Zabbix (pool/keep-alive) e cache em disco ---
+    configure_zabbix_clients(app.config)
+    configure_async_zabbix(app.config)
+    configure_zabbix_cache(app.config)
+    configure_capability_cache(app.config)
+
+    # --- Serviço de gráficos (pool de processos para rasterização) ---
+    configure_chart_service(app.config)
+
+    # --- Renderização do PDF (miolo por seções em pool de processos) ---
+    configure_pdf_service(app.config)
+
+    # --- Métricas (Prometheus) ---
+    configure_metrics(app.config)
+
     # --- Inicializa extensões ---
     db.init_app(app)
     login_manager.init_app(app)
@@ -110,15 +133,21 @@ def create_app(config_class=Config):
     @app.after_request
     def _obs_after(response):
         try:
-            dt_ms = int((time.perf_counter() - getattr(g, "_t0", time.perf_counter())) * 1000)
+            elapsed = time.perf_counter() - getattr(g, "_t0", time.perf_counter())
+            dt_ms = int(elapsed * 1000)
+            # Rota (padrão da URL) em vez do path: mantém a cardinalidade das séries limitada
+            rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, endpoint=rule, status=response.status_code)
         except Exception:
             dt_ms = -1
+        # Em respostas em stream (SSE) calcular o tamanho consumiria o gerador inteiro
+        content_length = None if response.is_streamed else response.calculate_content_length()
         current_app.logger.debug(
             "RES | %s %s | status=%s | bytes=%s | t_ms=%s | rid=%s",
             request.method,
             request.path,
             response.status_code,
-            response.calculate_content_length(),
+            content_length,
             dt_ms,
             getattr(g, "request_id", "-")
         )
@@ -127,6 +156,18 @@ def create_app(config_class=Config):
         response.headers.setdefault("X-XSS-Protection", "1; mode=block")
         return response
 
+    # --- Endpoint de métricas (formato texto do Prometheus) ---
+    @app.route("/metrics")
+    def metrics():
+        # Sem login nesta rota: só é servida com METRICS_TOKEN configurado
+        token = metrics_token()
+        if not metrics_enabled() or not token:
+            abort(404)
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+            abort(403)
+        return Response(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
     @app.errorhandler(400)
     def _err_400(e):
         current_app.logger.warning("ERR400 | path=%s | rid=%s | %s", request.path, getattr(g, "request_id", "-"), e)
@@ -170,4 +211,6 @@ def create_app(config_class=Config):
             db.session.add(admin_user)
             db.session.commit()
 
+    # A fila de relatórios não é consumida aqui: quem sobe os workers é o ponto de entrada
+    # do servidor (gunicorn.conf.py ou run.py), não todo processo que cria a app.
     return app
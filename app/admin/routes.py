@@ -1,6 +1,7 @@
 # app/admin/routes.py
 import os
 import re
+import json
 import datetime as dt
 import uuid
 import logging
@@ -17,7 +18,7 @@ from . import admin
 from app import db
 from app.models import (
     User, Client, Report, SystemConfig, Role,
-    ClientZabbixGroup, AuditLog, MetricKeyProfile, CalculationType
+    ClientZabbixGroup, AuditLog, MetricKeyProfile, CalculationType, ReportTimeline
 )
 from flask_wtf import FlaskForm
 from wtforms import (
@@ -27,9 +28,11 @@ from wtforms import (
 from wtforms.validators import DataRequired, Length, NumberRange
 
 from app.services import AuditService
+from app.pdf_builder import invalidate_static_pdf_cache
+from app.capabilities import invalidate_client_capabilities
 # --- IMPORTAÇÃO CORRIGIDA ---
 # Importando as funções corretas do seu módulo zabbix_api.py
-from app.zabbix_api import obter_config_e_token_zabbix, get_host_groups, fazer_request_zabbix
+from app.zabbix_api import obter_config_e_token_zabbix, get_host_groups, new_zabbix_client
 from app.utils import admin_required, allowed_file
 from sqlalchemy.orm import joinedload
 
@@ -303,7 +306,7 @@ def edit_client(client_id):
     # GET - carrega grupos do Zabbix (best-effort)
     all_zabbix_groups = []
     try:
-        config, error = obter_config_e_token_zabbix(client.id)
+        config, error = obter_config_e_token_zabbix(current_app.config)
         if error:
             flash(f'Erro ao obter configuração do Zabbix: {error}', 'danger')
             _log_debug("Erro obter_config_e_token_zabbix", client_id=client.id, error=str(error))
@@ -338,6 +341,7 @@ def delete_client(client_id):
         ClientZabbixGroup.query.filter_by(client_id=client_id).delete()
         db.session.delete(client)
         db.session.commit()
+        invalidate_client_capabilities(client_id)
         AuditService.log(f'Excluiu o cliente: {client_name}')
         flash('Cliente excluído com sucesso!', 'success')
         _log_debug("Cliente excluído", client_id=client_id, name=client_name)
@@ -598,6 +602,8 @@ def customize():
         save_file_for_model(config, 'report_final_page_path', 'report_final_page')
 
         db.session.commit()
+        # Capa/página final novas: descarta os PDFs já processados deste processo
+        invalidate_static_pdf_cache()
         flash('Customizações salvas com sucesso!', 'success')
         return redirect(url_for('admin.customize'))
 
@@ -613,6 +619,31 @@ def audit_log():
     return render_template('admin/audit_log.html', title="Log de Auditoria", logs=logs)
 
 
+@admin.route('/timelines')
+@admin_required
+def list_timelines():
+    _ensure_request_id()
+    timelines = (ReportTimeline.query.options(joinedload(ReportTimeline.client))
+                 .order_by(ReportTimeline.created_at.desc()).limit(200).all())
+    _log_debug("Linhas do tempo listadas", count=len(timelines))
+    return render_template('admin/timelines.html', title="Desempenho das Gerações", timelines=timelines)
+
+
+@admin.route('/timeline/<int:timeline_id>')
+@admin_required
+def view_timeline(timeline_id):
+    _ensure_request_id()
+    timeline = ReportTimeline.query.get_or_404(timeline_id)
+    try:
+        data = json.loads(timeline.data) if timeline.data else {}
+    except ValueError:
+        data = {}
+    categories = sorted((data.get('categories') or {}).items(), key=lambda kv: kv[1].get('duration_ms', 0), reverse=True)
+    return render_template('admin/timeline_detail.html', title="Linha do Tempo da Geração",
+                           timeline=timeline, data=data, categories=categories,
+                           total_ms=data.get('total_ms') or timeline.total_ms or 0)
+
+
 # --- ROTA CORRIGIDA ---
 @admin.route('/test_zabbix', methods=['POST'])
 @admin_required
@@ -639,21 +670,30 @@ def test_zabbix():
             'params': {'username': data['zabbix_user'], 'password': data['zabbix_password']},
             'id': 1
         }
-        token = fazer_request_zabbix(login_body, zabbix_url)
-
-        if token and isinstance(token, dict) and 'error' in token:
-            error_details = token.get('details') or token.get('error') or 'Verifique as credenciais.'
-            _log_debug("Falha na autenticação do Zabbix", details=str(error_details))
-            return jsonify({'success': False, 'message': f'Falha na autenticação: {error_details}'})
-
-        if not token:
-            _log_debug("Token vazio/None retornado pelo Zabbix")
-            return jsonify({'success': False, 'message': 'Não foi possível obter token do Zabbix.'})
-
-        # Busca grupos com config temporária
-        config_temp = {'ZABBIX_TOKEN': token}
-        host_groups = get_host_groups(config_temp, zabbix_url) or []
-        _log_debug("test_zabbix grupos obtidos", count=len(host_groups))
+        # URL digitada pelo admin: cliente avulso, fechado ao fim do teste (não entra no cache por URL)
+        client = new_zabbix_client(zabbix_url)
+        try:
+            token = client.request(login_body)
+
+            if token and isinstance(token, dict) and 'error' in token:
+                error_details = token.get('details') or token.get('error') or 'Verifique as credenciais.'
+                _log_debug("Falha na autenticação do Zabbix", details=str(error_details))
+                return jsonify({'success': False, 'message': f'Falha na autenticação: {error_details}'})
+
+            if not token:
+                _log_debug("Token vazio/None retornado pelo Zabbix")
+                return jsonify({'success': False, 'message': 'Não foi possível obter token do Zabbix.'})
+
+            # Busca grupos com config temporária
+            config_temp = {'ZABBIX_TOKEN': token}
+            host_groups = get_host_groups(config_temp, zabbix_url, client=client) or []
+            _log_debug("test_zabbix grupos obtidos", count=len(host_groups))
+            # Sessão descartável do teste: encerra para não acumular sessões no Zabbix
+            client.request(
+                {'jsonrpc': '2.0', 'method': 'user.logout', 'params': [], 'auth': token, 'id': 1}, allow_retry=False
+            )
+        finally:
+            client.close()
 
         return jsonify({
             'success': True,
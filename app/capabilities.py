@@ -0,0 +1,144 @@
+# app/capabilities.py
+import re
+import time
+import logging
+import threading
+
+from .zabbix_api import obter_config_e_token_zabbix, get_zabbix_client
+
+# -----------------------------
+# Capacidades de cada cliente
+# -----------------------------
+#
+# Ao escolher um cliente no formulário, a tela precisa saber quais módulos fazem
+# sentido (há itens de ping? de CPU? de disco?) e quais interfaces de rede existem.
+# Uma única descoberta num só lote JSON-RPC (host.get, um item.get com limit 1 por
+# chave sondada e o item.get de net.if.in só com key_, para a lista de interfaces)
+# alimenta /get_available_modules e /get_client_interfaces;
+# o resultado fica em memória por CLIENT_CAPABILITY_TTL segundos e pode ser
+# refeito com ?refresh=1.
+#
+# A chave inclui os grupos do cliente: alterar os grupos no admin já invalida a entrada.
+
+# Chaves sondadas (busca por substring com limit 1, como o antigo check_key);
+# net.if.in é respondida pela busca das interfaces
+PROBE_KEYS = (
+    'icmpping',
+    'icmppingsec',
+    'icmppingloss',
+    'system.cpu.util',
+    'vm.memory.size[pused]',
+    'vm.memory.size[pavailable]',
+    'vfs.fs.size',
+    'net.if.in',
+)
+
+_CAPABILITY_DEFAULTS = {
+    'ttl': 600,
+}
+_CAPABILITIES = {}
+_CAPABILITIES_LOCK = threading.Lock()
+# Uma descoberta por chave de cache: requisições simultâneas esperam a primeira
+_DISCOVERY_LOCKS = {}
+
+_INTERFACE_RE = re.compile(r'\[(.*?)\]')
+
+
+class ClientCapabilities:
+    """Resultado da descoberta: hosts do cliente, chaves sondadas presentes e interfaces de rede."""
+    def __init__(self, hostids, present=None, interface_keys=()):
+        self.hostids = list(hostids)
+        self.present = {probe: bool((present or {}).get(probe)) for probe in PROBE_KEYS}
+        self.interfaces = sorted({m.group(1) for m in (_INTERFACE_RE.search(key) for key in interface_keys) if m})
+        self.fetched_at = time.time()
+
+    def has(self, probe):
+        return self.present.get(probe, False)
+
+    def is_fresh(self, ttl):
+        return time.time() - self.fetched_at < ttl
+
+
+def configure_capability_cache(app_config):
+    """Aplica a validade (CLIENT_CAPABILITY_TTL, segundos) e descarta o que já estava em memória."""
+    _CAPABILITY_DEFAULTS['ttl'] = int(app_config.get('CLIENT_CAPABILITY_TTL', _CAPABILITY_DEFAULTS['ttl']) or 0)
+    invalidate_client_capabilities()
+
+
+def invalidate_client_capabilities(client_id=None):
+    """Descarta as capacidades em cache (todas, ou só as do cliente informado)."""
+    with _CAPABILITIES_LOCK:
+        for key in [k for k in _CAPABILITIES if client_id is None or k[1] == client_id]:
+            del _CAPABILITIES[key]
+
+
+def _item_probe(token, group_ids, key, **params):
+    return {
+        'jsonrpc': '2.0',
+        'method': 'item.get',
+        'params': {'groupids': group_ids, 'search': {'key_': key}, **params},
+        'auth': token,
+    }
+
+
+def _discover(zabbix, token, group_ids):
+    # Tudo num único lote: host.get, uma sonda pequena por chave e as chaves net.if.in (interfaces)
+    probes = [probe for probe in PROBE_KEYS if probe != 'net.if.in']
+    results = zabbix.request_batch(
+        [{
+            'jsonrpc': '2.0',
+            'method': 'host.get',
+            'params': {'groupids': group_ids, 'output': ['hostid']},
+            'auth': token,
+        }]
+        + [_item_probe(token, group_ids, probe, output=['itemid'], limit=1) for probe in probes]
+        + [_item_probe(token, group_ids, 'net.if.in', output=['key_'])]
+    )
+    hosts, probe_results, interface_items = results[0], results[1:-1], results[-1]
+    if isinstance(hosts, dict) and 'error' in hosts:
+        return None, f"Falha ao buscar hosts: {hosts.get('details')}"
+    if not isinstance(hosts, list) or not hosts:
+        return ClientCapabilities([]), None
+    for items in probe_results + [interface_items]:
+        if isinstance(items, dict) and 'error' in items:
+            return None, f"Falha ao buscar itens: {items.get('details')}"
+    present = {probe: isinstance(items, list) and len(items) > 0 for probe, items in zip(probes, probe_results)}
+    interface_keys = [item['key_'] for item in interface_items] if isinstance(interface_items, list) else []
+    present['net.if.in'] = bool(interface_keys)
+    return ClientCapabilities([h['hostid'] for h in hosts], present, interface_keys), None
+
+
+def get_client_capabilities(client, app_config, refresh=False):
+    """
+    Capacidades do cliente (ClientCapabilities, erro). Só conecta ao Zabbix quando não
+    há entrada válida em cache ou quando refresh=True; erros não são guardados.
+    """
+    group_ids = sorted(g.group_id for g in client.zabbix_groups.all())
+    if not group_ids:
+        return ClientCapabilities([]), None
+
+    key = (app_config.get('ZABBIX_URL'), client.id, tuple(group_ids))
+    ttl = _CAPABILITY_DEFAULTS['ttl']
+    requested_at = time.time()
+    with _CAPABILITIES_LOCK:
+        lock = _DISCOVERY_LOCKS.setdefault(key, threading.Lock())
+    with lock:
+        with _CAPABILITIES_LOCK:
+            cached = _CAPABILITIES.get(key)
+        if cached is not None:
+            # Um refresh simultâneo já feito enquanto esperávamos serve também para este pedido
+            if (refresh and cached.fetched_at >= requested_at) or (not refresh and cached.is_fresh(ttl)):
+                return cached, None
+
+        config_zabbix, erro = obter_config_e_token_zabbix(app_config)
+        if erro:
+            return None, erro
+        zabbix = get_zabbix_client(config_zabbix['ZABBIX_URL'])
+        capabilities, erro = _discover(zabbix, config_zabbix['ZABBIX_TOKEN'], group_ids)
+        if erro:
+            logging.warning(f"[capabilities] Descoberta falhou para o cliente {client.id}: {erro}")
+            return None, erro
+        if ttl > 0:
+            with _CAPABILITIES_LOCK:
+                _CAPABILITIES[key] = capabilities
+        return capabilities, None
@@ -1,13 +1,437 @@
 # app/charting.py
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import matplotlib.style as mpl_style
+from matplotlib.artist import setp
+from matplotlib.figure import Figure
+import os
+import json
 import base64
+import hashlib
 from io import BytesIO
+from collections import OrderedDict
 import textwrap
+import time
 import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
 
+from .report_timeline import current_timeline
+from .metrics import CHART_RENDER_SECONDS, CHART_CACHE_HITS
+
+# -----------------------
+# Serviço de renderização
+# -----------------------
+#
+# Os coletores descrevem cada gráfico como um "spec" (dict com dados em listas simples
+# + estilo) e o serviço devolve os bytes do PNG. A rasterização roda num pool de
+# processos (CHART_RENDER_PROCESSES), fora do GIL das threads do relatório, e usa a
+# API orientada a objetos (Figure), sem o estado global do pyplot.
+#
+# Campos comuns do spec:
+#   kind         'barh' | 'multi_barh' | 'pie' | 'timeline'
+#   figsize, dpi tamanho da figura; save_dpi opcional (padrão: dpi da figura)
+#   title, title_fontsize, x_label, y_label
+#   subplots_adjust (dict) ou tight_layout_pad; bbox_inches (ex.: 'tight')
+#   style        estilo do matplotlib (padrão 'seaborn-v0_8-whitegrid')
+
+_CHART_DEFAULTS = {
+    'processes': 2,
+    'cache_enabled': True,
+    'cache_dir': os.path.join(os.getcwd(), 'chart_cache'),
+    'cache_memory_bytes': 64 * 1024 * 1024,
+    'cache_disk_bytes': 256 * 1024 * 1024,
+}
+_CACHE = None
+_POOL = None
+_POOL_LOCK = threading.Lock()
+# Sem pool, a renderização acontece na própria thread; estilos alteram rcParams globais
+_INLINE_RENDER_LOCK = threading.Lock()
+_DEFAULT_STYLE = 'seaborn-v0_8-whitegrid'
+
+
+def _apply_layout(fig, spec):
+    if spec.get('subplots_adjust'):
+        fig.subplots_adjust(**spec['subplots_adjust'])
+    elif spec.get('tight_layout_pad') is not None:
+        fig.tight_layout(pad=spec['tight_layout_pad'])
+
+
+def _set_title(ax, spec):
+    # fontsize=None faria o matplotlib usar o tamanho de texto padrão em vez do de título
+    kwargs = {'fontsize': spec['title_fontsize']} if spec.get('title_fontsize') else {}
+    ax.set_title(spec.get('title', ''), **kwargs)
+
+
+def _hide_spines(ax, spines):
+    for spine in spines or []:
+        ax.spines[spine].set_visible(False)
+
+
+def _draw_barh(fig, spec):
+    ax = fig.subplots()
+    wrap_width = spec.get('wrap_width')
+    labels = spec['labels']
+    if wrap_width:
+        labels = ['\n'.join(textwrap.wrap(str(label), width=wrap_width)) for label in labels]
+    bars = ax.barh(labels, spec['values'], color=spec.get('color'))
+
+    if spec.get('tick_fontsize'):
+        ax.tick_params(axis='y', labelsize=spec['tick_fontsize'])
+    if spec.get('x_label'):
+        ax.set_xlabel(spec['x_label'])
+    if spec.get('title'):
+        _set_title(ax, spec)
+    if spec.get('grid', True):
+        ax.grid(True, which='major', axis='x', linestyle='--', linewidth=0.5)
+    _hide_spines(ax, spec.get('hide_spines'))
+
+    value_labels = spec.get('value_labels')
+    if value_labels:
+        for bar in bars:
+            width = bar.get_width()
+            if value_labels.get('skip_zero') and not width > 0:
+                continue
+            try:
+                text = value_labels['fmt'].format(float(width))
+            except (TypeError, ValueError):
+                text = str(width)
+            ax.text(width * value_labels.get('offset', 1.0), bar.get_y() + bar.get_height() / 2, text,
+                    va='center', ha='left', fontsize=value_labels.get('fontsize'))
+
+
+def _draw_multi_barh(fig, spec):
+    ax = fig.subplots()
+    y = range(len(spec['labels']))
+    bar_height = spec.get('bar_height', 0.25)
+    for series, shift in zip(spec['series'], (-bar_height, 0, bar_height)):
+        ax.barh([i + shift for i in y], series['values'], height=bar_height, label=series['label'], color=series.get('color'))
+
+    ax.set_yticks(list(y))
+    ax.set_yticklabels(spec['labels'], fontsize=spec.get('tick_fontsize'))
+    ax.set_xlabel(spec.get('x_label', ''))
+    _set_title(ax, spec)
+    ax.grid(True, which='major', axis='x', linestyle='--', linewidth=0.5)
+    ax.legend()
+    _hide_spines(ax, spec.get('hide_spines'))
+
+
+def _draw_pie(fig, spec):
+    ax = fig.subplots()
+    wedges, texts, autotexts = ax.pie(
+        spec['sizes'],
+        labels=spec.get('wedge_labels'),
+        autopct=spec.get('autopct', '%1.1f%%'),
+        startangle=spec.get('startangle', 90),
+        colors=spec.get('colors'),
+        wedgeprops=spec.get('wedgeprops')
+    )
+    setp(autotexts, size=8, weight="bold", color="white")
+    if spec.get('wedge_labels'):
+        setp(texts, size=9)
+    ax.axis('equal')
+    legend = spec.get('legend')
+    if legend:
+        ax.legend(wedges, legend['labels'], title=legend.get('title'), loc=legend.get('loc', 'best'),
+                  bbox_to_anchor=legend.get('bbox_to_anchor'), fontsize=legend.get('fontsize'))
+
+
+def _draw_timeline(fig, spec):
+    ax = fig.subplots()
+    dates = pd.to_datetime(spec['dates'])
+    ax.bar(dates, spec['values'], color=spec.get('color'), width=0.8)
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=10, maxticks=31))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter(spec.get('date_format', '%d/%m')))
+    setp(ax.get_xticklabels(), rotation=45, ha='right')
+    ax.set_ylabel(spec.get('y_label', ''))
+    _set_title(ax, spec)
+    ax.grid(True, which='major', axis='y', linestyle='--', linewidth=0.5)
+    _hide_spines(ax, spec.get('hide_spines'))
+
+
+_RENDERERS = {
+    'barh': _draw_barh,
+    'multi_barh': _draw_multi_barh,
+    'pie': _draw_pie,
+    'timeline': _draw_timeline,
+}
+
+
+def render_chart_spec(spec):
+    """Desenha um spec e devolve os bytes do PNG (executado no processo do pool)."""
+    draw = _RENDERERS[spec['kind']]
+    with mpl_style.context(spec.get('style', _DEFAULT_STYLE)):
+        fig = Figure(figsize=spec.get('figsize', (10, 6)), dpi=spec.get('dpi', 100))
+        draw(fig, spec)
+        _apply_layout(fig, spec)
+        buffer = BytesIO()
+        fig.savefig(buffer, format='png', dpi=spec.get('save_dpi', 'figure'),
+                    transparent=True, bbox_inches=spec.get('bbox_inches'))
+    return buffer.getvalue()
+
+
+class ChartCache:
+    """
+    Cache endereçado por conteúdo dos PNGs renderizados: a chave é o hash do spec
+    normalizado (dados, título, cores, tamanho, dpi...). Regenerar o relatório do mesmo
+    cliente/mês só custa uma consulta de hash por gráfico.
+
+    Dois níveis, ambos LRU e limitados em bytes: memória (OrderedDict) e disco.
+    """
+    # Alterações no desenho dos gráficos devem incrementar a versão para invalidar o cache
+    VERSION = 1
+    SUFFIX = '.png'
+
+    def __init__(self, directory=None, memory_bytes=64 * 1024 * 1024, disk_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.memory_bytes = int(memory_bytes)
+        self.disk_bytes = int(disk_bytes)
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def key_for(cls, spec):
+        raw = json.dumps([cls.VERSION, matplotlib.__version__, spec], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.SUFFIX)
+
+    def _remember(self, key, png):
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= len(previous)
+            self._memory[key] = png
+            self._memory_size += len(png)
+            while self._memory_size > self.memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def get(self, key):
+        with self._lock:
+            png = self._memory.get(key)
+            if png is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return png
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as fh:
+                    png = fh.read()
+                os.utime(path)  # marca uso recente para a política LRU do disco
+            except OSError:
+                png = None
+            if png:
+                self._remember(key, png)
+                with self._lock:
+                    self.hits += 1
+                return png
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, png):
+        if not png:
+            return
+        self._remember(key, png)
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # pid + thread: workers do gunicorn compartilham o diretório e podem repetir o ident da thread
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as fh:
+                fh.write(png)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"[charting] Falha ao gravar gráfico no cache em disco: {e}")
+            return
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size += len(png)
+        self._evict_disk()
+
+    def _disk_entries(self):
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(self.SUFFIX):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def _evict_disk(self):
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = sum(size for _, size, _ in self._disk_entries())
+            if self._disk_size <= self.disk_bytes:
+                return
+            entries = sorted(self._disk_entries(), key=lambda e: e[2])
+            self._disk_size = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if self._disk_size <= self.disk_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    self._disk_size -= size
+                except OSError:
+                    pass
+
+
+def configure_chart_service(app_config):
+    """
+    Aplica o tamanho do pool de renderização (CHART_RENDER_PROCESSES; 0 = renderiza na
+    própria thread) e os limites do cache de gráficos (CHART_CACHE_*).
+    """
+    global _POOL, _CACHE
+    _CHART_DEFAULTS.update({
+        'processes': app_config.get('CHART_RENDER_PROCESSES', _CHART_DEFAULTS['processes']),
+        'cache_enabled': app_config.get('CHART_CACHE_ENABLED', _CHART_DEFAULTS['cache_enabled']),
+        'cache_dir': app_config.get('CHART_CACHE_DIR', _CHART_DEFAULTS['cache_dir']),
+        'cache_memory_bytes': app_config.get('CHART_CACHE_MEMORY_MB', _CHART_DEFAULTS['cache_memory_bytes'] // (1024 * 1024)) * 1024 * 1024,
+        'cache_disk_bytes': app_config.get('CHART_CACHE_DISK_MB', _CHART_DEFAULTS['cache_disk_bytes'] // (1024 * 1024)) * 1024 * 1024,
+    })
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
+        _CACHE = None
+
+
+def get_chart_cache():
+    """Cache de gráficos do processo, ou None se desabilitado."""
+    global _CACHE
+    if not _CHART_DEFAULTS['cache_enabled']:
+        return None
+    with _POOL_LOCK:
+        if _CACHE is None:
+            directory = _CHART_DEFAULTS['cache_dir'] if _CHART_DEFAULTS['cache_disk_bytes'] > 0 else None
+            try:
+                _CACHE = ChartCache(directory, _CHART_DEFAULTS['cache_memory_bytes'], _CHART_DEFAULTS['cache_disk_bytes'])
+            except OSError as e:
+                logging.error(f"[charting] Diretório do cache de gráficos indisponível, usando só memória: {e}")
+                _CACHE = ChartCache(None, _CHART_DEFAULTS['cache_memory_bytes'], 0)
+        return _CACHE
+
+
+def _get_pool():
+    global _POOL
+    processes = int(_CHART_DEFAULTS['processes'] or 0)
+    if processes <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            # 'spawn': o processo do app tem várias threads, fork herdaria locks em estado inconsistente
+            _POOL = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        return _POOL
+
+
+def _reset_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def _render_timed(spec):
+    """Renderiza no pool devolvendo também o tempo de rasterização (para a linha do tempo)."""
+    started = time.perf_counter()
+    png = render_chart_spec(spec)
+    return png, time.perf_counter() - started
+
+
+def _render_inline(spec):
+    with _INLINE_RENDER_LOCK:
+        return _render_timed(spec)
+
+
+def render_charts(specs):
+    """
+    Renderiza vários specs em paralelo no pool e devolve a lista de PNGs (bytes) na mesma ordem.
+    Specs já renderizados saem do cache; specs None resultam em None.
+    Se o pool quebrar, cai para a renderização na thread atual.
+    """
+    results = [None] * len(specs)
+    cache = get_chart_cache()
+    timeline = current_timeline()
+    keys = {}
+    pending = []
+    for i, spec in enumerate(specs):
+        if spec is None:
+            continue
+        if cache is not None:
+            started = time.perf_counter()
+            keys[i] = ChartCache.key_for(spec)
+            results[i] = cache.get(keys[i])
+            if results[i] is not None:
+                CHART_CACHE_HITS.inc()
+                if timeline is not None:
+                    timeline.record(_chart_label(spec), 'chart', started, time.perf_counter() - started,
+                                    cached=True, bytes=len(results[i]))
+                continue
+        pending.append((i, spec))
+    if not pending:
+        return results
+
+    rendered = None
+    started = time.perf_counter()
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            futures = [(i, pool.submit(_render_timed, spec)) for i, spec in pending]
+            rendered = [(i, future.result()) for i, future in futures]
+        except BrokenProcessPool as e:
+            logging.error(f"[charting] Pool de renderização indisponível, renderizando localmente: {e}")
+            _reset_pool()
+    if rendered is None:
+        rendered = [(i, _render_inline(spec)) for i, spec in pending]
+
+    for i, (png, seconds) in rendered:
+        results[i] = png
+        CHART_RENDER_SECONDS.observe(seconds)
+        if cache is not None:
+            cache.put(keys[i], png)
+        if timeline is not None:
+            # Início = envio do lote; duração = tempo de rasterização no processo do pool
+            timeline.record(_chart_label(specs[i]), 'chart', started, seconds, cached=False, bytes=len(png))
+    return results
+
+
+def _chart_label(spec):
+    title = spec.get('title') or ''
+    return f"{spec.get('kind')}: {title[:60]}" if title else str(spec.get('kind'))
+
+
+def render_chart(spec):
+    """Renderiza um único spec e devolve os bytes do PNG (ou None para spec None)."""
+    return render_charts([spec])[0]
+
+
+def png_to_base64(png):
+    return base64.b64encode(png).decode('utf-8') if png else None
+
+
+def render_chart_base64(spec):
+    """Atalho para os templates, que embutem o PNG como base64."""
+    return png_to_base64(render_chart(spec))
+
+
 # -----------------------
 # Utilitários internos
 # -----------------------
@@ -115,6 +539,7 @@ def _normalize_mem_dataframe(df):
     return out
 
 
+
 # -----------------------
 # API pública
 # -----------------------
@@ -125,51 +550,39 @@ def generate_chart(df, x_col, y_col, title, x_label, chart_color):
         logging.warning("[charting.generate_chart] DataFrame vazio - gráfico não será gerado.")
         return None
 
-    plt.style.use('seaborn-v0_8-whitegrid')
-    fig, ax = plt.subplots(figsize=(10, 8))
-
     try:
         df_sorted = df.sort_values(by=x_col, ascending=True)
     except Exception as e:
         logging.error(f"[charting.generate_chart] Falha ao ordenar por '{x_col}': {e}")
         df_sorted = df
 
-    y_labels = ['\n'.join(textwrap.wrap(str(label), width=50)) for label in df_sorted[y_col]]
-    bars = ax.barh(y_labels, df_sorted[x_col], color=chart_color)
-    font_size = 8 if len(y_labels) > 10 else 9
-
-    ax.tick_params(axis='y', labelsize=font_size)
-    ax.set_xlabel(x_label)
-    ax.set_title(title, fontsize=16)
-    ax.grid(True, which='major', axis='x', linestyle='--', linewidth=0.5)
-    for spine in ['top', 'right', 'left', 'bottom']:
-        ax.spines[spine].set_visible(False)
-
-    for bar in bars:
-        label_val = bar.get_width()
-        try:
-            label = f'{float(label_val):.2f}'
-        except Exception:
-            label = str(label_val)
-        ax.text(label_val, bar.get_y() + bar.get_height()/2, f' {label}', va='center', ha='left', fontsize=font_size - 1)
-
-    plt.subplots_adjust(left=0.45, right=0.95, top=0.9, bottom=0.1)
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', dpi=150, transparent=True)
-    plt.close(fig)
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-
-def generate_multi_bar_chart(df, title, x_label, colors):
+    font_size = 8 if len(df_sorted) > 10 else 9
+    return render_chart_base64({
+        'kind': 'barh',
+        'labels': [str(label) for label in df_sorted[y_col]],
+        'values': pd.to_numeric(df_sorted[x_col], errors='coerce').tolist(),
+        'wrap_width': 50,
+        'color': chart_color,
+        'figsize': (10, 8),
+        'save_dpi': 150,
+        'tick_fontsize': font_size,
+        'x_label': x_label,
+        'title': title,
+        'title_fontsize': 16,
+        'hide_spines': ['top', 'right', 'left', 'bottom'],
+        'value_labels': {'fmt': ' {:.2f}', 'fontsize': font_size - 1},
+        'subplots_adjust': {'left': 0.45, 'right': 0.95, 'top': 0.9, 'bottom': 0.1},
+    })
+
+
+def multi_bar_chart_spec(df, title, x_label, colors):
     """
-    Gera gráfico horizontal de barras múltiplas (Min/Avg/Max) para hosts.
+    Monta o spec do gráfico horizontal de barras múltiplas (Min/Avg/Max) por host.
 
     - Aceita DataFrame em vários formatos e normaliza para ['Host','Min','Avg','Max'].
     - Limita a quantidade de barras para evitar explosão visual e de memória.
-    - Retorna base64 do PNG, ou None se DF inválido.
+    - Retorna None se o DF for inválido.
     """
-    logging.info(f"Gerando gráfico: {title}...")
-
     if df is None or df.empty:
         logging.warning("[charting.generate_multi_bar_chart] DataFrame vazio - gráfico não será gerado.")
         return None
@@ -198,43 +611,35 @@ def generate_multi_bar_chart(df, title, x_label, colors):
 
     y_labels = ['\n'.join(textwrap.wrap(str(label), width=45)) for label in df_sorted['Host']]
 
-    plt.style.use('seaborn-v0_8-whitegrid')
-    fig, ax = plt.subplots(figsize=(12, max(8, len(df_sorted) * 0.4)))
-
-    y = range(len(df_sorted))
-    bar_height = 0.25
-
     # As colunas Min/Avg/Max podem eventualmente faltar — tratamos ausências
-    min_vals = df_sorted['Min'] if 'Min' in df_sorted.columns else pd.Series([None]*len(df_sorted))
-    avg_vals = df_sorted['Avg'] if 'Avg' in df_sorted.columns else pd.Series([None]*len(df_sorted))
-    max_vals = df_sorted['Max'] if 'Max' in df_sorted.columns else pd.Series([None]*len(df_sorted))
-
-    # Coerção final a numérico
-    min_vals = pd.to_numeric(min_vals, errors='coerce')
-    avg_vals = pd.to_numeric(avg_vals, errors='coerce')
-    max_vals = pd.to_numeric(max_vals, errors='coerce')
+    def _values(col):
+        vals = df_sorted[col] if col in df_sorted.columns else pd.Series([None] * len(df_sorted))
+        return pd.to_numeric(vals, errors='coerce').tolist()
 
-    # Barras
     c0 = colors[0] if len(colors) > 0 else None
     c1 = colors[1] if len(colors) > 1 else None
     c2 = colors[2] if len(colors) > 2 else None
 
-    ax.barh([i - bar_height for i in y], max_vals, height=bar_height, label='Máximo', color=c0)
-    ax.barh(y,                          avg_vals, height=bar_height, label='Médio',  color=c1)
-    ax.barh([i + bar_height for i in y], min_vals, height=bar_height, label='Mínimo', color=c2)
+    return {
+        'kind': 'multi_barh',
+        'labels': y_labels,
+        'series': [
+            {'values': _values('Max'), 'label': 'Máximo', 'color': c0},
+            {'values': _values('Avg'), 'label': 'Médio', 'color': c1},
+            {'values': _values('Min'), 'label': 'Mínimo', 'color': c2},
+        ],
+        'figsize': (12, max(8, len(df_sorted) * 0.4)),
+        'save_dpi': 150,
+        'tick_fontsize': 8 if len(y_labels) > 10 else 9,
+        'x_label': x_label,
+        'title': title,
+        'title_fontsize': 16,
+        'hide_spines': ['top', 'right', 'left', 'bottom'],
+        'subplots_adjust': {'left': 0.4, 'right': 0.95, 'top': 0.9, 'bottom': 0.1},
+    }
 
-    font_size = 8 if len(y_labels) > 10 else 9
-    ax.set_yticks(list(y))
-    ax.set_yticklabels(y_labels, fontsize=font_size)
-    ax.set_xlabel(x_label)
-    ax.set_title(title, fontsize=16)
-    ax.grid(True, which='major', axis='x', linestyle='--', linewidth=0.5)
-    ax.legend()
-    for spine in ['top', 'right', 'left', 'bottom']:
-        ax.spines[spine].set_visible(False)
 
-    plt.subplots_adjust(left=0.4, right=0.95, top=0.9, bottom=0.1)
-    buffer = BytesIO()
-    plt.savefig(buffer, format='png', dpi=150, transparent=True)
-    plt.close(fig)
-    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+def generate_multi_bar_chart(df, title, x_label, colors):
+    """Gera o gráfico de barras múltiplas (Min/Avg/Max) e retorna base64 do PNG, ou None se DF inválido."""
+    logging.info(f"Gerando gráfico: {title}...")
+    return render_chart_base64(multi_bar_chart_spec(df, title, x_label, colors))
@@ -18,6 +18,7 @@ class BaseCollector(ABC):
         self.config = generator_instance.config  # Configurações do Zabbix (URL, etc.)
         self.token = generator_instance.token    # Token da sessão Zabbix
         self.url = generator_instance.url        # URL da API Zabbix
+        self.zabbix = generator_instance.zabbix  # Cliente Zabbix compartilhado (sessão com pool)
         self.task_id = generator_instance.task_id # ID da tarefa para reportar status
 
     @abstractmethod
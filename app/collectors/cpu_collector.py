@@ -2,7 +2,6 @@
 import pandas as pd
 from .base_collector import BaseCollector
 # Novos imports:
-from app.zabbix_api import fazer_request_zabbix
 from app.charting import generate_multi_bar_chart
 
 class CpuCollector(BaseCollector):
@@ -54,18 +54,11 @@ class DiskCollector(BaseCollector):
         if not pused_items: return None, "Nenhum item de Disco ('vfs.fs.size[,pused]') encontrado."
         disk_trends = self.generator.get_trends([item['itemid'] for item in pused_items], period['start'], period['end'])
         if not disk_trends: return {'df_disk': pd.DataFrame()}, None
-        df_trends = pd.DataFrame(disk_trends)
-        df_trends[['value_min', 'value_avg', 'value_max']] = df_trends[['value_min', 'value_avg', 'value_max']].astype(float)
-        item_map = {item['itemid']: {'hostid': item['hostid'], 'name': item['name']} for item in pused_items}
-        df_trends['hostid'] = df_trends['itemid'].map(lambda x: item_map.get(x, {}).get('hostid'))
-        df_trends['fs_name'] = df_trends['itemid'].map(lambda x: item_map.get(x, {}).get('name'))
-        df_trends.dropna(subset=['hostid'], inplace=True)
-        agg_fs = df_trends.groupby(['hostid', 'fs_name']).agg(Avg=('value_avg', 'mean')).reset_index()
-        idx = agg_fs.groupby(['hostid'])['Avg'].transform(max) == agg_fs['Avg']
-        df_worst_fs = agg_fs[idx].drop_duplicates(subset=['hostid'])
-        final_data = []
-        for _, row in df_worst_fs.iterrows():
-            host_trends = df_trends[(df_trends['hostid'] == row['hostid']) & (df_trends['fs_name'] == row['fs_name'])]
-            if not host_trends.empty:
-                final_data.append({'Host': host_map.get(row['hostid']), 'Filesystem': row['fs_name'], 'Min': host_trends['value_min'].mean(), 'Max': host_trends['value_max'].mean(), 'Avg': host_trends['value_avg'].mean()})
+        # Pior filesystem (maior uso médio) de cada host
+        df_worst_fs = self.generator.aggregate_trends(disk_trends, pused_items, reducer='worst')
+        item_names = {int(item['itemid']): item['name'] for item in pused_items}
+        final_data = [
+            {'Host': host_map.get(row.hostid), 'Filesystem': item_names.get(row.itemid), 'Min': row.Min, 'Max': row.Max, 'Avg': row.Avg}
+            for row in df_worst_fs.itertuples(index=False)
+        ]
         return {'df_disk': pd.DataFrame(final_data)}, None
\ No newline at end of file
@@ -1,10 +1,5 @@
 # app/collectors/kpi_collector.py
-import base64
-from io import BytesIO
-import matplotlib
-matplotlib.use('Agg')  # Configura o Matplotlib para não usar interface gráfica
-import matplotlib.pyplot as plt
-
+from app.charting import render_chart_base64
 from .base_collector import BaseCollector
 
 class KpiCollector(BaseCollector):
@@ -38,31 +33,17 @@ class KpiCollector(BaseCollector):
         # Garante que temos cores para todas as labels, usando cinza como padrão
         colors = [color_map.get(label, '#BDBDBD') for label in labels]
 
-        plt.style.use('seaborn-v0_8-whitegrid')
-        fig, ax = plt.subplots(figsize=(10, 5), dpi=150)
-        
-        wedges, texts, autotexts = ax.pie(
-            sizes, 
-            labels=labels, 
-            autopct='%1.1f%%', 
-            startangle=140, 
-            colors=colors,
-            wedgeprops={'edgecolor': 'white', 'linewidth': 1}
-        )
-        
-        # Melhora a legibilidade dos textos
-        plt.setp(autotexts, size=8, weight="bold", color="white")
-        plt.setp(texts, size=9)
-        
-        ax.axis('equal')  # Garante que a pizza seja um círculo.
-        
-        # Salva o gráfico em um buffer de memória
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', transparent=True, bbox_inches='tight')
-        plt.close(fig)
-        
-        # Converte a imagem para base64
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        return render_chart_base64({
+            'kind': 'pie',
+            'sizes': sizes,
+            'wedge_labels': labels,
+            'colors': colors,
+            'startangle': 140,
+            'wedgeprops': {'edgecolor': 'white', 'linewidth': 1},
+            'figsize': (10, 5),
+            'dpi': 150,
+            'bbox_inches': 'tight',
+        })
 
     def collect(self, all_hosts, period, availability_data):
         """
@@ -12,7 +12,7 @@ class MemCollector(BaseCollector):
     - Usa Perfis de Métrica (tabela MetricKeyProfile) para decidir dinamicamente quais chaves buscar.
     - Padroniza o DataFrame final para colunas: ['Host', 'Min', 'Avg', 'Max'] (floats).
     - Acrescenta logs detalhados (debug) em todas as etapas.
-    - Otimiza volume: busca itens por perfil em lote (menos chamadas à API).
+    - Otimiza volume: os itens de todos os perfis vêm num único lote JSON-RPC.
     """
 
     def collect(self, all_hosts, period):
@@ -113,11 +113,13 @@ class MemCollector(BaseCollector):
             host_map = {h['hostid']: h['nome_visivel'] for h in all_hosts}
             host_ids = [h['hostid'] for h in all_hosts]
 
-            # 2) Encontrar 1 item por host seguindo a ordem de prioridade dos perfis (lote por perfil)
-            #    - Reduz drasticamente chamadas à API: em vez de 1 chamada por host+perfil, viram ~1 por perfil.
+            # 2) Encontrar 1 item por host seguindo a ordem de prioridade dos perfis
+            #    - Os item.get de todos os perfis vão num único lote JSON-RPC (1 ida ao Zabbix);
+            #      a prioridade é aplicada aqui, só sobre os hosts ainda não cobertos.
             items_to_fetch = []
             item_profile_map = {}   # itemid -> profile
             hosts_already_covered = set()
+            items_by_key = self.generator.get_items_by_keys(host_ids, [p.key_string for p in mem_key_profiles])
 
             for profile in mem_key_profiles:
                 remaining_hosts = [hid for hid in host_ids if hid not in hosts_already_covered]
@@ -125,11 +127,11 @@ class MemCollector(BaseCollector):
                     break
 
                 current_app.logger.debug(
-                    f"Módulo Memória [Dinâmico]: Buscando itens para {len(remaining_hosts)} hosts "
+                    f"Módulo Memória [Dinâmico]: Selecionando itens para {len(remaining_hosts)} hosts "
                     f"usando a chave '{profile.key_string}' (prioridade {profile.priority})."
                 )
-                # Busca todos os itens dessa key para os hosts restantes
-                items = self.generator.get_items(remaining_hosts, profile.key_string, search_by_key=True)
+                remaining = set(remaining_hosts)
+                items = [it for it in items_by_key.get(profile.key_string, []) if it.get('hostid') in remaining]
                 if not items:
                     continue
 
@@ -170,70 +172,42 @@ class MemCollector(BaseCollector):
             if not history:
                 return None, "Não foi possível obter o histórico de dados de memória para os itens encontrados."
 
-            # Agrupa trends por itemid para facilitar cálculo
-            hist_by_item = {}
-            for h in history:
-                iid = h.get('itemid')
-                if not iid:
-                    continue
-                hist_by_item.setdefault(iid, []).append(h)
+            # 4) Agrega por item (média de Avg, menor Min, maior Max) aplicando o cálculo do perfil (DIRECT/INVERSE)
+            inverse_ids = [
+                itemid for itemid, profile in item_profile_map.items()
+                if profile.calculation_type == CalculationType.INVERSE
+            ]
+            df_items = self.generator.aggregate_trends(
+                history, items_to_fetch, reducer='item', minmax='extreme', inverse=inverse_ids
+            )
+            stats_by_item = {
+                str(row.itemid): row for row in df_items.itertuples(index=False)
+            }
 
-            # 4) Processa dados aplicando o cálculo do perfil (DIRECT/INVERSE)
             mem_rows = []
             for item in items_to_fetch:
                 hid = item.get('hostid')
                 itemid = item.get('itemid')
-                item_history = hist_by_item.get(itemid, [])
+                stats = stats_by_item.get(itemid)
 
-                if not item_history:
+                if stats is None:
                     current_app.logger.warning(
                         f"Módulo Memória [Dinâmico]: Nenhum histórico para o item {itemid} "
                         f"do host {host_map.get(hid, hid)}."
                     )
                     continue
 
-                # Converte e agrega
-                try:
-                    avg_values = [float(h['value_avg']) for h in item_history]
-                    min_values = [float(h['value_min']) for h in item_history]
-                    max_values = [float(h['value_max']) for h in item_history]
-                except Exception as e:
-                    current_app.logger.warning(
-                        f"Módulo Memória [Dinâmico]: Histórico com valores inválidos para item {itemid} "
-                        f"(host {host_map.get(hid, hid)}): {e}"
-                    )
-                    continue
-
-                # Agregações
-                avg_val = sum(avg_values) / len(avg_values) if avg_values else None
-                min_val = min(min_values) if min_values else None
-                max_val = max(max_values) if max_values else None
-
-                profile = item_profile_map.get(itemid)
-                if profile and profile.calculation_type == CalculationType.INVERSE:
-                    # Inversão apropriada (com atenção aos extremos)
+                if itemid in inverse_ids:
                     current_app.logger.debug(
                         f"Aplicando cálculo INVERSO para o item {itemid} "
                         f"(Host: {host_map.get(hid, hid)})"
                     )
-                    if avg_val is not None:
-                        avg_val = 100 - avg_val
-                    if min_val is not None and max_val is not None:
-                        tmp_min = 100 - max_val
-                        max_val = 100 - min_val
-                        min_val = tmp_min
-                    else:
-                        # fallback simplificado quando faltarem extremos
-                        if min_val is not None:
-                            min_val = 100 - min_val
-                        if max_val is not None:
-                            max_val = 100 - max_val
 
                 mem_rows.append({
                     'Host': host_map.get(hid, f"Host ID {hid}"),
-                    'Min': float(min_val) if min_val is not None else None,
-                    'Avg': float(avg_val) if avg_val is not None else None,
-                    'Max': float(max_val) if max_val is not None else None
+                    'Min': float(stats.Min),
+                    'Avg': float(stats.Avg),
+                    'Max': float(stats.Max)
                 })
 
             if not mem_rows:
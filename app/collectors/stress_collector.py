@@ -1,13 +1,8 @@
 # app/collectors/stress_collector.py
 import pandas as pd
-import base64
-from io import BytesIO
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 import datetime as dt
 
+from app.charting import render_chart_base64
 from .base_collector import BaseCollector
 
 class StressCollector(BaseCollector):
@@ -20,44 +15,30 @@ class StressCollector(BaseCollector):
             return None
 
         # Garante que o índice é do tipo Datetime para manipulação correta
-        df.index = pd.to_datetime(df.index)
-
-        plt.style.use('seaborn-v0_8-whitegrid')
-        fig, ax = plt.subplots(figsize=(12, 6), dpi=100)
-
-        ax.bar(df.index, df['Ocorrências'], color='#2980b9', width=0.8)
-
-        # Formatando o eixo X para exibir as datas de forma inteligente
-        ax.xaxis.set_major_locator(mdates.AutoDateLocator(minticks=10, maxticks=31))
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d/%m'))
-        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
-
-        ax.set_ylabel('Nº de Novos Incidentes')
-        ax.set_title('Linha do Tempo de Incidentes (Estresse do Ambiente)')
-        ax.grid(True, which='major', axis='y', linestyle='--', linewidth=0.5)
-        for spine in ['top', 'right']:
-            ax.spines[spine].set_visible(False)
-
-        plt.tight_layout(pad=2)
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', transparent=True)
-        plt.close(fig)
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        dates = pd.to_datetime(df.index)
+
+        return render_chart_base64({
+            'kind': 'timeline',
+            'dates': [d.isoformat() for d in dates],
+            'values': df['Ocorrências'].astype(float).tolist(),
+            'color': '#2980b9',
+            'y_label': 'Nº de Novos Incidentes',
+            'title': 'Linha do Tempo de Incidentes (Estresse do Ambiente)',
+            'hide_spines': ['top', 'right'],
+            'figsize': (12, 6),
+            'dpi': 100,
+            'tight_layout_pad': 2,
+        })
 
     def collect(self, all_hosts, period, availability_data):
         self._update_status("Gerando Eletrocardiograma do Ambiente...")
 
-        df_incidents = availability_data.get('df_top_incidents', pd.DataFrame())
-        if df_incidents.empty or 'clock' not in df_incidents.columns:
+        problems = availability_data.get('problems')
+        if problems is None or not len(problems):
             return self.render('stress', {'grafico': None})
 
-        df_copy = df_incidents.copy()
-        
-        # Converte a coluna 'clock' para um formato de data legível
-        df_copy['event_date'] = pd.to_datetime(df_copy['clock'], unit='s').dt.date
-
-        # Agrupa os incidentes por dia e conta as ocorrências
-        incidents_per_day = df_copy.groupby('event_date')['Ocorrências'].sum()
+        # Agrupa os incidentes por dia (UTC) e conta as ocorrências
+        incidents_per_day = problems.count_by('day').set_index('Dia')['Ocorrências']
         
         # --- INÍCIO DA NOVA LÓGICA DE CALENDÁRIO COMPLETO ---
 
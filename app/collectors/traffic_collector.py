@@ -19,17 +19,15 @@ class TrafficCollector(BaseCollector):
         # Cria uma chave de cache para evitar buscar os mesmos dados duas vezes
         traffic_cache_key = f"traffic_data_{interfaces_key}"
 
-        # 2. Verifica se os dados já foram buscados e cacheados pelo gerador
-        if traffic_cache_key not in self.generator.cached_data:
+        # 2. Busca uma única vez por gerador (get_or_compute serializa Entrada/Saída rodando em
+        #    paralelo); o status é publicado só por quem de fato coleta
+        def _compute():
             self._update_status(f"Coletando dados de Tráfego para interfaces: {interfaces_key}...")
-            # Se não, busca os dados e armazena no cache
-            data, error_msg = self._collect_traffic_data(all_hosts, period, interfaces)
-            if error_msg:
-                return f"<p>Erro no módulo de Tráfego: {error_msg}</p>"
-            self.generator.cached_data[traffic_cache_key] = data
-        
-        # Pega os dados do cache
-        cached_traffic_data = self.generator.cached_data[traffic_cache_key]
+            return self._collect_traffic_data(all_hosts, period, interfaces)
+
+        cached_traffic_data, error_msg = self.generator.get_or_compute(traffic_cache_key, _compute)
+        if error_msg:
+            return f"<p>Erro no módulo de Tráfego: {error_msg}</p>"
         
         # 3. Decide qual DataFrame (Entrada ou Saída) e quais cores usar
         module_type = self.module_config.get('type')
@@ -81,18 +79,8 @@ class TrafficCollector(BaseCollector):
             
             if not traffic_trends: return pd.DataFrame(), None
             
-            df = pd.DataFrame(traffic_trends)
-            df[['value_min', 'value_avg', 'value_max']] = df[['value_min', 'value_avg', 'value_max']].astype(float)
-            
-            item_map = {item['itemid']: item['hostid'] for item in traffic_items}
-            df['hostid'] = df['itemid'].map(item_map)
-            df.dropna(subset=['hostid'], inplace=True)
-            
-            agg_functions = {'Min': ('value_min', 'sum'), 'Max': ('value_max', 'sum'), 'Avg': ('value_avg', 'sum')}
-            df_agg = df.groupby('hostid').agg(**agg_functions).reset_index()
-            
-            for col in ['Min', 'Max', 'Avg']: df_agg[col] = df_agg[col] * 8 / (1024 * 1024)
-            df_agg['Host'] = df_agg['hostid'].map(host_map)
+            df_agg = self.generator.aggregate_trends(traffic_trends, traffic_items, reducer='sum', scale=8 / (1024 * 1024))
+            df_agg = df_agg[['hostid', 'Min', 'Max', 'Avg']].assign(Host=lambda d: d['hostid'].map(host_map))
             return df_agg, None
         
         df_net_in, error_in = get_traffic_data("net.if.in")
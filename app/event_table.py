@@ -0,0 +1,224 @@
+# app/event_table.py
+import re
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------
+# Eventos em array estruturado (NumPy)
+# ---------------------------------
+#
+# Os eventos do event.get circulavam como listas de dicts de strings (~1 KB por
+# evento) e eram refiltrados/reordenados várias vezes na análise de
+# disponibilidade. A EventTable guarda cada evento em 48 bytes (ids e clock em
+# int64, severidade/valor/origem/objeto em int8 e o nome como índice numa lista
+# de nomes únicos) e oferece os filtros e agrupamentos usados por SLA, KPIs,
+# Top Hosts, Painel de Vilões e Eletrocardiograma.
+#
+# hostid fica em int64 (bigint no Zabbix); -1 indica evento sem host.
+
+EVENT_DTYPE = np.dtype([
+    ('eventid', np.int64),
+    ('clock', np.int64),
+    ('r_eventid', np.int64),
+    ('objectid', np.int64),
+    ('hostid', np.int64),
+    ('name', np.int32),
+    ('severity', np.int8),
+    ('value', np.int8),
+    ('source', np.int8),
+    ('object', np.int8),
+])
+_INT_FIELDS = ('eventid', 'clock', 'r_eventid', 'objectid', 'severity', 'value', 'source', 'object')
+
+# Rótulos das chaves de agrupamento (nomes de coluna já usados pelos módulos)
+GROUP_LABELS = {
+    'host': 'Host',
+    'name': 'Problema',
+    'day': 'Dia',
+    'clock': 'clock',
+    'severity': 'severity',
+    'hostid': 'hostid',
+}
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_problem_name(name):
+    """Mesmo tratamento do ReportGenerator._normalize_string (quebras de linha e espaços repetidos)."""
+    return _WHITESPACE_RE.sub(' ', str(name).replace('\n', ' ').replace('\r', ' ')).strip()
+
+
+class EventTable:
+    """
+    Eventos do Zabbix em um array estruturado (EVENT_DTYPE). Nomes de problema
+    ficam em `names` (um por nome distinto). `host_names` (hostid -> nome
+    visível) é definido por with_hosts() e alimenta o rótulo 'host'.
+    Iterar devolve dicts no formato do event.get, para código legado.
+    """
+    def __init__(self, records=None, names=None, host_names=None):
+        self.records = records if records is not None else np.zeros(0, dtype=EVENT_DTYPE)
+        self.names = names if names is not None else []
+        self.host_names = host_names
+
+    # --- Construção ---
+    @classmethod
+    def from_events(cls, events):
+        """A partir da lista de dicts do event.get (campos ausentes viram 0 / -1 no hostid)."""
+        events = events if isinstance(events, list) else list(events)
+        records = np.zeros(len(events), dtype=EVENT_DTYPE)
+        name_index = {}
+        names = []
+        for field in _INT_FIELDS:
+            records[field] = [int(e.get(field) or 0) for e in events]
+        records['hostid'] = [int(e['hosts'][0]['hostid']) if e.get('hosts') else -1 for e in events]
+        codes = []
+        for e in events:
+            name = e.get('name', '')
+            code = name_index.get(name)
+            if code is None:
+                code = name_index[name] = len(names)
+                names.append(name)
+            codes.append(code)
+        records['name'] = codes
+        return cls(records, names)
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [t for t in tables if t is not None]
+        if not tables:
+            return cls()
+        names, name_index, parts = [], {}, []
+        for table in tables:
+            # Reindexa os nomes de cada tabela na lista unificada
+            remap = np.empty(len(table.names), dtype=np.int32)
+            for code, name in enumerate(table.names):
+                unified = name_index.get(name)
+                if unified is None:
+                    unified = name_index[name] = len(names)
+                    names.append(name)
+                remap[code] = unified
+            records = table.records.copy()
+            if len(records):
+                records['name'] = remap[records['name']]
+            parts.append(records)
+        return cls(np.concatenate(parts), names, tables[0].host_names)
+
+    def _derive(self, records):
+        return EventTable(records, self.names, self.host_names)
+
+    # --- Acesso ---
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        for row in self.records:
+            event = {field: str(int(row[field])) for field in _INT_FIELDS}
+            event['name'] = self.names[row['name']] if self.names else ''
+            if row['hostid'] >= 0:
+                event['hosts'] = [{'hostid': str(int(row['hostid']))}]
+            yield event
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes
+
+    def column(self, field):
+        return self.records[field]
+
+    # --- Filtros ---
+    def where(self, mask):
+        return self._derive(self.records[np.asarray(mask, dtype=bool)])
+
+    def select(self, **equals):
+        """Filtra por igualdade em campos numéricos (ex.: select(source=0, value=0))."""
+        mask = np.ones(len(self.records), dtype=bool)
+        for field, value in equals.items():
+            mask &= self.records[field] == int(value)
+        return self.where(mask)
+
+    def with_hosts(self, hosts):
+        """Só eventos de hosts conhecidos; guarda hostid -> nome visível para o rótulo 'host'."""
+        host_names = {int(h['hostid']): h['nome_visivel'] for h in hosts}
+        known = np.fromiter(host_names, dtype=np.int64, count=len(host_names))
+        table = self._derive(self.records[np.isin(self.records['hostid'], known)])
+        table.host_names = host_names
+        return table
+
+    def sorted_by_clock(self):
+        return self._derive(self.records[np.argsort(self.records['clock'], kind='stable')])
+
+    def with_resolutions(self, resolved):
+        """Cópia com r_eventid preenchido para os eventids em `resolved` (eventid -> r_eventid)."""
+        records = self.records.copy()
+        if resolved and len(records):
+            current = records['r_eventid']
+            records['r_eventid'] = [resolved.get(int(e), int(r)) for e, r in zip(records['eventid'].tolist(), current.tolist())]
+        return self._derive(records)
+
+    def unique_events(self):
+        """Remove eventids repetidos (janelas sobrepostas), mantendo a primeira ocorrência."""
+        _, first = np.unique(self.records['eventid'], return_index=True)
+        return self._derive(self.records[np.sort(first)])
+
+    # --- Rótulos e agrupamentos ---
+    def _codes(self, key):
+        """(códigos por linha, rótulo de cada código), com a ordem dos códigos igual à dos rótulos."""
+        if key == 'host':
+            if self.host_names is None:
+                raise ValueError("Agrupamento por 'host' requer with_hosts().")
+            raw = self.records['hostid']
+            labels = sorted(set(self.host_names.values()))
+            rank = {label: index for index, label in enumerate(labels)}
+            hostids = np.fromiter(self.host_names, dtype=np.int64, count=len(self.host_names))
+            host_rank = np.array([rank[self.host_names[h]] for h in hostids.tolist()], dtype=np.int64)
+            order = np.argsort(hostids)
+            return host_rank[order][np.searchsorted(hostids[order], raw)], labels
+        if key == 'name':
+            normalized = [normalize_problem_name(name) for name in self.names]
+            labels = sorted(set(normalized))
+            rank = {label: index for index, label in enumerate(labels)}
+            name_rank = np.array([rank[n] for n in normalized], dtype=np.int64)
+            return name_rank[self.records['name']], labels
+        if key == 'day':
+            # Dia UTC do evento (mesmo resultado de pd.to_datetime(clock, unit='s').dt.date)
+            days = self.records['clock'] // 86400
+            return days, None
+        return self.records[key].astype(np.int64), None
+
+    def labels(self, key):
+        """Rótulo por evento: nome do host, nome do problema normalizado, dia (date) ou o valor do campo."""
+        codes, labels = self._codes(key)
+        return self._decode(key, codes, labels)
+
+    @staticmethod
+    def _decode(key, codes, labels):
+        if labels is not None:
+            return np.array(labels, dtype=object)[codes] if len(codes) else np.array([], dtype=object)
+        if key == 'day':
+            epoch = dt.date(1970, 1, 1)
+            return np.array([epoch + dt.timedelta(days=int(d)) for d in codes], dtype=object)
+        return codes
+
+    def count_by(self, *keys, sort=True):
+        """
+        Ocorrências por combinação de chaves ('host', 'name', 'day', 'clock',
+        'severity', 'hostid'), como groupby(...).size(): sort=True ordena pelos
+        rótulos; sort=False mantém a ordem da primeira ocorrência.
+        """
+        columns = [GROUP_LABELS.get(key, key) for key in keys] + ['Ocorrências']
+        if not len(self.records):
+            return pd.DataFrame(columns=columns)
+        decoded = [self._codes(key) for key in keys]
+        stacked = np.stack([codes for codes, _ in decoded], axis=1)
+        groups, first, counts = np.unique(stacked, axis=0, return_index=True, return_counts=True)
+        if not sort:
+            order = np.argsort(first, kind='stable')
+            groups, counts = groups[order], counts[order]
+        data = {
+            GROUP_LABELS.get(key, key): self._decode(key, groups[:, i], labels)
+            for i, (key, (_, labels)) in enumerate(zip(keys, decoded))
+        }
+        data['Ocorrências'] = counts.astype(np.int64)
+        return pd.DataFrame(data, columns=columns)
@@ -0,0 +1,343 @@
+# app/jobs.py
+import os
+import json
+import time
+import uuid
+import random
+import multiprocessing
+import socket
+import threading
+import traceback
+import datetime as dt
+
+from flask import current_app
+from sqlalchemy import update, func, or_, and_
+
+from . import db
+from .models import ReportJob, Client, User, SystemConfig
+from .services import ReportGenerator, REPORT_GENERATION_TASKS, TASK_PROGRESS, wait_for_progress
+from .zabbix_api import obter_config_e_token_zabbix
+from .metrics import REPORT_QUEUE_WAIT_SECONDS, REPORT_JOB_SECONDS
+
+# --- Fila persistente de geração de relatórios ---
+# Os pedidos ficam na tabela report_job; cada processo (ex.: worker do gunicorn) sobe
+# REPORT_WORKERS threads que disputam os jobs com um UPDATE condicional (state='queued'),
+# então qualquer processo pode responder ao status e jobs sobrevivem a reinícios.
+_WORKER_THREADS = []
+_WORKERS_PID = None  # processo dono das threads (após um fork elas não existem no filho)
+_WORKERS_LOCK = threading.Lock()
+_WAKEUP = threading.Event()
+
+
+def _utcnow():
+    return dt.datetime.utcnow()
+
+
+def enqueue_report_job(client_id, ref_month, user_id, report_layout_json, profile=False):
+    """Registra um novo pedido de geração e acorda os workers locais (profile: captura perfil de CPU)."""
+    job = ReportJob(
+        id=str(uuid.uuid4()),
+        client_id=int(client_id),
+        user_id=user_id,
+        reference_month=ref_month,
+        report_layout=report_layout_json,
+        zabbix_url=current_app.config.get('ZABBIX_URL'),
+        status='Na fila...',
+        profile=bool(profile)
+    )
+    db.session.add(job)
+    db.session.commit()
+    _WAKEUP.set()
+    return job
+
+
+def queue_position(job):
+    """Posição do job na fila (1 = próximo a ser executado); 0 se não está na fila."""
+    if job.state != 'queued':
+        return 0
+    ahead = ReportJob.query.filter(
+        ReportJob.state == 'queued',
+        ReportJob.created_at < job.created_at
+    ).count()
+    return ahead + 1
+
+
+def _job_progress(job):
+    try:
+        progress = json.loads(job.progress) if job.progress else {}
+    except ValueError:
+        progress = {}
+    progress.pop('started_at', None)
+    if job.state == 'done':
+        progress.update(phase='done', percent=100, eta_seconds=0)
+    return progress
+
+
+def job_status_payload(job):
+    """Resposta de /report_status (mantém o campo 'status' usado pelo front)."""
+    if job is None:
+        return {'status': 'Tarefa não encontrada.'}
+    payload = {'status': job.status, 'state': job.state, 'queue_position': queue_position(job),
+               'progress': _job_progress(job)}
+    if job.state == 'queued':
+        payload['status'] = f"Na fila (posição {payload['queue_position']})..."
+    elif job.state == 'done':
+        payload['status'] = 'Concluído'
+        payload['file_path'] = job.file_path
+    return payload
+
+
+def _sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def progress_event_stream(task_id):
+    """
+    Gerador do stream SSE de progresso de um job.
+
+    Se o job roda neste processo, cada update_status acorda o stream na hora (sem
+    tocar no banco); senão o estado vem do report_job a cada REPORT_JOB_POLL_SECONDS.
+    O stream termina quando o job acaba ou após REPORT_PROGRESS_STREAM_SECONDS: o
+    EventSource reconecta sozinho, o que evita prender um worker síncrono indefinidamente.
+    """
+    cfg = current_app.config
+    poll_seconds = float(cfg.get('REPORT_JOB_POLL_SECONDS', 2))
+    deadline = time.monotonic() + int(cfg.get('REPORT_PROGRESS_STREAM_SECONDS', 120))
+    last_seq, last_payload, last_sent_at = None, None, time.monotonic()
+
+    yield f"retry: {int(poll_seconds * 1000)}\n\n"
+    while time.monotonic() < deadline:
+        local = wait_for_progress(task_id, last_seq, timeout=poll_seconds)
+        if local is not None:
+            last_seq = local['seq']
+            progress = {k: v for k, v in local['progress'].items() if k != 'started_at'}
+            payload = {'status': local['status'], 'state': 'running', 'queue_position': 0, 'progress': progress}
+        else:
+            try:
+                payload = job_status_payload(db.session.get(ReportJob, task_id, populate_existing=True))
+            finally:
+                db.session.remove()  # não segura conexão do pool entre leituras
+
+        if payload != last_payload:
+            yield _sse_event('progress', {k: v for k, v in payload.items() if k != 'file_path'})
+            last_payload, last_sent_at = payload, time.monotonic()
+        elif time.monotonic() - last_sent_at >= 15:
+            yield ": keep-alive\n\n"
+            last_sent_at = time.monotonic()
+
+        if payload.get('state') in ('done', 'error') or 'state' not in payload:
+            yield _sse_event('end', {'state': payload.get('state'), 'status': payload.get('status')})
+            return
+        if local is None:
+            time.sleep(poll_seconds)
+
+
+def recover_interrupted_jobs():
+    """
+    Jobs 'running' sem heartbeat recente pertenciam a um processo que morreu
+    (restart/deploy): voltam para a fila ou, após REPORT_JOB_MAX_ATTEMPTS, viram erro.
+    """
+    cfg = current_app.config
+    cutoff = _utcnow() - dt.timedelta(seconds=int(cfg.get('REPORT_JOB_STALE_SECONDS', 300)))
+    max_attempts = int(cfg.get('REPORT_JOB_MAX_ATTEMPTS', 2))
+    stale_jobs = ReportJob.query.filter(
+        ReportJob.state == 'running',
+        or_(
+            ReportJob.heartbeat_at < cutoff,
+            and_(ReportJob.heartbeat_at.is_(None), ReportJob.started_at < cutoff)
+        )
+    ).all()
+    for job in stale_jobs:
+        if job.attempts >= max_attempts:
+            job.state = 'error'
+            job.status = "Erro: A geração foi interrompida repetidas vezes."
+            job.finished_at = _utcnow()
+        else:
+            job.state = 'queued'
+            job.status = 'Na fila (retomado após interrupção)...'
+            job.worker = None
+        current_app.logger.warning(f"[jobs] Job {job.id} interrompido recuperado -> {job.state}")
+    if stale_jobs:
+        db.session.commit()
+    return len(stale_jobs)
+
+
+def _running_count(zabbix_url):
+    return ReportJob.query.filter(ReportJob.state == 'running', ReportJob.zabbix_url == zabbix_url).count()
+
+
+def _claim_next_job(worker_name):
+    """Reserva o job mais antigo cujo servidor Zabbix ainda está abaixo do limite de gerações simultâneas."""
+    per_server_cap = int(current_app.config.get('REPORT_MAX_JOBS_PER_ZABBIX', 2) or 0)
+    candidates = ReportJob.query.filter_by(state='queued').order_by(ReportJob.created_at).limit(20).all()
+    running_by_url = dict(
+        db.session.query(ReportJob.zabbix_url, func.count(ReportJob.id))
+        .filter(ReportJob.state == 'running')
+        .group_by(ReportJob.zabbix_url)
+        .all()
+    )
+    for job in candidates:
+        if per_server_cap and running_by_url.get(job.zabbix_url, 0) >= per_server_cap:
+            continue
+        now = _utcnow()
+        result = db.session.execute(
+            update(ReportJob)
+            .where(ReportJob.id == job.id, ReportJob.state == 'queued')
+            .values(state='running', status='Iniciando...', worker=worker_name,
+                    started_at=now, heartbeat_at=now, attempts=ReportJob.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount != 1:
+            continue  # outro processo levou este job
+        # Outro processo pode ter ocupado a última vaga do servidor no mesmo instante
+        if per_server_cap and _running_count(job.zabbix_url) > per_server_cap:
+            db.session.execute(
+                update(ReportJob)
+                .where(ReportJob.id == job.id, ReportJob.worker == worker_name)
+                .values(state='queued', status='Na fila...', worker=None, attempts=ReportJob.attempts - 1)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return None
+        return job.id
+    return None
+
+
+def _finish_job(job_id, state, status, file_path=None):
+    db.session.execute(
+        update(ReportJob)
+        .where(ReportJob.id == job_id)
+        .values(state=state, status=status[:255], file_path=file_path, finished_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _heartbeat_loop(app, job_id, stop_event, interval):
+    with app.app_context():
+        while not stop_event.wait(interval):
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(
+                        ReportJob.__table__.update()
+                        .where(ReportJob.__table__.c.id == job_id)
+                        .values(heartbeat_at=_utcnow())
+                    )
+            except Exception as e:
+                current_app.logger.warning(f"[jobs] Falha ao registrar heartbeat do job {job_id}: {e}")
+
+
+def _generate_report(job):
+    """Executa a geração de um job. Retorna (pdf_path, erro)."""
+    client = db.session.get(Client, int(job.client_id))
+    author = db.session.get(User, job.user_id)
+    system_config = SystemConfig.query.first()
+    if not all([system_config, client, author]):
+        return None, "Dados inválidos."
+
+    config_zabbix, erro_zabbix_config = obter_config_e_token_zabbix(current_app.config, job.id)
+    if erro_zabbix_config:
+        return None, erro_zabbix_config
+
+    generator = ReportGenerator(config_zabbix, job.id)
+    return generator.generate(client, job.reference_month, system_config, author, job.report_layout, profile=job.profile)
+
+
+def _run_job(app, job_id):
+    stale_seconds = int(app.config.get('REPORT_JOB_STALE_SECONDS', 300))
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat_loop, args=(app, job_id, stop_heartbeat, max(5, min(30, stale_seconds // 3))),
+        name=f"report-heartbeat-{job_id[:8]}", daemon=True
+    )
+    with TASK_PROGRESS:
+        REPORT_GENERATION_TASKS[job_id] = {'status': 'Iniciando...', 'seq': 0}
+    heartbeat.start()
+    started = time.perf_counter()
+    state = 'error'
+    with app.app_context():
+        try:
+            job = db.session.get(ReportJob, job_id)
+            if job.started_at and job.created_at:
+                REPORT_QUEUE_WAIT_SECONDS.observe(max((job.started_at - job.created_at).total_seconds(), 0.0))
+            pdf_path, error = _generate_report(job)
+            if error:
+                _finish_job(job_id, 'error', f"Erro: {error}")
+            else:
+                _finish_job(job_id, 'done', "Concluído", file_path=pdf_path)
+                state = 'done'
+        except Exception:
+            db.session.rollback()
+            current_app.logger.error(f"Erro fatal na geração (Task ID: {job_id}):\n{traceback.format_exc()}")
+            _finish_job(job_id, 'error', "Erro: Falha crítica durante a geração.")
+        finally:
+            stop_heartbeat.set()
+            REPORT_JOB_SECONDS.observe(time.perf_counter() - started, state=state)
+            with TASK_PROGRESS:
+                REPORT_GENERATION_TASKS.pop(job_id, None)
+                TASK_PROGRESS.notify_all()
+            db.session.remove()
+
+
+def _worker_loop(app, index):
+    worker_name = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    poll_seconds = float(app.config.get('REPORT_JOB_POLL_SECONDS', 2))
+    # A recuperação já rodou em start_report_workers; depois, a cada meio REPORT_JOB_STALE_SECONDS
+    recovery_interval = max(poll_seconds, int(app.config.get('REPORT_JOB_STALE_SECONDS', 300)) / 2)
+    last_recovery = time.monotonic()
+    while True:
+        job_id = None
+        with app.app_context():
+            try:
+                if index == 0 and time.monotonic() - last_recovery >= recovery_interval:
+                    last_recovery = time.monotonic()
+                    recover_interrupted_jobs()
+                job_id = _claim_next_job(worker_name)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"[jobs] Falha ao consultar a fila ({worker_name}): {e}")
+            finally:
+                db.session.remove()
+        if job_id:
+            app.logger.info(f"[jobs] {worker_name} iniciou o job {job_id}")
+            _run_job(app, job_id)
+            continue
+        # Jitter evita que processos diferentes consultem a fila sempre no mesmo instante
+        if _WAKEUP.wait(poll_seconds + random.uniform(0, poll_seconds / 2)):
+            _WAKEUP.clear()
+
+
+def start_report_workers(app):
+    """
+    Sobe o pool de workers deste processo (REPORT_WORKERS threads; 0 desliga).
+
+    Chamado pelos pontos de entrada do servidor: o hook post_worker_init do
+    gunicorn.conf.py (em cada worker, após o fork) e o run.py em desenvolvimento.
+    Scripts, shells e o processo observador do reloader não consomem a fila.
+    """
+    global _WORKERS_PID
+    workers = int(app.config.get('REPORT_WORKERS', 2) or 0)
+    if workers <= 0 or app.config.get('TESTING'):
+        return
+    # Processos filhos (ex.: pool de gráficos com 'spawn' reimporta o módulo principal) não consomem a fila
+    if multiprocessing.parent_process() is not None:
+        return
+    with _WORKERS_LOCK:
+        if _WORKERS_PID != os.getpid():
+            _WORKER_THREADS.clear()  # threads herdadas de um fork (ex.: --preload) não rodam aqui
+        if _WORKER_THREADS:
+            return
+        _WORKERS_PID = os.getpid()
+        with app.app_context():
+            try:
+                recovered = recover_interrupted_jobs()
+                if recovered:
+                    app.logger.info(f"[jobs] {recovered} job(s) interrompido(s) recuperado(s) na inicialização.")
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"[jobs] Falha ao recuperar jobs interrompidos: {e}")
+        for index in range(workers):
+            thread = threading.Thread(target=_worker_loop, args=(app, index), name=f"report-worker-{index}", daemon=True)
+            thread.start()
+            _WORKER_THREADS.append(thread)
@@ -1,57 +1,27 @@
 # app/main/routes.py
 import os
 import json
-import uuid
-import threading
-import traceback
-import re
 import datetime as dt
 from flask import (render_template, redirect, url_for, send_file, 
-                   send_from_directory, g, jsonify, request, flash, current_app)
+                   send_from_directory, g, jsonify, request, flash, current_app,
+                   Response, stream_with_context)
 from flask_login import login_required, current_user
 
 from . import main
 from app import db
-from app.models import Client, Report, SystemConfig, User, ReportTemplate
+from app.models import Client, Report, SystemConfig, User, ReportTemplate, ReportJob
 
 # A importação foi dividida em duas para buscar cada função de seu arquivo de origem correto.
-from app.services import (ReportGenerator, update_status, 
-                          REPORT_GENERATION_TASKS, TASK_LOCK, AuditService)
-from app.zabbix_api import obter_config_e_token_zabbix, fazer_request_zabbix
+from app.services import ReportGenerator, AuditService
+from app.jobs import enqueue_report_job, queue_position, job_status_payload, progress_event_stream
+from app.zabbix_api import obter_config_e_token_zabbix
+from app.capabilities import get_client_capabilities
 
 
 @main.before_app_request
 def before_request_func():
     g.sys_config = SystemConfig.query.first()
 
-def run_generation_in_thread(app_context, task_id, client_id, ref_month, user_id, report_layout_json):
-    with app_context:
-        try:
-            client = db.session.get(Client, int(client_id))
-            author = db.session.get(User, user_id)
-            system_config = SystemConfig.query.first()
-            if not all([system_config, client, author]):
-                update_status(task_id, "Erro: Dados inválidos.")
-                return
-
-            config_zabbix, erro_zabbix_config = obter_config_e_token_zabbix(current_app.config, task_id)
-            if erro_zabbix_config:
-                update_status(task_id, f"Erro: {erro_zabbix_config}")
-                return
-
-            generator = ReportGenerator(config_zabbix, task_id)
-            pdf_path, error = generator.generate(client, ref_month, system_config, author, report_layout_json)
-            if error:
-                update_status(task_id, f"Erro: {error}")
-            else:
-                with TASK_LOCK:
-                    REPORT_GENERATION_TASKS[task_id]['file_path'] = pdf_path
-                    REPORT_GENERATION_TASKS[task_id]['status'] = "Concluído"
-        except Exception as e:
-            error_trace = traceback.format_exc()
-            current_app.logger.error(f"Erro fatal na thread (Task ID: {task_id}):\n{error_trace}")
-            update_status(task_id, "Erro: Falha crítica durante a geração.")
-
 # --- Rotas Principais do Usuário ---
 
 @main.route('/')
@@ -69,32 +39,41 @@ def gerar_form():
 @main.route('/gerar_relatorio', methods=['POST'])
 @login_required
 def gerar_relatorio():
-    task_id = str(uuid.uuid4())
-    with TASK_LOCK:
-        REPORT_GENERATION_TASKS[task_id] = {'status': 'Iniciando...'}
-    
     client_id = request.form.get('client_id')
     ref_month = request.form.get('mes_ref')
     report_layout_json = request.form.get('report_layout')
-    thread = threading.Thread(target=run_generation_in_thread, args=(current_app.app_context(), task_id, client_id, ref_month, current_user.id, report_layout_json))
-    thread.daemon = True
-    thread.start()
-    return jsonify({'task_id': task_id})
+    if not client_id or not ref_month:
+        return jsonify({'error': 'Cliente e mês de referência são obrigatórios.'}), 400
+    # Perfil de CPU (cProfile/pyinstrument) só sob demanda de administradores
+    profile = request.form.get('profile') == '1' and (current_user.has_role('admin') or current_user.has_role('super_admin'))
+    job = enqueue_report_job(client_id, ref_month, current_user.id, report_layout_json, profile=profile)
+    return jsonify({'task_id': job.id, 'queue_position': queue_position(job)})
 
 @main.route('/report_status/<task_id>')
 @login_required
 def report_status(task_id):
-    with TASK_LOCK:
-        task = REPORT_GENERATION_TASKS.get(task_id, {'status': 'Tarefa não encontrada.'})
-    return jsonify(task)
+    return jsonify(job_status_payload(db.session.get(ReportJob, task_id)))
+
+@main.route('/report_progress/<task_id>')
+@login_required
+def report_progress(task_id):
+    """Progresso da geração via Server-Sent Events (o /report_status continua como fallback)."""
+    # Worker síncrono (ex.: gunicorn -w 4 sem gthread) ficaria preso ao stream: 204 faz o
+    # EventSource desistir e o front volta para o polling
+    if not current_app.config.get('REPORT_PROGRESS_SSE', True) or not request.environ.get('wsgi.multithread'):
+        return Response(status=204)
+    return Response(
+        stream_with_context(progress_event_stream(task_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @main.route('/download_final_report/<task_id>')
 @login_required
 def download_final_report(task_id):
-    with TASK_LOCK:
-        task = REPORT_GENERATION_TASKS.get(task_id)
+    task = job_status_payload(db.session.get(ReportJob, task_id))
     
-    if not task or 'file_path' not in task:
+    if not task.get('file_path'):
         flash("Arquivo do relatório não encontrado ou a tarefa expirou.", "danger")
         return redirect(url_for('main.gerar_form'))
     
@@ -223,40 +202,17 @@ def get_available_modules(client_id):
         current_app.logger.debug(f"[get_available_modules] Cliente sem grupos (client_id={client_id})")
         return jsonify({'available_modules': []})
 
-    # CORREÇÃO: atributo correto é 'group_id' e precisamos .all() para materializar
-    group_ids = [g.group_id for g in client.zabbix_groups.all()]
-    
-    config_zabbix, erro = obter_config_e_token_zabbix(current_app.config)
+    # Descoberta única em cache (compartilhada com get_client_interfaces); ?refresh=1 refaz
+    capabilities, erro = get_client_capabilities(client, current_app.config, refresh=request.args.get('refresh') == '1')
     if erro:
         current_app.logger.error(f"Falha ao obter módulos para client_id {client_id}: {erro}")
         return jsonify({'error': f"Falha ao conectar ao Zabbix: {erro}", 'available_modules': []})
 
-    body = {
-        'jsonrpc': '2.0',
-        'method': 'host.get',
-        'params': {'groupids': group_ids, 'output': ['hostid']},
-        'auth': config_zabbix['ZABBIX_TOKEN'],
-        'id': 1
-    }
-    hosts = fazer_request_zabbix(body, config_zabbix['ZABBIX_URL'])
-    
-    if not isinstance(hosts, list) or not hosts:
-        current_app.logger.debug(f"[get_available_modules] Nenhum host retornado para grupos {group_ids}")
+    if not capabilities.hostids:
+        current_app.logger.debug(f"[get_available_modules] Nenhum host retornado para o cliente {client_id}")
         return jsonify({'available_modules': []})
 
-    hostids = [h['hostid'] for h in hosts]
-    
-    def check_key(key):
-        body_item = {
-            'jsonrpc': '2.0',
-            'method': 'item.get',
-            'params': {'output': 'itemid', 'hostids': hostids, 'search': {'key_': key}, 'limit': 1},
-            'auth': config_zabbix['ZABBIX_TOKEN'],
-            'id': 1
-        }
-        items = fazer_request_zabbix(body_item, config_zabbix['ZABBIX_URL'])
-        return isinstance(items, list) and len(items) > 0
-
+    check_key = capabilities.has
     available_modules = []
     
     if check_key('icmpping'):
@@ -286,7 +242,10 @@ def get_available_modules(client_id):
     available_modules.append({'type': 'inventory', 'name': 'Inventário de Hosts'})
     available_modules.append({'type': 'html', 'name': 'Texto/HTML Customizado'})
     
-    return jsonify({'available_modules': sorted(available_modules, key=lambda x: x['name'])})
+    return jsonify({
+        'available_modules': sorted(available_modules, key=lambda x: x['name']),
+        'checked_at': int(capabilities.fetched_at),
+    })
 
 @main.route('/get_client_interfaces/<int:client_id>')
 @login_required
@@ -297,50 +256,12 @@ def get_client_interfaces(client_id):
         current_app.logger.debug(f"[get_client_interfaces] Cliente sem grupos (client_id={client_id})")
         return jsonify({'interfaces': []})
 
-    # CORREÇÃO: atributo correto é 'group_id' e precisamos .all()
-    group_ids = [g.group_id for g in client.zabbix_groups.all()]
-    
-    config_zabbix, erro = obter_config_e_token_zabbix(current_app.config)
+    capabilities, erro = get_client_capabilities(client, current_app.config, refresh=request.args.get('refresh') == '1')
     if erro:
         current_app.logger.warning(f'Falha ao conectar ao Zabbix ao listar interfaces para o cliente {client_id}: {erro}')
         return jsonify({'interfaces': []})
 
-    body = {
-        'jsonrpc': '2.0',
-        'method': 'host.get',
-        'params': {'groupids': group_ids, 'output': ['hostid']},
-        'auth': config_zabbix['ZABBIX_TOKEN'],
-        'id': 1
-    }
-    hosts = fazer_request_zabbix(body, config_zabbix['ZABBIX_URL'])
-    
-    if not isinstance(hosts, list) or not hosts:
-        current_app.logger.debug(f"[get_client_interfaces] Nenhum host retornado para grupos {group_ids}")
-        return jsonify({'interfaces': []})
-
-    hostids = [h['hostid'] for h in hosts]
-    
-    body_item = {
-        'jsonrpc': '2.0', 
-        'method': 'item.get', 
-        'params': {
-            'output': ['key_'],
-            'hostids': hostids, 
-            'search': {'key_': 'net.if.in'}
-        }, 
-        'auth': config_zabbix['ZABBIX_TOKEN'], 
-        'id': 1
-    }
-    items = fazer_request_zabbix(body_item, config_zabbix['ZABBIX_URL'])
-
-    interfaces = set()
-    if isinstance(items, list):
-        for item in items:
-            match = re.search(r'\[(.*?)\]', item['key_'])
-            if match:
-                interfaces.add(match.group(1))
-
-    return jsonify({'interfaces': sorted(list(interfaces))})
+    return jsonify({'interfaces': capabilities.interfaces})
 
 
 # --- ROTA DE TESTE DE VALIDAÇÃO (TEMPORÁRIA) ---
@@ -366,13 +287,13 @@ def test_events(client_id, mes_ref):
     if erro:
         return jsonify({"erro": f"Falha ao conectar ao Zabbix: {erro}"}), 500
 
-    # CORREÇÃO: 'group_id' + materialização com .all()
-    group_ids = [g.group_id for g in client.zabbix_groups.all()]
-    body_hosts = {'jsonrpc': '2.0', 'method': 'host.get', 'params': {'groupids': group_ids, 'output': ['hostid']}, 'auth': config_zabbix['ZABBIX_TOKEN'], 'id': 1}
-    hosts = fazer_request_zabbix(body_hosts, config_zabbix['ZABBIX_URL'])
-    if not isinstance(hosts, list) or not hosts:
+    # Hosts do cliente vêm da descoberta de capacidades (em cache; sem host.get próprio)
+    capabilities, erro = get_client_capabilities(client, current_app.config)
+    if erro:
+        return jsonify({"erro": f"Falha ao conectar ao Zabbix: {erro}"}), 500
+    if not capabilities.hostids:
         return jsonify({"erro": "Nenhum host encontrado para este cliente"}), 404
-    all_host_ids = [h['hostid'] for h in hosts]
+    all_host_ids = capabilities.hostids
 
     # --- Coleta A: Método em Lote (Atual) ---
     periodo_lote = {
@@ -381,31 +302,31 @@ def test_events(client_id, mes_ref):
     }
     
     # Reutiliza a função de obter eventos do ReportGenerator
-    from app.services import ReportGenerator
+    from app.services import ReportGenerator, PROBLEM_EVENT_FILTER
     generator_instance = ReportGenerator(config_zabbix, "test_task")
     
-    eventos_lote = generator_instance.obter_eventos_wrapper(all_host_ids, periodo_lote, 'hostids')
-    problemas_lote = [p for p in eventos_lote if p.get('source') == '0' and p.get('object') == '0' and p.get('value') == '1']
+    problemas_lote = generator_instance.obter_eventos_wrapper(all_host_ids, periodo_lote, 'hostids', filtros=PROBLEM_EVENT_FILTER) or []
     total_lote = len(problemas_lote)
 
-    # --- Coleta B: Método Dia a Dia ---
-    total_diario = 0
-    dias_com_eventos = {}
+    # --- Coleta B: Método Dia a Dia (um event.get por dia, todos num único lote) ---
+    dias = []
     current_day = start_date
     while current_day.month == start_date.month:
         dia_inicio = current_day.replace(hour=0, minute=0, second=0)
         dia_fim = current_day.replace(hour=23, minute=59, second=59)
-        periodo_dia = {'start': int(dia_inicio.timestamp()), 'end': int(dia_fim.timestamp())}
-        
-        eventos_dia = generator_instance.obter_eventos_wrapper(all_host_ids, periodo_dia, 'hostids')
-        problemas_dia = [p for p in eventos_dia if p.get('source') == '0' and p.get('object') == '0' and p.get('value') == '1']
-        
+        dias.append((current_day, {'start': int(dia_inicio.timestamp()), 'end': int(dia_fim.timestamp())}))
+        current_day += dt.timedelta(days=1)
+
+    problemas_por_dia = generator_instance.obter_eventos_por_periodos(
+        all_host_ids, [periodo_dia for _, periodo_dia in dias], 'hostids', filtros=PROBLEM_EVENT_FILTER
+    )
+    total_diario = 0
+    dias_com_eventos = {}
+    for (dia, _), problemas_dia in zip(dias, problemas_por_dia):
         count_dia = len(problemas_dia)
         if count_dia > 0:
-            dias_com_eventos[current_day.strftime('%Y-%m-%d')] = count_dia
-        
+            dias_com_eventos[dia.strftime('%Y-%m-%d')] = count_dia
         total_diario += count_dia
-        current_day += dt.timedelta(days=1)
 
     # --- Resultados ---
     return jsonify({
@@ -0,0 +1,256 @@
+# app/metrics.py
+import math
+import logging
+import threading
+
+# -----------------------------
+# Métricas no formato Prometheus
+# -----------------------------
+#
+# Contadores e histogramas em memória do processo, expostos em /metrics no formato
+# texto do Prometheus (0.0.4) sem dependência extra, só para quem envia o METRICS_TOKEN.
+# Alimentados por:
+#   - ZabbixClient.request/request_batch: latência, bytes, erros e novas tentativas por método;
+#   - ZabbixTokenManager: reaproveitamento de sessões (hit x login/refresh);
+#   - fila de relatórios: espera na fila e duração do job;
+#   - linha do tempo da geração: duração por fase/módulo, tamanho e páginas do PDF;
+#   - charting: tempo de rasterização (matplotlib) e acertos do cache;
+#   - hooks _obs_before/_obs_after: latência HTTP por endpoint;
+#   - rz_debug.with_debug: agregados por função instrumentada.
+#
+# Cada processo (ex.: worker do gunicorn) tem o próprio registro: o Prometheus deve
+# coletar cada instância/processo, ou somar as séries no lado do servidor.
+
+_METRICS_DEFAULTS = {
+    'enabled': True,
+    'token': None,
+}
+
+_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+_BYTES_BUCKETS = tuple(1024 * 4 ** n for n in range(10))  # 1 KiB .. 256 MiB
+_PAGES_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class _Metric:
+    def __init__(self, name, help_text, kind, labelnames=(), buckets=None):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else None
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][index] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value)
+                     for key, value in self._values.items()]
+        for key, value in sorted(items):
+            labels = list(zip(self.labelnames, key))
+            if self.kind == 'counter':
+                yield self.name + '_total', labels, value
+                continue
+            for bound, count in zip(self.buckets, value['buckets']):
+                yield self.name + '_bucket', labels + [('le', _format_value(bound))], count
+            yield self.name + '_bucket', labels + [('le', '+Inf')], value['count']
+            yield self.name + '_sum', labels, value['sum']
+            yield self.name + '_count', labels, value['count']
+
+
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _register(name, help_text, kind, labelnames=(), buckets=None):
+    with _REGISTRY_LOCK:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = _Metric(name, help_text, kind, labelnames, buckets)
+        return metric
+
+
+def counter(name, help_text, labelnames=()):
+    return _register(name, help_text, 'counter', labelnames)
+
+
+def histogram(name, help_text, labelnames=(), buckets=_SECONDS_BUCKETS):
+    return _register(name, help_text, 'histogram', labelnames, buckets)
+
+
+# --- Zabbix ---
+ZABBIX_REQUEST_SECONDS = histogram('rz_zabbix_request_seconds', 'Latência das chamadas à API do Zabbix.', ('method',))
+ZABBIX_RESPONSE_BYTES = histogram('rz_zabbix_response_bytes', 'Tamanho das respostas da API do Zabbix.',
+                                  ('method',), _BYTES_BUCKETS)
+ZABBIX_ERRORS = counter('rz_zabbix_errors', 'Chamadas à API do Zabbix que terminaram em erro.', ('method', 'kind'))
+ZABBIX_RETRIES = counter('rz_zabbix_retries', 'Novas tentativas após erro 5xx do Zabbix.', ('method',))
+ZABBIX_COALESCED = counter('rz_zabbix_coalesced', 'Chamadas *.get idênticas atendidas por uma requisição já em voo.',
+                           ('method',))
+ZABBIX_BATCH_SIZE = histogram('rz_zabbix_batch_size', 'Chamadas empacotadas em cada lote JSON-RPC.',
+                              buckets=(2, 5, 10, 25, 50, 100, 250))
+ZABBIX_TOKEN_LOOKUPS = counter('rz_zabbix_token_lookups',
+                               'Obtenções de token do Zabbix por resultado (hit, login, refresh, api_token, error).',
+                               ('result',))
+
+# --- Fila / geração de relatórios ---
+REPORT_QUEUE_WAIT_SECONDS = histogram('rz_report_queue_wait_seconds', 'Tempo do job na fila até um worker assumi-lo.')
+REPORT_JOB_SECONDS = histogram('rz_report_job_seconds', 'Duração total do job de relatório.', ('state',))
+REPORT_PHASE_SECONDS = histogram('rz_report_phase_seconds',
+                                 'Duração de cada fase da geração (hosts, disponibilidade, xhtml2pdf, ...).', ('phase',))
+REPORT_MODULE_SECONDS = histogram('rz_report_module_seconds', 'Duração da coleta/renderização de cada módulo.', ('module',))
+REPORT_PDF_BYTES = histogram('rz_report_pdf_bytes', 'Tamanho do PDF final.', buckets=_BYTES_BUCKETS)
+REPORT_PDF_PAGES = histogram('rz_report_pdf_pages', 'Quantidade de páginas do PDF final.', buckets=_PAGES_BUCKETS)
+
+# --- Gráficos ---
+CHART_RENDER_SECONDS = histogram('rz_chart_render_seconds', 'Tempo de rasterização de um gráfico (matplotlib).')
+CHART_CACHE_HITS = counter('rz_chart_cache_hits', 'Gráficos servidos pelo cache sem renderizar.')
+
+# --- HTTP ---
+HTTP_REQUEST_SECONDS = histogram('rz_http_request_seconds', 'Latência das requisições HTTP por endpoint.',
+                                 ('method', 'endpoint', 'status'))
+
+# Fases da linha do tempo que viram rz_report_phase_seconds (o restante tem métrica própria)
+_PHASE_CATEGORIES = ('phase', 'html', 'pdf', 'merge')
+
+
+def configure_metrics(app_config):
+    """Liga/desliga o endpoint /metrics (METRICS_ENABLED) e define o token de acesso (METRICS_TOKEN, obrigatório)."""
+    _METRICS_DEFAULTS.update({
+        'enabled': app_config.get('METRICS_ENABLED', _METRICS_DEFAULTS['enabled']),
+        'token': app_config.get('METRICS_TOKEN') or None,
+    })
+    if _METRICS_DEFAULTS['enabled'] and not _METRICS_DEFAULTS['token']:
+        logging.info("[metrics] METRICS_TOKEN não definido; o endpoint /metrics não será servido.")
+
+
+def metrics_enabled():
+    return bool(_METRICS_DEFAULTS['enabled'])
+
+
+def metrics_token():
+    return _METRICS_DEFAULTS['token']
+
+
+def observe_zabbix_request(method, seconds, result, stats):
+    ZABBIX_REQUEST_SECONDS.observe(seconds, method=method)
+    if stats.get('bytes') is not None:
+        ZABBIX_RESPONSE_BYTES.observe(stats['bytes'], method=method)
+    if stats.get('retries'):
+        ZABBIX_RETRIES.inc(stats['retries'], method=method)
+    if result is None:
+        ZABBIX_ERRORS.inc(method=method, kind='HTTPError')
+    elif isinstance(result, dict) and 'error' in result:
+        ZABBIX_ERRORS.inc(method=method, kind=result['error'])
+
+
+def observe_zabbix_batch(methods, seconds, results, stats):
+    """Um lote conta como uma requisição (method="batch"); os erros são contados por método do lote."""
+    observe_zabbix_request('batch', seconds, [], stats)
+    ZABBIX_BATCH_SIZE.observe(len(methods))
+    for method, result in zip(methods, results):
+        if result is None:
+            ZABBIX_ERRORS.inc(method=method, kind='HTTPError')
+        elif isinstance(result, dict) and 'error' in result:
+            ZABBIX_ERRORS.inc(method=method, kind=result['error'])
+
+
+def observe_generation(timeline_data):
+    """Converte a linha do tempo de uma geração em observações por fase/módulo e do PDF final."""
+    for span in timeline_data.get('spans', []):
+        seconds = span['duration_ms'] / 1000.0
+        category = span['category']
+        if category in _PHASE_CATEGORIES:
+            REPORT_PHASE_SECONDS.observe(seconds, phase=span['name'])
+        elif category == 'collector':
+            REPORT_MODULE_SECONDS.observe(seconds, module=span['name'])
+        if span['name'] == 'save' and category == 'merge':
+            if span.get('bytes') is not None:
+                REPORT_PDF_BYTES.observe(span['bytes'])
+            if span.get('pages') is not None:
+                REPORT_PDF_PAGES.observe(span['pages'])
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return str(value)
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_sample(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{key}="{_escape_label(str(val))}"' for key, val in labels)
+        return f"{name}{{{rendered}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+def _debug_metrics():
+    """Agregados do rz_debug.with_debug (módulo da raiz; ausente quando o app roda embutido)."""
+    try:
+        from rz_debug import debug_stats
+    except ImportError:
+        return []
+    stats = debug_stats()
+    if not stats:
+        return []
+    lines = [
+        '# HELP rz_debug_calls_total Chamadas das funções instrumentadas com with_debug.',
+        '# TYPE rz_debug_calls_total counter',
+    ]
+    lines += [_format_sample('rz_debug_calls_total', [('fn', fn)], s['calls']) for fn, s in sorted(stats.items())]
+    lines += [
+        '# HELP rz_debug_errors_total Exceções das funções instrumentadas com with_debug.',
+        '# TYPE rz_debug_errors_total counter',
+    ]
+    lines += [_format_sample('rz_debug_errors_total', [('fn', fn)], s['errors']) for fn, s in sorted(stats.items())]
+    lines += [
+        '# HELP rz_debug_seconds_total Tempo acumulado das funções instrumentadas com with_debug.',
+        '# TYPE rz_debug_seconds_total counter',
+    ]
+    lines += [_format_sample('rz_debug_seconds_total', [('fn', fn)], s['seconds']) for fn, s in sorted(stats.items())]
+    lines += [
+        '# HELP rz_debug_max_seconds Maior duração observada das funções instrumentadas com with_debug.',
+        '# TYPE rz_debug_max_seconds gauge',
+    ]
+    lines += [_format_sample('rz_debug_max_seconds', [('fn', fn)], s['max_seconds']) for fn, s in sorted(stats.items())]
+    return lines
+
+
+def render_metrics():
+    """Texto no formato de exposição do Prometheus com todas as métricas registradas."""
+    lines = []
+    with _REGISTRY_LOCK:
+        metrics = list(_REGISTRY.values())
+    for metric in metrics:
+        exposed_name = metric.name + '_total' if metric.kind == 'counter' else metric.name
+        lines.append(f"# HELP {exposed_name} {metric.help}")
+        lines.append(f"# TYPE {exposed_name} {metric.kind}")
+        lines.extend(_format_sample(name, labels, value) for name, labels, value in metric.samples())
+    lines.extend(_debug_metrics())
+    return '\n'.join(lines) + '\n'
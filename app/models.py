@@ -89,6 +89,44 @@ class Report(db.Model):
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
     report_type = db.Column(db.String(50), default='custom', nullable=False)
 
+class ReportJob(db.Model):
+    """Fila persistente de geração de relatórios (compartilhada entre processos/workers)."""
+    __tablename__ = 'report_job'
+    id = db.Column(db.String(36), primary_key=True)  # task_id exposto ao front
+    state = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued | running | done | error
+    status = db.Column(db.String(255), nullable=False, default='Na fila...')  # mensagem exibida ao usuário
+    progress = db.Column(db.Text, nullable=True)  # JSON: phase, module_index/module_total, percent, eta_seconds
+    profile = db.Column(db.Boolean, nullable=False, default=False)  # captura perfil de CPU (cProfile/pyinstrument)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    reference_month = db.Column(db.String(7), nullable=False)
+    report_layout = db.Column(db.Text, nullable=True)
+    zabbix_url = db.Column(db.String(255), nullable=True, index=True)
+    file_path = db.Column(db.String(255), nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=dt.datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+class ReportTimeline(db.Model):
+    """Linha do tempo (spans por etapa) e perfil opcional de cada geração, concluída ou não."""
+    __tablename__ = 'report_timeline'
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('report.id'), nullable=True, index=True)
+    job_id = db.Column(db.String(36), nullable=True, index=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=True)
+    reference_month = db.Column(db.String(7), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='done')  # done | error
+    error = db.Column(db.String(255), nullable=True)
+    total_ms = db.Column(db.Float, nullable=True)
+    data = db.Column(db.Text, nullable=True)  # JSON: total_ms, categories, spans
+    profile = db.Column(db.Text, nullable=True)  # saída do cProfile/pyinstrument (texto)
+    created_at = db.Column(db.DateTime, default=dt.datetime.utcnow, index=True)
+    report = db.relationship('Report', backref=db.backref('timeline', uselist=False))
+    client = db.relationship('Client')
+
 class AuditLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
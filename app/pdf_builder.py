@@ -1,57 +1,287 @@
 # app/pdf_builder.py
 import os
+import re
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from flask import current_app
 from xhtml2pdf import pisa
 from PyPDF2 import PdfWriter, PdfReader, errors as PyPDF2Errors
 from io import BytesIO
+from reportlab.lib.colors import HexColor
+from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
+
+# -------------------------------
+# Renderização do miolo por seções
+# -------------------------------
+#
+# Com PDF_RENDER_PROCESSES > 0 o miolo é dividido em seções (a cada módulo com
+# newPage, ou a cada módulo com PDF_SECTION_MODE=module); cada seção vira um PDF
+# próprio num pool de processos e as páginas são unidas na ordem do layout.
+# Como cada seção numera as próprias páginas, o rodapé "Página N de M" é carimbado
+# depois da união, sobre o corpo inteiro.
+
+_PDF_DEFAULTS = {
+    'processes': 2,
+    'section_mode': 'newpage',
+}
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+# Posição do rodapé do _MIOLO_BASE.html (footer_frame: right 1.5cm, bottom 1cm, height 1cm, 9pt #555)
+_FOOTER_RIGHT = 1.5 * cm + 1  # o pisa reserva 1pt de respiro na borda direita do frame
+_FOOTER_BASELINE = 2 * cm - 7.46  # topo do frame menos o ascendente da Helvetica 9pt (medido no PDF do pisa)
+_FOOTER_FONT = ('Helvetica', 9)
+_FOOTER_COLOR = HexColor('#555555')
+
+# Toda seção já começa em página nova: a quebra do primeiro módulo geraria uma página em branco
+_LEADING_PAGE_BREAK = re.compile(r'^(\s*<div class="report-module-instance")\s*style="page-break-before: always;"')
+
+
+def configure_pdf_service(app_config):
+    """Aplica o tamanho do pool de renderização do miolo (PDF_RENDER_PROCESSES; 0 = uma única chamada ao pisa)."""
+    global _POOL
+    _PDF_DEFAULTS.update({
+        'processes': app_config.get('PDF_RENDER_PROCESSES', _PDF_DEFAULTS['processes']),
+        'section_mode': app_config.get('PDF_SECTION_MODE', _PDF_DEFAULTS['section_mode']),
+    })
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
+
+
+def section_rendering_enabled():
+    return int(_PDF_DEFAULTS['processes'] or 0) > 0
+
+
+def split_report_sections(html_parts, modules):
+    """
+    Agrupa os HTMLs dos módulos (mesma ordem de `modules`) em seções independentes.
+    PDF_SECTION_MODE=newpage: nova seção a cada módulo com newPage (layout idêntico ao miolo único).
+    PDF_SECTION_MODE=module: uma seção por módulo (mais paralelismo; cada módulo começa em página nova).
+    """
+    per_module = _PDF_DEFAULTS['section_mode'] == 'module'
+    sections = []
+    for html_part, module_config in zip(html_parts, modules):
+        if not sections or per_module or module_config.get('newPage'):
+            sections.append([])
+        sections[-1].append(html_part)
+    if not sections:
+        return []  # layout vazio: o chamador segue pelo miolo único
+    joined = ["".join(parts) for parts in sections]
+    return [joined[0]] + [_LEADING_PAGE_BREAK.sub(r'\1', html) for html in joined[1:]]
+
+
+def render_html_to_pdf(html_content):
+    """Executa o pisa sobre um HTML completo. Retorna (bytes do PDF, quantidade de erros)."""
+    buffer = BytesIO()
+    pisa_status = pisa.CreatePDF(BytesIO(html_content.encode('UTF-8')), dest=buffer)
+    return buffer.getvalue(), pisa_status.err
+
+
+def _get_pool():
+    global _POOL
+    processes = int(_PDF_DEFAULTS['processes'] or 0)
+    if processes <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            # 'spawn': o processo do app tem várias threads, fork herdaria locks em estado inconsistente
+            _POOL = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        return _POOL
+
+
+def _reset_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def render_sections(html_sections):
+    """
+    Gera (bytes, erros) de cada seção na ordem do layout, assim que cada uma fica pronta,
+    para que o chamador anexe e descarte o PDF parcial. Sem pool (ou se ele quebrar),
+    as seções restantes são renderizadas na thread atual.
+    """
+    futures = []
+    pool = _get_pool()
+    if pool is not None:
+        try:
+            futures = [pool.submit(render_html_to_pdf, html) for html in html_sections]
+        except BrokenProcessPool as e:
+            logging.error(f"[pdf_builder] Pool de renderização indisponível, renderizando localmente: {e}")
+            _reset_pool()
+            futures = []
+    try:
+        for index, html in enumerate(html_sections):
+            if index < len(futures):
+                try:
+                    yield futures[index].result()
+                    futures[index] = None
+                    continue
+                except BrokenProcessPool as e:
+                    logging.error(f"[pdf_builder] Pool de renderização indisponível, renderizando localmente: {e}")
+                    _reset_pool()
+                    futures = []
+            yield render_html_to_pdf(html)
+    finally:
+        # Chamador desistiu (erro numa seção): não desperdiça o pool com as demais
+        for future in futures:
+            if future is not None:
+                future.cancel()
+
+
+def _page_number_overlay(footer_label, page_sizes):
+    """PDF com o rodapé 'Gerado em … | Página N de M' de cada página, para mesclar sobre o corpo."""
+    buffer = BytesIO()
+    overlay = canvas.Canvas(buffer)
+    total = len(page_sizes)
+    for number, (width, height) in enumerate(page_sizes, start=1):
+        overlay.setPageSize((width, height))
+        overlay.setFont(*_FOOTER_FONT)
+        overlay.setFillColor(_FOOTER_COLOR)
+        overlay.drawRightString(width - _FOOTER_RIGHT, _FOOTER_BASELINE, f"{footer_label} | Página {number} de {total}")
+        overlay.showPage()
+    overlay.save()
+    return PdfReader(BytesIO(buffer.getvalue()))
+
+
+# --- Capa / página final pré-processadas ---
+# Os PDFs enviados em admin.customize costumam ser pesados (fontes e imagens embutidas).
+# Cada processo faz o parse uma única vez e reaproveita o PdfReader em todas as montagens;
+# a entrada é refeita quando o arquivo muda (mtime/tamanho) ou após um novo upload.
+_STATIC_PDFS = {}
+_STATIC_PDFS_LOCK = threading.Lock()
+
+
+class _StaticPdf:
+    def __init__(self, signature, reader):
+        self.signature = signature
+        self.reader = reader
+        # O PdfReader resolve objetos sob demanda no mesmo stream: uma montagem por vez
+        self.lock = threading.Lock()
+
+
+def _static_pdf(full_path):
+    """PdfReader em cache para o arquivo; lança PdfReadError se o arquivo for inválido."""
+    key = os.path.realpath(full_path)
+    st = os.stat(key)
+    signature = (st.st_mtime_ns, st.st_size)
+    with _STATIC_PDFS_LOCK:
+        entry = _STATIC_PDFS.get(key)
+    if entry is not None and entry.signature == signature:
+        return entry
+    with open(key, "rb") as f:
+        reader = PdfReader(BytesIO(f.read()))
+    for page in reader.pages:
+        page.mediabox  # força o parse das páginas fora do lock de montagem
+    entry = _StaticPdf(signature, reader)
+    with _STATIC_PDFS_LOCK:
+        _STATIC_PDFS[key] = entry
+    return entry
+
+
+def invalidate_static_pdf_cache(full_path=None):
+    """Descarta a capa/página final em cache (todas, ou só a do caminho informado)."""
+    with _STATIC_PDFS_LOCK:
+        if full_path is None:
+            _STATIC_PDFS.clear()
+        else:
+            _STATIC_PDFS.pop(os.path.realpath(full_path), None)
+
 
 class PDFBuilder:
+    """
+    Monta capa + miolo + página final num PdfWriter em memória. O miolo é renderizado
+    direto em buffers (sem arquivo temporário) e anexado página a página; o arquivo
+    final é gravado uma única vez, por um stream com buffer.
+    """
+    WRITE_BUFFER_SIZE = 1024 * 1024
+
     def __init__(self, task_id):
         self.task_id = task_id
         self.merger = PdfWriter()
-        self.temp_miolo_path = os.path.join(current_app.config['GENERATED_REPORTS_FOLDER'], f"temp_miolo_{self.task_id}.pdf")
         self.uploads_folder = os.path.join(current_app.root_path, '..', current_app.config['UPLOAD_FOLDER'])
 
-    def add_cover_page(self, cover_path):
-        if cover_path:
-            full_path = os.path.join(self.uploads_folder, cover_path)
+    def _append_pdf(self, stream, error_message):
+        try:
+            self.merger.append(PdfReader(stream))
+        except PyPDF2Errors.PdfReadError:
+            return error_message
+        return None
+
+    def _append_static_pdf(self, relative_path, error_message):
+        if relative_path:
+            full_path = os.path.join(self.uploads_folder, relative_path)
             if os.path.exists(full_path):
                 try:
-                    with open(full_path, "rb") as f:
-                        self.merger.append(PdfReader(f))
+                    entry = _static_pdf(full_path)
+                    with entry.lock:
+                        self.merger.append(entry.reader)
                 except PyPDF2Errors.PdfReadError:
-                    return "Arquivo de capa corrompido ou inválido."
+                    invalidate_static_pdf_cache(full_path)
+                    return error_message
         return None
 
+    def add_cover_page(self, cover_path):
+        return self._append_static_pdf(cover_path, "Arquivo de capa corrompido ou inválido.")
+
     def add_miolo_from_html(self, html_content):
-        with open(self.temp_miolo_path, "w+b") as pdf_file:
-            pisa_status = pisa.CreatePDF(BytesIO(html_content.encode('UTF-8')), dest=pdf_file)
+        buffer = BytesIO()
+        pisa_status = pisa.CreatePDF(BytesIO(html_content.encode('UTF-8')), dest=buffer)
         if pisa_status.err:
             return f"Falha ao gerar PDF do conteúdo: {pisa_status.err}"
-        try:
-            with open(self.temp_miolo_path, "rb") as f:
-                self.merger.append(PdfReader(f))
-        except PyPDF2Errors.PdfReadError:
-            return "Ocorreu um erro interno ao gerar o corpo do relatório."
+        buffer.seek(0)
+        return self._append_pdf(buffer, "Ocorreu um erro interno ao gerar o corpo do relatório.")
+
+    def add_miolo_from_sections(self, html_sections, footer_label):
+        """
+        Renderiza cada seção (HTML completo, sem numeração no rodapé) em paralelo,
+        anexa as páginas na ordem conforme ficam prontas e carimba
+        'footer_label | Página N de M' sobre o corpo.
+        """
+        first_page = len(self.merger.pages)
+        for pdf_bytes, err in render_sections(html_sections):
+            if err:
+                return f"Falha ao gerar PDF do conteúdo: {err}"
+            error = self._append_pdf(BytesIO(pdf_bytes), "Ocorreu um erro interno ao gerar o corpo do relatório.")
+            if error:
+                return error
+
+        body_pages = self.merger.pages[first_page:]
+        page_sizes = [(float(p.mediabox.width), float(p.mediabox.height)) for p in body_pages]
+        overlay = _page_number_overlay(footer_label, page_sizes)
+        for page, footer in zip(body_pages, overlay.pages):
+            page.merge_page(footer)
         return None
 
     def add_final_page(self, final_page_path):
-        if final_page_path:
-            full_path = os.path.join(self.uploads_folder, final_page_path)
-            if os.path.exists(full_path):
-                try:
-                    with open(full_path, "rb") as f:
-                        self.merger.append(PdfReader(f))
-                except PyPDF2Errors.PdfReadError:
-                    return "Arquivo de página final corrompido ou inválido."
-        return None
+        return self._append_static_pdf(final_page_path, "Arquivo de página final corrompido ou inválido.")
 
     def save_and_cleanup(self, final_pdf_path):
+        """
+        Grava o PDF numa única passada (arquivo .part renomeado ao final, para que um
+        download nunca encontre o relatório pela metade) e libera o writer.
+        """
         absolute_path = os.path.join(current_app.root_path, '..', final_pdf_path)
-        with open(absolute_path, "wb") as f:
-            self.merger.write(f)
+        partial_path = f"{absolute_path}.part"
         try:
-            os.remove(self.temp_miolo_path)
-        except OSError as e:
-            current_app.logger.warning(f"Não foi possível remover arquivo temporário: {e}")
-        return absolute_path
\ No newline at end of file
+            with open(partial_path, "wb", buffering=self.WRITE_BUFFER_SIZE) as f:
+                self.merger.write(f)
+            os.replace(partial_path, absolute_path)
+        except OSError:
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            self.merger.close()
+            self.merger = PdfWriter()
+        return absolute_path
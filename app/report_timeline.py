@@ -0,0 +1,192 @@
+# app/report_timeline.py
+import io
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from .zabbix_async import get_async_client
+from .trend_table import TrendTable
+
+# -----------------------------
+# Linha do tempo de uma geração
+# -----------------------------
+#
+# Cada etapa da geração vira um "span" (nome, categoria, início relativo, duração e
+# metadados como linhas/bytes). O ReportGenerator registra hosts, descoberta de itens,
+# cada chamada ao Zabbix, cada coletor, gráficos, render do HTML, xhtml2pdf e montagem;
+# o resultado é gravado junto do Report (tabela report_timeline) e exibido no admin.
+#
+# Código que não recebe o generator (ex.: charting) usa current_timeline(), ligado à
+# thread por bind() — o generator liga a thread principal e as threads dos módulos.
+
+_BOUND = threading.local()
+
+
+class Timeline:
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def record(self, name, category, started, duration, **meta):
+        """Registra um span já medido (started = time.perf_counter() do início)."""
+        span = {
+            'name': name,
+            'category': category,
+            'start_ms': round((started - self._t0) * 1000, 1),
+            'duration_ms': round(duration * 1000, 1),
+            'thread': threading.current_thread().name,
+        }
+        span.update({k: v for k, v in meta.items() if v is not None})
+        with self._lock:
+            self._spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name, category, **meta):
+        """Mede o bloco; o dict devolvido aceita metadados extras (ex.: rows, bytes)."""
+        extra = dict(meta)
+        started = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            self.record(name, category, started, time.perf_counter() - started, **extra)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self._spans, key=lambda s: s['start_ms'])
+        totals = {}
+        for span in spans:
+            entry = totals.setdefault(span['category'], {'count': 0, 'duration_ms': 0.0, 'rows': 0, 'bytes': 0})
+            entry['count'] += 1
+            entry['duration_ms'] = round(entry['duration_ms'] + span['duration_ms'], 1)
+            entry['rows'] += int(span.get('rows') or 0)
+            entry['bytes'] += int(span.get('bytes') or 0)
+        return {
+            'total_ms': round((time.perf_counter() - self._t0) * 1000, 1),
+            'categories': totals,
+            'spans': spans,
+        }
+
+
+@contextmanager
+def bind(timeline):
+    """Liga a timeline à thread atual (para current_timeline())."""
+    previous = getattr(_BOUND, 'timeline', None)
+    _BOUND.timeline = timeline
+    try:
+        yield timeline
+    finally:
+        _BOUND.timeline = previous
+
+
+def current_timeline():
+    return getattr(_BOUND, 'timeline', None)
+
+
+@contextmanager
+def timed(name, category, **meta):
+    """Span na timeline da thread atual; sem timeline ligada, não mede nada."""
+    timeline = current_timeline()
+    if timeline is None:
+        yield dict(meta)
+        return
+    with timeline.span(name, category, **meta) as extra:
+        yield extra
+
+
+class TimedZabbixClient:
+    """Envolve o ZabbixClient compartilhado registrando cada chamada (método, linhas, bytes, tentativas)."""
+    def __init__(self, client, timeline):
+        self._client = client
+        self._timeline = timeline
+        self.url = client.url
+
+    def request(self, body, allow_retry=True):
+        stats = {}
+        started = time.perf_counter()
+        result = self._client.request(body, allow_retry=allow_retry, stats=stats)
+        self._record(body, started, result, stats)
+        return result
+
+    async def request_async(self, body, allow_retry=True, decoder=None):
+        """Mesma chamada pelo cliente assíncrono (corrotina no loop do processo)."""
+        stats = {}
+        started = time.perf_counter()
+        result = await get_async_client(self.url).request(body, allow_retry=allow_retry, stats=stats, decoder=decoder)
+        self._record(body, started, result, stats)
+        return result
+
+    def request_batch(self, bodies, allow_retry=True):
+        """Lote JSON-RPC (um POST): um span "batch" com as chamadas e a contagem de erros."""
+        bodies = list(bodies)
+        stats = {}
+        started = time.perf_counter()
+        results = self._client.request_batch(bodies, allow_retry=allow_retry, stats=stats)
+        errors = sum(1 for r in results if r is None or (isinstance(r, dict) and 'error' in r))
+        self._timeline.record(
+            'batch', 'zabbix', started, time.perf_counter() - started,
+            calls=','.join(body.get('method', '?') for body in bodies),
+            rows=sum(len(r) for r in results if isinstance(r, list)),
+            bytes=stats.get('bytes'),
+            retries=stats.get('retries') or None,
+            error=f"{errors} erro(s)" if errors else None,
+        )
+        return results
+
+    def _record(self, body, started, result, stats):
+        self._timeline.record(
+            body.get('method', '?'), 'zabbix', started, time.perf_counter() - started,
+            rows=len(result) if isinstance(result, (list, TrendTable)) else None,
+            bytes=stats.get('bytes'),
+            retries=stats.get('retries') or None,
+            error=result.get('error') if isinstance(result, dict) and 'error' in result else None,
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# --- Profiling opcional por job ---
+
+class JobProfiler:
+    """
+    Perfil de CPU da thread da geração: pyinstrument (se instalado e pedido em
+    REPORT_PROFILER) ou cProfile. text() devolve o relatório para gravar com a timeline.
+    """
+    def __init__(self, engine='cprofile'):
+        self.engine = engine
+        self._profiler = None
+        if engine == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+                self._profiler = Profiler()
+            except ImportError:
+                logging.warning("[report_timeline] pyinstrument não instalado; usando cProfile.")
+                self.engine = 'cprofile'
+        if self._profiler is None:
+            import cProfile
+            self._profiler = cProfile.Profile()
+
+    def __enter__(self):
+        if self.engine == 'pyinstrument':
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.engine == 'pyinstrument':
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+        return False
+
+    def text(self, limit=80):
+        if self.engine == 'pyinstrument':
+            return self._profiler.output_text(unicode=True, color=False)
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
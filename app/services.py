@@ -3,16 +3,27 @@ import os
 import json
 import re
 import datetime as dt
+import asyncio
 import threading
-import traceback
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from collections import defaultdict
 from flask import render_template, current_app
 
 from . import db
-from .models import AuditLog, Report
-from .zabbix_api import fazer_request_zabbix
-from .pdf_builder import PDFBuilder
+from .models import AuditLog, Report, ReportJob, ReportTimeline, MetricKeyProfile
+from .zabbix_api import get_zabbix_client, AdaptiveChunkSizer
+from .zabbix_cache import get_zabbix_cache
+from .zabbix_async import run_sync
+from .trend_table import TrendTable, decode_trend_response
+from .trend_engine import aggregate_trends
+from .event_table import EventTable
+from .sla_engine import compute_sla
+from .pdf_builder import PDFBuilder, split_report_sections, section_rendering_enabled
+from .report_timeline import Timeline, TimedZabbixClient, JobProfiler, bind as bind_timeline
+from .metrics import observe_generation
 
 # Importação dos nossos Plugins (Collectors)
 from .collectors.cpu_collector import CpuCollector
@@ -47,18 +58,103 @@ COLLECTOR_MAP = {
     'stress': StressCollector,
 }
 
+# --- Chaves de item.get usadas por cada módulo (planejador de coleta) ---
+MODULE_ITEM_KEYS = {
+    'cpu': ['system.cpu.util'],
+    'disk': ['vfs.fs.size'],
+    'traffic_in': ['net.if.in', 'net.if.out'],
+    'traffic_out': ['net.if.in', 'net.if.out'],
+    'latency': ['icmppingsec', 'icmppingloss'],
+    'loss': ['icmppingsec', 'icmppingloss'],
+}
+# Módulos de disponibilidade precisam dos gatilhos (selectTriggers) dos itens de PING
+AVAILABILITY_ITEM_KEYS = ['icmpping']
+AVAILABILITY_MODULE_TYPES = {'sla', 'kpi', 'top_hosts', 'top_problems', 'stress'}
+
+# --- Projeção enxuta de event.get: apenas os campos consumidos pelo pipeline de disponibilidade ---
+EVENT_OUTPUT_FIELDS = ['eventid', 'source', 'object', 'objectid', 'clock', 'value', 'severity', 'name', 'r_eventid']
+# Filtro aplicado no servidor: eventos de problema (source=0 trigger, object=0 trigger, value=1 PROBLEM)
+PROBLEM_EVENT_FILTER = {'source': 0, 'object': 0, 'value': 1}
+
 # --- Gerenciador de Tarefas e Auditoria ---
 REPORT_GENERATION_TASKS = {}
 TASK_LOCK = threading.Lock()
+# Acorda os streams de progresso (SSE) deste processo a cada atualização de status
+TASK_PROGRESS = threading.Condition(TASK_LOCK)
+
+# Faixa de percentual de cada fase da geração (o progresso nunca regride)
+PROGRESS_PHASES = {
+    'starting': (0, 2),
+    'planning': (2, 5),
+    'availability': (5, 15),
+    'modules': (15, 85),
+    'pdf': (85, 99),
+    'done': (100, 100),
+}
+
 
-def update_status(task_id, message):
-    with TASK_LOCK:
-        if task_id in REPORT_GENERATION_TASKS:
-            REPORT_GENERATION_TASKS[task_id]['status'] = message
+def _advance_progress(progress, phase, step, steps):
+    """Atualiza fase/percentual/ETA do progresso estruturado de uma tarefa."""
+    if phase:
+        progress['phase'] = phase
+    if steps:
+        progress['module_index'], progress['module_total'] = step, steps
+    low, high = PROGRESS_PHASES.get(progress.get('phase'), (0, 0))
+    percent = low + (high - low) * step / steps if (phase == 'modules' and steps) else low
+    progress['percent'] = round(max(progress.get('percent', 0), percent), 1)
+    elapsed = time.time() - progress['started_at']
+    pct = progress['percent']
+    # Estimativa linear; só a partir de um mínimo de avanço para não oscilar no início
+    progress['eta_seconds'] = int(elapsed * (100 - pct) / pct) if 5 <= pct < 100 else None
+
+
+def update_status(task_id, message, phase=None, step=None, steps=None):
+    """
+    Atualiza a mensagem da tarefa e, opcionalmente, o progresso estruturado:
+    phase (ver PROGRESS_PHASES) e step/steps (módulo concluído / total de módulos).
+    """
+    progress = None
+    with TASK_PROGRESS:
+        task = REPORT_GENERATION_TASKS.get(task_id)
+        if task is not None:
+            task['status'] = message
+            progress = task.setdefault('progress', {'phase': 'starting', 'percent': 0, 'started_at': time.time()})
+            _advance_progress(progress, phase, step or 0, steps)
+            task['seq'] = task.get('seq', 0) + 1
+            progress = dict(progress)
+            TASK_PROGRESS.notify_all()
     try:
         current_app.logger.info(f"TASK {task_id}: {message}")
     except Exception:
         pass
+    if progress is None:
+        return
+    # Persistido na fila (report_job) para que qualquer processo responda ao /report_status e ao stream
+    try:
+        jobs_table = ReportJob.__table__
+        with db.engine.begin() as conn:
+            conn.execute(
+                jobs_table.update()
+                .where(jobs_table.c.id == task_id)
+                .values(status=str(message)[:255], progress=json.dumps(progress), heartbeat_at=dt.datetime.utcnow())
+            )
+    except Exception as e:
+        current_app.logger.warning(f"Falha ao persistir status da tarefa {task_id}: {e}")
+
+
+def wait_for_progress(task_id, last_seq, timeout):
+    """
+    Espera (até timeout) uma atualização da tarefa posterior a last_seq e devolve
+    {'seq', 'status', 'progress'}; None se a tarefa não está rodando neste processo.
+    """
+    with TASK_PROGRESS:
+        TASK_PROGRESS.wait_for(
+            lambda: REPORT_GENERATION_TASKS.get(task_id, {}).get('seq', 0) != last_seq, timeout=timeout
+        )
+        task = REPORT_GENERATION_TASKS.get(task_id)
+        if task is None:
+            return None
+        return {'seq': task.get('seq', 0), 'status': task.get('status'), 'progress': dict(task.get('progress') or {})}
 
 
 class AuditService:
@@ -86,19 +182,71 @@ class ReportGenerator:
         self.client = None
         self.system_config = None
         self.cached_data = {}
+        self._cache_lock = threading.Lock()
+        self._cache_key_locks = {}
         if not self.token or not self.url:
             raise ValueError("Configuração do Zabbix não encontrada ou token inválido.")
+        # Toda chamada ao Zabbix feita pelo generator/coletores entra na linha do tempo
+        self.timeline = Timeline()
+        self.zabbix = TimedZabbixClient(get_zabbix_client(self.url), self.timeline)
+        self.disk_cache = get_zabbix_cache()
+        self.report_record = None
+        self.profile_enabled = False
 
-    def _update_status(self, message):
-        update_status(self.task_id, message)
+    def _update_status(self, message, phase=None, step=None, steps=None):
+        update_status(self.task_id, message, phase=phase, step=step, steps=steps)
 
-    def generate(self, client, ref_month_str, system_config, author, report_layout_json):
-        """Gera o relatório com base no layout configurado (JSON)."""
+    def generate(self, client, ref_month_str, system_config, author, report_layout_json, profile=False):
+        """
+        Gera o relatório com base no layout configurado (JSON) e grava a linha do tempo
+        da geração (report_timeline). Com profile=True captura também o perfil de CPU.
+        """
+        self.profile_enabled = bool(profile)
+        profiler = JobProfiler(current_app.config.get('REPORT_PROFILER', 'cprofile')) if profile else None
+        pdf_path, error = None, None
+        try:
+            with bind_timeline(self.timeline):
+                if profiler:
+                    with profiler:
+                        pdf_path, error = self._generate(client, ref_month_str, system_config, author, report_layout_json)
+                else:
+                    pdf_path, error = self._generate(client, ref_month_str, system_config, author, report_layout_json)
+        except Exception as e:
+            error = f"Exceção: {e}"
+            raise
+        finally:
+            timeline_data = self.timeline.to_dict()
+            observe_generation(timeline_data)
+            self._save_timeline(timeline_data, client, ref_month_str, error, profiler)
+        return pdf_path, error
+
+    def _save_timeline(self, data, client, ref_month_str, error, profiler):
+        """Persiste a linha do tempo (e o perfil) desta geração; falhas aqui não afetam o relatório."""
+        try:
+            db.session.add(ReportTimeline(
+                report_id=self.report_record.id if self.report_record is not None else None,
+                job_id=self.task_id,
+                client_id=getattr(client, 'id', None),
+                reference_month=ref_month_str,
+                status='error' if error else 'done',
+                error=str(error)[:255] if error else None,
+                total_ms=data['total_ms'],
+                data=json.dumps(data, ensure_ascii=False, default=str),
+                profile=profiler.text() if profiler else None,
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Falha ao gravar a linha do tempo da tarefa {self.task_id}: {e}")
+
+    def _generate(self, client, ref_month_str, system_config, author, report_layout_json):
         self.client = client
         self.system_config = system_config
         self.cached_data = {}
+        self._cache_key_locks = {}
+        self._item_plan = {}
 
-        self._update_status("Iniciando geração do relatório…")
+        self._update_status("Iniciando geração do relatório…", phase='starting')
 
         # --- Período de referência ---
         try:
@@ -124,8 +272,10 @@ class ReportGenerator:
             return None, f"O cliente '{client.name}' não possui Grupos Zabbix associados."
 
         # --- Hosts do cliente ---
-        self._update_status("Coletando hosts do cliente...")
-        all_hosts = self.get_hosts(group_ids)
+        self._update_status("Coletando hosts do cliente...", phase='planning')
+        with self.timeline.span('hosts', 'phase') as span:
+            all_hosts = self.get_hosts(group_ids)
+            span['rows'] = len(all_hosts)
         if not all_hosts:
             return None, f"Nenhum host encontrado para os grupos Zabbix do cliente {client.name}."
         self.cached_data['all_hosts'] = all_hosts
@@ -138,17 +288,22 @@ class ReportGenerator:
             current_app.logger.error(f"[ReportGenerator.generate] Layout JSON inválido: {e}", exc_info=True)
             return None, "Layout inválido (JSON)."
 
+        # --- Planejamento: descobre todos os itens do layout em 1–2 chamadas item.get ---
+        with self.timeline.span('item_discovery', 'phase'):
+            self._plan_item_discovery(report_layout or [], all_hosts)
+
         availability_data_cache = None
         sla_prev_month_df = None
 
-        availability_module_types = {'sla', 'kpi', 'top_hosts', 'top_problems', 'stress'}
+        availability_module_types = AVAILABILITY_MODULE_TYPES
 
         final_html_parts = []
 
         # Pré-coleta de disponibilidade (SLA/KPI/Top)
         if any(mod.get('type') in availability_module_types for mod in (report_layout or [])):
-            self._update_status("Coletando dados de Disponibilidade (SLA)…")
-            availability_data_cache, error_msg = self._collect_availability_data(all_hosts, period, self.client.sla_contract)
+            self._update_status("Coletando dados de Disponibilidade (SLA)…", phase='availability')
+            with self.timeline.span('availability', 'phase'):
+                availability_data_cache, error_msg = self._collect_availability_data(all_hosts, period, self.client.sla_contract)
             if error_msg:
                 current_app.logger.warning(f"[ReportGenerator.generate] Erro SLA primário: {error_msg}")
                 final_html_parts.append(f"<p>Erro crítico ao coletar dados de disponibilidade: {error_msg}</p>")
@@ -160,11 +315,8 @@ class ReportGenerator:
             custom_options = sla_module_config.get('custom_options', {})
             if custom_options.get('compare_to_previous_month'):
                 self._update_status("Coletando dados do mês anterior para comparação de SLA…")
-                prev_ref_date = ref_date - dt.timedelta(days=1)
-                prev_month_start = prev_ref_date.replace(day=1)
-                prev_month_end = (prev_month_start.replace(day=28) + dt.timedelta(days=4)).replace(day=1) - dt.timedelta(seconds=1)
-                prev_period = {'start': int(prev_month_start.timestamp()), 'end': int(prev_month_end.timestamp())}
-
+                # Já calculado (memo) pela tendência dos KPIs; não gera nova coleta
+                prev_period = self._previous_month_period(period)
                 prev_data, prev_error = self._collect_availability_data(all_hosts, prev_period, self.client.sla_contract, trends_only=True)
                 if prev_error:
                     self._update_status(f"Aviso: Falha ao coletar dados do mês anterior: {prev_error}")
@@ -173,58 +325,75 @@ class ReportGenerator:
                     self.cached_data['prev_month_sla_df'] = prev_data['df_sla_problems']
 
         # Montagem dos módulos
-        for module_config in (report_layout or []):
-            module_type = module_config.get('type')
-            collector_class = COLLECTOR_MAP.get(module_type)
-            if not collector_class:
-                self._update_status(f"Aviso: Nenhum plugin encontrado para o tipo '{module_type}'.")
-                continue
-
-            try:
-                collector_instance = collector_class(self, module_config)
-                html_part = ""
-                if module_type in availability_module_types:
-                    if availability_data_cache:
-                        if module_type == 'sla':
-                            html_part = collector_instance.collect(all_hosts, period, availability_data_cache, df_prev_month=sla_prev_month_df)
-                        else:
-                            html_part = collector_instance.collect(all_hosts, period, availability_data_cache)
-                    else:
-                        html_part = "<p>Dados de disponibilidade indisponíveis para este módulo.</p>"
-                else:
-                    html_part = collector_instance.collect(all_hosts, period)
-
-                final_html_parts.append(html_part)
-            except Exception as e:
-                current_app.logger.error(f"Erro ao executar o plugin '{module_type}': {e}", exc_info=True)
-                final_html_parts.append(f"<p>Erro crítico ao processar módulo '{module_type}'.</p>")
+        modules = report_layout or []
+        workers = int(current_app.config.get('REPORT_MODULE_WORKERS', 4) or 1)
+        # O perfil de CPU cobre só a thread da geração: com profiling, os módulos rodam em sequência
+        parallel = current_app.config.get('REPORT_PARALLEL_MODULES', True) and not self.profile_enabled
+        if parallel and workers > 1 and len(modules) > 1:
+            module_html_parts = self._run_modules_concurrently(
+                modules, workers, all_hosts, period, availability_data_cache, sla_prev_month_df
+            )
+        else:
+            module_html_parts = []
+            self._update_status(f"Executando {len(modules)} módulos…", phase='modules', step=0, steps=len(modules))
+            for index, module_config in enumerate(modules):
+                module_html_parts.append(self._run_module(
+                    module_config, all_hosts, period, availability_data_cache, sla_prev_month_df
+                ))
+                self._update_status(f"Módulo {index + 1}/{len(modules)} ('{module_config.get('type')}') concluído.",
+                                    phase='modules', step=index + 1, steps=len(modules))
 
         # Miolo + PDF
         dados_gerais = {
             'group_name': client.name,
             'periodo_referencia': start_date.strftime('%B de %Y').capitalize(),
             'data_emissao': dt.datetime.now().strftime('%d/%m/%Y'),
-            'report_content': "".join(final_html_parts)
         }
-        miolo_html = render_template('_MIOLO_BASE.html', **dados_gerais, modules={'pandas': pd})
+        sections = split_report_sections(module_html_parts, modules) if section_rendering_enabled() else []
+        if sections:
+            sections[0] = "".join(final_html_parts) + sections[0]
 
-        self._update_status("Montando o relatório final…")
+        self._update_status("Montando o relatório final…", phase='pdf')
 
         pdf_builder = PDFBuilder(self.task_id)
-        error = pdf_builder.add_cover_page(system_config.report_cover_path)
+        with self.timeline.span('cover_page', 'merge'):
+            error = pdf_builder.add_cover_page(system_config.report_cover_path)
         if error:
             return None, error
-        error = pdf_builder.add_miolo_from_html(miolo_html)
+        if len(sections) > 1:
+            self._update_status(f"Renderizando o PDF em {len(sections)} seções paralelas…")
+            with self.timeline.span('miolo_html', 'html', sections=len(sections)) as span:
+                sections_html = [
+                    render_template('_MIOLO_BASE.html', **dados_gerais, report_content=html_section,
+                                    section_render=True, show_title=(i == 0), modules={'pandas': pd})
+                    for i, html_section in enumerate(sections)
+                ]
+                span['bytes'] = sum(len(html) for html in sections_html)
+            with self.timeline.span('xhtml2pdf', 'pdf', sections=len(sections)) as span:
+                error = pdf_builder.add_miolo_from_sections(sections_html, f"Gerado em {dados_gerais['data_emissao']}")
+                span['pages'] = len(pdf_builder.merger.pages)
+        else:
+            with self.timeline.span('miolo_html', 'html') as span:
+                miolo_html = render_template('_MIOLO_BASE.html', **dados_gerais,
+                                             report_content="".join(final_html_parts + module_html_parts),
+                                             modules={'pandas': pd})
+                span['bytes'] = len(miolo_html)
+            with self.timeline.span('xhtml2pdf', 'pdf') as span:
+                error = pdf_builder.add_miolo_from_html(miolo_html)
+                span['pages'] = len(pdf_builder.merger.pages)
         if error:
             return None, error
-        error = pdf_builder.add_final_page(system_config.report_final_page_path)
+        with self.timeline.span('final_page', 'merge'):
+            error = pdf_builder.add_final_page(system_config.report_final_page_path)
         if error:
             return None, error
 
         pdf_filename = f'Relatorio_Custom_{client.name.replace(" ", "_")}_{ref_month_str}_{os.urandom(4).hex()}.pdf'
         pdf_path = os.path.join(current_app.config['GENERATED_REPORTS_FOLDER'], pdf_filename)
 
-        final_file_path = pdf_builder.save_and_cleanup(pdf_path)
+        with self.timeline.span('save', 'merge', pages=len(pdf_builder.merger.pages)) as span:
+            final_file_path = pdf_builder.save_and_cleanup(pdf_path)
+            span['bytes'] = os.path.getsize(final_file_path)
 
         report_record = Report(
             filename=pdf_filename,
@@ -236,12 +405,105 @@ class ReportGenerator:
         )
         db.session.add(report_record)
         db.session.commit()
+        self.report_record = report_record
         AuditService.log(f"Gerou relatório customizado para '{client.name}' referente a {ref_month_str}", user=author)
         return pdf_path, None
 
+    def _run_module(self, module_config, all_hosts, period, availability_data_cache, sla_prev_month_df):
+        """Executa um único plugin e devolve seu HTML (erros ficam isolados no próprio módulo)."""
+        module_type = module_config.get('type')
+        collector_class = COLLECTOR_MAP.get(module_type)
+        if not collector_class:
+            self._update_status(f"Aviso: Nenhum plugin encontrado para o tipo '{module_type}'.")
+            return ""
+
+        with self.timeline.span(module_type, 'collector', title=module_config.get('title') or None):
+            return self._collect_module(collector_class, module_config, all_hosts, period,
+                                        availability_data_cache, sla_prev_month_df)
+
+    def _collect_module(self, collector_class, module_config, all_hosts, period, availability_data_cache, sla_prev_month_df):
+        module_type = module_config.get('type')
+        try:
+            collector_instance = collector_class(self, module_config)
+            if module_type in AVAILABILITY_MODULE_TYPES:
+                if not availability_data_cache:
+                    return "<p>Dados de disponibilidade indisponíveis para este módulo.</p>"
+                if module_type == 'sla':
+                    return collector_instance.collect(all_hosts, period, availability_data_cache, df_prev_month=sla_prev_month_df)
+                return collector_instance.collect(all_hosts, period, availability_data_cache)
+            return collector_instance.collect(all_hosts, period)
+        except Exception as e:
+            current_app.logger.error(f"Erro ao executar o plugin '{module_type}': {e}", exc_info=True)
+            return f"<p>Erro crítico ao processar módulo '{module_type}'.</p>"
+
+    def _run_modules_concurrently(self, modules, workers, all_hosts, period, availability_data_cache, sla_prev_month_df):
+        """
+        Executa os plugins em um pool de threads limitado (coleta é dominada por I/O no Zabbix)
+        e devolve os HTMLs na mesma ordem do layout.
+        """
+        app = current_app._get_current_object()
+        total = len(modules)
+        completed = []
+        completed_lock = threading.Lock()
+
+        def _task(index, module_config):
+            with app.app_context(), bind_timeline(self.timeline):
+                html_part = self._run_module(module_config, all_hosts, period, availability_data_cache, sla_prev_month_df)
+                with completed_lock:
+                    completed.append(index)
+                    done = len(completed)
+                self._update_status(f"Módulo {index + 1}/{total} ('{module_config.get('type')}') concluído.",
+                                    phase='modules', step=done, steps=total)
+                return html_part
+
+        self._update_status(f"Executando {total} módulos em paralelo ({min(workers, total)} simultâneos)…",
+                            phase='modules', step=0, steps=total)
+        with ThreadPoolExecutor(max_workers=min(workers, total), thread_name_prefix=f"report-{self.task_id[:8]}") as executor:
+            futures = [executor.submit(_task, i, module_config) for i, module_config in enumerate(modules)]
+            html_parts = []
+            for future, module_config in zip(futures, modules):
+                try:
+                    html_parts.append(future.result())
+                except Exception as e:
+                    current_app.logger.error(f"Erro ao executar o plugin '{module_config.get('type')}': {e}", exc_info=True)
+                    html_parts.append(f"<p>Erro crítico ao processar módulo '{module_config.get('type')}'.</p>")
+        return html_parts
+
+    def get_or_compute(self, cache_key, compute):
+        """
+        Retorna self.cached_data[cache_key] ou executa compute() -> (data, error_msg) uma única vez,
+        mesmo com módulos rodando em paralelo (ex.: Latência e Perda compartilham a mesma coleta).
+        Somente resultados sem erro são cacheados.
+        """
+        with self._cache_lock:
+            key_lock = self._cache_key_locks.setdefault(cache_key, threading.Lock())
+        with key_lock:
+            if cache_key in self.cached_data:
+                return self.cached_data[cache_key], None
+            data, error_msg = compute()
+            if not error_msg:
+                self.cached_data[cache_key] = data
+            return data, error_msg
+
     # -------------------- Bloco de coleta / utilidades --------------------
 
-    def _collect_availability_data(self, all_hosts, period, sla_goal, trends_only=False):
+    def _previous_month_period(self, period):
+        ref_date = dt.datetime.fromtimestamp(period['start'])
+        prev_month_start = (ref_date - dt.timedelta(days=1)).replace(day=1)
+        prev_month_end = (prev_month_start.replace(day=28) + dt.timedelta(days=4)).replace(day=1) - dt.timedelta(seconds=1)
+        return {'start': int(prev_month_start.timestamp()), 'end': int(prev_month_end.timestamp())}
+
+    def _availability_sla(self, all_hosts, period):
+        """
+        SLA de PING do período, calculado uma única vez por geração (memo por período).
+        O mês anterior é usado tanto pela tendência do KPI quanto pela comparação do SLA.
+        """
+        return self.get_or_compute(
+            ('availability_sla', period['start'], period['end']),
+            lambda: self._compute_availability_sla(all_hosts, period)
+        )
+
+    def _compute_availability_sla(self, all_hosts, period):
         all_host_ids = [h['hostid'] for h in all_hosts]
 
         ping_items = self.get_items(all_host_ids, 'icmpping', search_by_key=True)
@@ -257,59 +519,66 @@ class ReportGenerator:
         if not ping_trigger_ids:
             return None, "Nenhum gatilho (trigger) de PING encontrado para os itens deste grupo."
 
-        ping_events = self.obter_eventos_wrapper(ping_trigger_ids, period, 'objectids')
-        if ping_events is None:
+        ping_problems = self.obter_eventos_wrapper(ping_trigger_ids, period, 'objectids', filtros=PROBLEM_EVENT_FILTER)
+        if ping_problems is None:
             return None, "Falha na coleta de eventos de PING."
 
-        ping_problems = [
-            p for p in ping_events
-            if p.get('source') == '0' and p.get('object') == '0' and p.get('value') == '1'
-        ]
-        correlated_ping_problems = self._correlate_problems(ping_problems, ping_events)
-        df_sla = pd.DataFrame(self._calculate_sla(correlated_ping_problems, hosts_for_sla, period))
+        # Problemas iniciados antes do período que ainda estavam abertos no seu início
+        lookback_days = int(current_app.config.get('REPORT_SLA_LOOKBACK_DAYS', 30) or 0)
+        if lookback_days > 0:
+            lookback_period = {'start': period['start'] - lookback_days * 86400, 'end': period['start'] - 1}
+            earlier_problems = self.obter_eventos_wrapper(ping_trigger_ids, lookback_period, 'objectids', filtros=PROBLEM_EVENT_FILTER)
+            if earlier_problems is None:
+                return None, "Falha na coleta de eventos de PING anteriores ao período."
+            ping_problems = EventTable.concat([earlier_problems, ping_problems])
+
+        ping_problems = self.atualizar_problemas_abertos(ping_problems)
+        ping_resolutions = self.obter_eventos_resolucao(ping_problems, period)
+        if ping_resolutions is None:
+            return None, "Falha na coleta de eventos de resolução de PING."
+
+        df_sla = compute_sla(ping_problems, ping_resolutions, hosts_for_sla, period)
+        return {'df_sla_problems': df_sla, 'hosts_for_sla': hosts_for_sla}, None
+
+    def _availability_problems(self, all_hosts, period):
+        """Problemas de todos os hosts do grupo no período (memo por período)."""
+        def _compute():
+            all_host_ids = [h['hostid'] for h in all_hosts]
+            problems = self.obter_eventos_wrapper(all_host_ids, period, 'hostids', filtros=PROBLEM_EVENT_FILTER)
+            if problems is None:
+                return None, "Falha na coleta de eventos gerais do grupo."
+            return problems, None
+        return self.get_or_compute(('availability_problems', period['start'], period['end']), _compute)
+
+    def _collect_availability_data(self, all_hosts, period, sla_goal, trends_only=False):
+        sla_data, error_msg = self._availability_sla(all_hosts, period)
+        if error_msg:
+            return None, error_msg
+        df_sla = sla_data['df_sla_problems']
+        hosts_for_sla = sla_data['hosts_for_sla']
 
         if trends_only:
             return {'df_sla_problems': df_sla}, None
 
-        all_group_events = self.obter_eventos_wrapper(all_host_ids, period, 'hostids')
-        if all_group_events is None:
-            return None, "Falha na coleta de eventos gerais do grupo."
-
-        all_problems = [
-            p for p in all_group_events
-            if p.get('source') == '0' and p.get('object') == '0' and p.get('value') == '1'
-        ]
-        df_top_incidents = self._count_problems_by_host(all_problems, all_hosts)
+        all_problems, error_msg = self._availability_problems(all_hosts, period)
+        if error_msg:
+            return None, error_msg
+        host_problems = self._host_problems(all_problems, all_hosts)
+        df_top_incidents = self._count_problems_by_host(host_problems)
 
         avg_sla = df_sla['SLA (%)'].mean() if not df_sla.empty else 100.0
         principal_ofensor = df_top_incidents.iloc[0]['Host'] if not df_top_incidents.empty else "Nenhum"
 
         self._update_status("Calculando tendências de KPIs…")
-        ref_date = dt.datetime.fromtimestamp(period['start'])
-        prev_ref_date = ref_date - dt.timedelta(days=1)
-        prev_month_start = prev_ref_date.replace(day=1)
-        prev_month_end = (prev_month_start.replace(day=28) + dt.timedelta(days=4)).replace(day=1) - dt.timedelta(seconds=1)
-        prev_period = {'start': int(prev_month_start.timestamp()), 'end': int(prev_month_end.timestamp())}
+        prev_period = self._previous_month_period(period)
 
-        prev_ping_events = self.obter_eventos_wrapper(ping_trigger_ids, prev_period, 'objectids')
         prev_avg_sla = 100.0
-        if prev_ping_events:
-            prev_ping_problems = [
-                p for p in prev_ping_events
-                if p.get('source') == '0' and p.get('object') == '0' and p.get('value') == '1'
-            ]
-            prev_correlated = self._correlate_problems(prev_ping_problems, prev_ping_events)
-            prev_df_sla = pd.DataFrame(self._calculate_sla(prev_correlated, hosts_for_sla, prev_period))
-            if not prev_df_sla.empty:
-                prev_avg_sla = prev_df_sla['SLA (%)'].mean()
-
-        prev_all_group_events = self.obter_eventos_wrapper(all_host_ids, prev_period, 'hostids')
-        prev_all_problems_count = 0
-        if prev_all_group_events:
-            prev_all_problems_count = len([
-                p for p in prev_all_group_events
-                if p.get('source') == '0' and p.get('object') == '0' and p.get('value') == '1'
-            ])
+        prev_sla_data, prev_error = self._availability_sla(all_hosts, prev_period)
+        if not prev_error and not prev_sla_data['df_sla_problems'].empty:
+            prev_avg_sla = prev_sla_data['df_sla_problems']['SLA (%)'].mean()
+
+        prev_all_problems, _ = self._availability_problems(all_hosts, prev_period)
+        prev_all_problems_count = len(prev_all_problems) if prev_all_problems else 0
 
         sla_trend = 'stable'
         if avg_sla > prev_avg_sla:
@@ -359,22 +628,43 @@ class ReportGenerator:
             '0': 'Não Classificado', '1': 'Informação', '2': 'Atenção',
             '3': 'Média', '4': 'Alta', '5': 'Desastre'
         }
-        severity_counts = defaultdict(int)
-        for problem in all_problems:
-            severity_level = problem.get('severity', '0')
-            severity_name = severity_map.get(severity_level, 'Desconhecido')
-            severity_counts[severity_name] += 1
+        severity_counts = {}
+        # Ordem da primeira ocorrência (define a ordem das fatias do gráfico)
+        for severity, count in all_problems.count_by('severity', sort=False).itertuples(index=False):
+            severity_name = severity_map.get(str(severity), 'Desconhecido')
+            severity_counts[severity_name] = severity_counts.get(severity_name, 0) + int(count)
 
         return {
             'kpis': kpis_data,
             'df_sla_problems': df_sla,
             'df_top_incidents': df_top_incidents,
-            'severity_counts': dict(severity_counts)
+            'problems': host_problems,
+            'severity_counts': severity_counts
         }, None
 
     def _normalize_string(self, s):
         return re.sub(r'\s+', ' ', str(s).replace('\n', ' ').replace('\r', ' ')).strip()
 
+    def _cached_request(self, method, params, period, fetch):
+        """
+        Leitura através do cache em disco (ver app/zabbix_cache.py). period=None indica
+        dado sem recorte temporal (ex.: item.get), que expira pelo TTL de período aberto.
+        """
+        if self.disk_cache is None:
+            return fetch()
+        fetched = []
+
+        def _fetch():
+            fetched.append(True)
+            return fetch()
+
+        started = time.perf_counter()
+        result = self.disk_cache.get_or_fetch(self.url, method, params, period, _fetch)
+        if not fetched:
+            self.timeline.record(method, 'cache', started, time.perf_counter() - started,
+                                 rows=len(result) if isinstance(result, (list, TrendTable)) else None)
+        return result
+
     def get_hosts(self, groupids):
         self._update_status("Coletando dados de hosts…")
         body = {
@@ -388,7 +678,7 @@ class ReportGenerator:
             'auth': self.token,
             'id': 1
         }
-        resposta = fazer_request_zabbix(body, self.url)
+        resposta = self.zabbix.request(body)
         if not isinstance(resposta, list):
             return []
         return sorted(
@@ -404,8 +694,122 @@ class ReportGenerator:
             key=lambda x: x['nome_visivel']
         )
 
+    def _plan_item_discovery(self, report_layout, all_hosts):
+        """
+        Lê o layout inteiro e busca de uma vez os itens de todos os módulos:
+          - 1 item.get com selectTriggers para as chaves de disponibilidade (icmpping, que
+            por busca parcial também cobre icmppingsec/icmppingloss);
+          - 1 item.get sem gatilhos para as demais chaves (CPU, disco, tráfego, perfis de memória).
+        O resultado fica em self._item_plan e get_items() passa a servir cada filtro a partir dele.
+        """
+        self._item_plan = {}
+        module_types = {mod.get('type') for mod in report_layout}
+
+        trigger_keys = list(AVAILABILITY_ITEM_KEYS) if module_types & AVAILABILITY_MODULE_TYPES else []
+        plain_keys = []
+        for module_type in module_types:
+            plain_keys.extend(MODULE_ITEM_KEYS.get(module_type, []))
+        if 'mem' in module_types:
+            try:
+                profiles = MetricKeyProfile.query.filter_by(metric_type='memory', is_active=True).all()
+                plain_keys.extend(p.key_string for p in profiles)
+            except Exception as e:
+                current_app.logger.warning(f"[ReportGenerator._plan_item_discovery] Perfis de memória indisponíveis: {e}")
+
+        # Chaves já cobertas pela busca parcial de uma chave com gatilhos não precisam de outra chamada
+        trigger_keys_lower = [k.lower() for k in trigger_keys]
+        covered_keys = sorted({k for k in plain_keys if any(t in k.lower() for t in trigger_keys_lower)})
+        plain_keys = sorted(set(plain_keys) - set(covered_keys))
+        if not trigger_keys and not plain_keys:
+            return
+
+        host_ids = [h['hostid'] for h in all_hosts]
+        self._update_status("Planejando coleta: descobrindo itens de todos os módulos…")
+        planned_items = []
+        for keys, with_triggers in ((trigger_keys, True), (plain_keys, False)):
+            if not keys:
+                continue
+            params = {
+                'output': ['itemid', 'hostid', 'name', 'key_'],
+                'hostids': host_ids,
+                'search': {'key_': keys},
+                'searchByAny': True,
+                'sortfield': 'name'
+            }
+            if with_triggers:
+                params['selectTriggers'] = ['triggerid']
+            body = {'jsonrpc': '2.0', 'method': 'item.get', 'params': params, 'auth': self.token, 'id': 1}
+            items = self._cached_request('item.get', params, None, lambda: self.zabbix.request(body))
+            if not isinstance(items, list):
+                current_app.logger.warning(
+                    f"[ReportGenerator._plan_item_discovery] item.get planejado falhou para {keys}; "
+                    f"os módulos farão buscas individuais."
+                )
+                continue
+            planned_items.append((keys + covered_keys if with_triggers else keys, items))
+
+        for keys, items in planned_items:
+            for key in keys:
+                key_lower = key.lower()
+                self._item_plan[key] = [it for it in items if key_lower in it.get('key_', '').lower()]
+        current_app.logger.debug(
+            f"[ReportGenerator._plan_item_discovery] chaves planejadas="
+            f"{ {k: len(v) for k, v in self._item_plan.items()} }"
+        )
+
     def get_items(self, hostids, filter_key, search_by_key=False, exact_key_search=False):
+        if search_by_key and not exact_key_search and isinstance(filter_key, str) and filter_key in self._item_plan:
+            wanted = set(hostids)
+            return [item for item in self._item_plan[filter_key] if item['hostid'] in wanted]
         self._update_status(f"Buscando itens com filtro '{filter_key}'…")
+        params = self._item_params(hostids, filter_key, search_by_key, exact_key_search)
+        body = {
+            'jsonrpc': '2.0',
+            'method': 'item.get',
+            'params': params,
+            'auth': self.token,
+            'id': 1
+        }
+        return self._cached_request('item.get', params, None, lambda: self.zabbix.request(body)) or []
+
+    def get_items_by_keys(self, hostids, filter_keys):
+        """
+        get_items(hostids, chave, search_by_key=True) para várias chaves de uma vez:
+        {chave: itens}. Chaves do plano de itens e do cache em disco não vão ao Zabbix;
+        as demais seguem num único lote JSON-RPC.
+        """
+        wanted = set(hostids)
+        found, pending = {}, []
+        for key in dict.fromkeys(filter_keys):
+            if key in self._item_plan:
+                found[key] = [item for item in self._item_plan[key] if item['hostid'] in wanted]
+                continue
+            params = self._item_params(hostids, key, True, False)
+            started = time.perf_counter()
+            cached = self.disk_cache.get(self.url, 'item.get', params, None) if self.disk_cache else None
+            if cached is not None:
+                self.timeline.record('item.get', 'cache', started, time.perf_counter() - started, rows=len(cached))
+                found[key] = cached
+            else:
+                pending.append((key, params))
+        if pending:
+            self._update_status(f"Buscando itens para {len(pending)} chaves em lote…")
+            results = self.zabbix.request_batch([
+                {'jsonrpc': '2.0', 'method': 'item.get', 'params': params, 'auth': self.token}
+                for _, params in pending
+            ])
+            for (key, params), result in zip(pending, results):
+                if isinstance(result, list):
+                    if self.disk_cache:
+                        self.disk_cache.set(self.url, 'item.get', params, None, result)
+                    found[key] = result
+                else:
+                    current_app.logger.warning(f"Falha ao buscar itens com a chave '{key}': {result}")
+                    found[key] = []
+        return found
+
+    @staticmethod
+    def _item_params(hostids, filter_key, search_by_key, exact_key_search):
         params = {
             'output': ['itemid', 'hostid', 'name', 'key_'],
             'hostids': hostids,
@@ -420,14 +824,7 @@ class ReportGenerator:
             params['selectTriggers'] = 'extend'
         else:
             params['search'] = {'name': filter_key}
-        body = {
-            'jsonrpc': '2.0',
-            'method': 'item.get',
-            'params': params,
-            'auth': self.token,
-            'id': 1
-        }
-        return fazer_request_zabbix(body, self.url) or []
+        return params
 
     # === AQUI: retrocompat para period dict ===
     def get_trends(self, itemids, time_from=None, time_till=None):
@@ -435,6 +832,7 @@ class ReportGenerator:
         Aceita:
           - get_trends(itemids, time_from:int, time_till:int)
           - get_trends(itemids, period:dict com 'start'/'end')  [retrocompat]
+        Retorna uma TrendTable (vazia em caso de falha).
         """
         # Se o 2º argumento for um dict, tratamos como período
         if isinstance(time_from, dict) and time_till is None:
@@ -447,146 +845,338 @@ class ReportGenerator:
             raise TypeError("get_trends() requer time_from e time_till, ou um dict 'period' como 2º argumento.")
 
         self._update_status(f"Buscando tendências para {len(itemids)} itens…")
+        itemids = list(itemids)
+        time_from, time_till = int(time_from), int(time_till)
+        trends = self._cached_request(
+            'trend.get',
+            {'itemids': itemids, 'output': ['itemid', 'clock', 'num', 'value_min', 'value_avg', 'value_max']},
+            {'start': time_from, 'end': time_till},
+            lambda: self._fetch_trends_chunked(itemids, time_from, time_till)
+        )
+        if trends is None:
+            current_app.logger.error(f"Falha ao buscar trends para {len(itemids)} itens. Resposta inválida do Zabbix.")
+            return TrendTable()
+        if isinstance(trends, list):
+            # Entrada do cache gravada antes das colunas tipadas
+            return TrendTable.from_rows(trends)
+        return trends
+
+    def _fetch_trends_chunked(self, itemids, time_from, time_till):
+        """
+        Divide o trend.get em lotes de itemids executados em paralelo (corrotinas no loop
+        do Zabbix, no máximo ZABBIX_TREND_WORKERS em voo por busca).
+        O tamanho do lote se adapta ao volume/latência observados; lotes com erro são
+        quebrados ao meio (por itens e, para um único item, por janela de tempo).
+        Retorna a TrendTable concatenada (colunas tipadas, decodificadas sem dict por
+        linha) ou None se algum trecho falhar de vez.
+        """
+        if not itemids:
+            return TrendTable()
+        cfg = current_app.config
+        workers = max(1, int(cfg.get('ZABBIX_TREND_WORKERS', 4) or 1))
+        sizer = AdaptiveChunkSizer(
+            initial=cfg.get('ZABBIX_TREND_CHUNK_ITEMS', 100),
+            maximum=max(len(itemids), 1),
+            target_rows=cfg.get('ZABBIX_TREND_TARGET_ROWS', 50000),
+            target_seconds=cfg.get('ZABBIX_TIMEOUT', 120) / 6
+        )
+        return run_sync(self._fetch_trends_async(itemids, time_from, time_till, workers, sizer, current_app.logger))
+
+    async def _fetch_trends_async(self, itemids, time_from, time_till, workers, sizer, logger):
+        """Corrotina de _fetch_trends_chunked: até `workers` lotes em voo no loop do Zabbix."""
+        min_window = 86400  # não quebra janelas menores que 1 dia
+
+        async def _request(chunk, t_from, t_till):
+            body = {
+                'jsonrpc': '2.0',
+                'method': 'trend.get',
+                'params': {
+                    'output': ['itemid', 'clock', 'num', 'value_min', 'value_avg', 'value_max'],
+                    'itemids': chunk,
+                    'time_from': t_from,
+                    'time_till': t_till
+                },
+                'auth': self.token,
+                'id': 1
+            }
+            t0 = time.perf_counter()
+            result = await self.zabbix.request_async(body, allow_retry=False, decoder=decode_trend_response)
+            return result, time.perf_counter() - t0
+
+        pending_items = deque(itemids)
+        retry_tasks = deque()  # (chunk, time_from, time_till) que falharam e foram quebrados
+        tables = []
+        failed = False
+        running = {}
+
+        def _submit_next():
+            if retry_tasks:
+                task = retry_tasks.popleft()
+            else:
+                size = sizer.size
+                task = ([pending_items.popleft() for _ in range(min(size, len(pending_items)))], time_from, time_till)
+            running[asyncio.ensure_future(_request(*task))] = task
+
+        while (pending_items or retry_tasks) and len(running) < workers:
+            _submit_next()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                chunk, t_from, t_till = running.pop(future)
+                result, elapsed = future.result()
+                if isinstance(result, TrendTable):
+                    tables.append(result)
+                    if t_from == time_from and t_till == time_till:
+                        sizer.record(len(chunk), len(result), elapsed)
+                    continue
+                sizer.shrink()
+                if len(chunk) > 1:
+                    mid = len(chunk) // 2
+                    retry_tasks.extend([(chunk[:mid], t_from, t_till), (chunk[mid:], t_from, t_till)])
+                elif t_till - t_from > min_window:
+                    mid = t_from + (t_till - t_from) // 2
+                    retry_tasks.extend([(chunk, t_from, mid), (chunk, mid + 1, t_till)])
+                else:
+                    logger.error(
+                        f"[ReportGenerator.get_trends] trend.get falhou para o item {chunk} "
+                        f"({t_from}-{t_till}): {result}"
+                    )
+                    failed = True
+            if failed:
+                for future in running:
+                    future.cancel()
+                break
+            while (pending_items or retry_tasks) and len(running) < workers:
+                _submit_next()
+        return None if failed else TrendTable.concat(tables)
+
+    def obter_eventos(self, object_ids, periodo, id_type='hostids', max_depth=3, filtros=None):
+        """
+        Busca eventos do período dividindo-o ANTES da consulta em janelas proporcionais ao
+        volume estimado (sonda countOutput, ou hosts × dias se a sonda falhar). As janelas
+        são buscadas em paralelo e unidas sem duplicatas (eventid) nas bordas.
+        Se uma janela ainda falhar, ela é quebrada ao meio até max_depth níveis.
+        filtros (ex.: PROBLEM_EVENT_FILTER) são repassados ao servidor em todas as chamadas.
+        O resultado passa pelo cache em disco (meses fechados não são buscados de novo).
+        """
+        params = {id_type: list(object_ids), 'output': EVENT_OUTPUT_FIELDS, **(filtros or {})}
+        return self._cached_request(
+            'event.get', params, periodo,
+            lambda: self._obter_eventos_paralelo(object_ids, periodo, id_type, max_depth, filtros)
+        )
+
+    def _obter_eventos_paralelo(self, object_ids, periodo, id_type, max_depth, filtros):
+        windows = self._plan_event_windows(object_ids, periodo, id_type, filtros)
+        workers = max(1, int(current_app.config.get('ZABBIX_EVENT_WORKERS', 4) or 1))
+        if len(windows) > 1:
+            self._update_status(f"Buscando eventos em {len(windows)} janelas paralelas…")
+        app = current_app._get_current_object()
+        results = run_sync(self._obter_eventos_janelas_async(app, object_ids, windows, id_type, max_depth, filtros, workers))
+        if any(r is None for r in results):
+            return None
+        if len(results) == 1:
+            return results[0]
+
+        eventos, vistos = [], set()
+        for resultado in results:
+            for evento in resultado:
+                eventid = evento.get('eventid')
+                if eventid in vistos:
+                    continue
+                vistos.add(eventid)
+                eventos.append(evento)
+        return eventos
+
+    async def _obter_eventos_janelas_async(self, app, object_ids, windows, id_type, max_depth, filtros, workers):
+        """Busca as janelas no loop do Zabbix, no máximo `workers` por vez; resultados na ordem das janelas."""
+        limit = asyncio.Semaphore(workers)
+
+        async def _fetch(window):
+            async with limit:
+                return await self._obter_eventos_janela(app, object_ids, window, id_type, max_depth, filtros)
+
+        return await asyncio.gather(*(_fetch(window) for window in windows))
+
+    def _plan_event_windows(self, object_ids, periodo, id_type, filtros=None):
+        """Divide o período em janelas com ~ZABBIX_EVENT_WINDOW_ROWS eventos estimados cada."""
+        time_from, time_till = periodo['start'], periodo['end']
+        cfg = current_app.config
+        rows_per_window = max(1, int(cfg.get('ZABBIX_EVENT_WINDOW_ROWS', 20000) or 1))
+        max_windows = max(1, (time_till - time_from) // 86400 + 1)  # no máximo 1 janela por dia
+
         body = {
             'jsonrpc': '2.0',
-            'method': 'trend.get',
-            'params': {
-                'output': ['itemid', 'clock', 'num', 'value_min', 'value_avg', 'value_max'],
-                'itemids': itemids,
-                'time_from': int(time_from),
-                'time_till': int(time_till)
-            },
+            'method': 'event.get',
+            'params': {'countOutput': True, 'time_from': time_from, 'time_till': time_till, id_type: object_ids, **(filtros or {})},
             'auth': self.token,
             'id': 1
         }
-        trends = fazer_request_zabbix(body, self.url)
-        if not isinstance(trends, list):
-            current_app.logger.error(f"Falha ao buscar trends para {len(itemids)} itens. Resposta inválida do Zabbix.")
-            return []
-        return trends
-
-    def obter_eventos(self, object_ids, periodo, id_type='hostids', max_depth=3):
+        estimativa = self.zabbix.request(body, allow_retry=False)
+        try:
+            estimativa = int(estimativa)
+        except (TypeError, ValueError):
+            # Sonda falhou: estimativa grosseira por objeto × dia
+            estimativa = len(object_ids) * max_windows * int(cfg.get('ZABBIX_EVENTS_PER_OBJECT_DAY', 2) or 1)
+            current_app.logger.debug(f"[ReportGenerator._plan_event_windows] countOutput indisponível; estimativa={estimativa}")
+
+        n_windows = int(min(max_windows, max(1, -(-estimativa // rows_per_window))))
+        step = (time_till - time_from + 1) / n_windows
+        windows = []
+        for i in range(n_windows):
+            w_start = time_from + int(round(i * step))
+            w_end = time_till if i == n_windows - 1 else time_from + int(round((i + 1) * step)) - 1
+            windows.append({'start': w_start, 'end': w_end})
+        return windows
+
+    async def _obter_eventos_janela(self, app, object_ids, periodo, id_type='hostids', max_depth=3, filtros=None):
         time_from, time_till = periodo['start'], periodo['end']
         if max_depth <= 0:
-            current_app.logger.error("ERRO: Limite de profundidade de recursão atingido para obter eventos.")
+            app.logger.error("ERRO: Limite de profundidade de recursão atingido para obter eventos.")
             return None
-        params = {
-            'output': 'extend',
-            'selectHosts': ['hostid'],
-            'time_from': time_from,
-            'time_till': time_till,
-            id_type: object_ids,
-            'sortfield': ["eventid"],
-            'sortorder': "ASC",
-            'select_acknowledges': 'extend'
-        }
-        body = {'jsonrpc': '2.0', 'method': 'event.get', 'params': params, 'auth': self.token, 'id': 1}
-        resposta = fazer_request_zabbix(body, self.url, allow_retry=False)
+        body = self._event_body(object_ids, periodo, id_type, filtros)
+        resposta = await self.zabbix.request_async(body, allow_retry=False)
         if isinstance(resposta, dict) and 'error' in resposta:
-            self._update_status("Consulta pesada detectada, quebrando o período…")
+            await self._update_status_async(app, "Consulta pesada detectada, quebrando o período…")
             mid_point = time_from + (time_till - time_from) // 2
             periodo1 = {'start': time_from, 'end': mid_point}
             periodo2 = {'start': mid_point + 1, 'end': time_till}
-            eventos1 = self.obter_eventos(object_ids, periodo1, id_type, max_depth - 1)
+            eventos1 = await self._obter_eventos_janela(app, object_ids, periodo1, id_type, max_depth - 1, filtros)
             if eventos1 is None:
                 return None
-            eventos2 = self.obter_eventos(object_ids, periodo2, id_type, max_depth - 1)
+            eventos2 = await self._obter_eventos_janela(app, object_ids, periodo2, id_type, max_depth - 1, filtros)
             if eventos2 is None:
                 return None
             return eventos1 + eventos2
         return resposta
 
-    def obter_eventos_wrapper(self, object_ids, periodo, id_type='objectids'):
+    def _event_body(self, object_ids, periodo, id_type, filtros):
+        params = {
+            'output': EVENT_OUTPUT_FIELDS,
+            'selectHosts': ['hostid'],
+            'time_from': periodo['start'],
+            'time_till': periodo['end'],
+            id_type: object_ids,
+            'sortfield': ["eventid"],
+            'sortorder': "ASC"
+        }
+        if filtros:
+            params.update(filtros)
+        return {'jsonrpc': '2.0', 'method': 'event.get', 'params': params, 'auth': self.token, 'id': 1}
+
+    async def _update_status_async(self, app, message):
+        """_update_status a partir do loop do Zabbix (grava no banco: roda numa thread, com contexto da app)."""
+        def _update():
+            with app.app_context():
+                self._update_status(message)
+        await asyncio.get_running_loop().run_in_executor(None, _update)
+
+    def obter_eventos_wrapper(self, object_ids, periodo, id_type='objectids', filtros=None):
+        """Eventos do período como EventTable ordenada por clock (None em caso de falha)."""
         if not object_ids:
-            return []
-        self._update_status(f"Processando eventos para {len(object_ids)} objetos em uma única chamada…")
-        all_events = self.obter_eventos(object_ids, periodo, id_type)
+            return EventTable()
+        self._update_status(f"Processando eventos para {len(object_ids)} objetos…")
+        all_events = self.obter_eventos(object_ids, periodo, id_type, filtros=filtros)
         if all_events is None:
             current_app.logger.critical("Falha crítica ao coletar eventos para os IDs. Abortando.")
             return None
-        return sorted(all_events, key=lambda x: int(x['clock']))
+        return EventTable.from_events(all_events).sorted_by_clock()
+
+    def obter_eventos_por_periodos(self, object_ids, periodos, id_type='hostids', filtros=None):
+        """
+        Eventos de vários períodos curtos (ex.: dia a dia) com um event.get por período,
+        todos num único lote JSON-RPC. Períodos cuja chamada falha são refeitos por
+        obter_eventos (janelas/quebra ao meio). Uma EventTable por período, na ordem de `periodos`.
+        """
+        if not object_ids:
+            return [EventTable() for _ in periodos]
+        respostas = self.zabbix.request_batch(
+            [self._event_body(list(object_ids), periodo, id_type, filtros) for periodo in periodos],
+            allow_retry=False
+        )
+        resultados = []
+        for periodo, resposta in zip(periodos, respostas):
+            if not isinstance(resposta, list):
+                resposta = self.obter_eventos(object_ids, periodo, id_type, filtros=filtros) or []
+            resultados.append(EventTable.from_events(resposta).sorted_by_clock())
+        return resultados
+
+    def atualizar_problemas_abertos(self, problems, chunk_size=5000):
+        """
+        Consulta de novo, direto no Zabbix (sem o cache em disco), os problemas ainda sem
+        resolução (value=1, r_eventid=0): uma resposta gravada antes da resolução traria o
+        problema aberto até o fim do período. Em caso de falha, mantém os dados recebidos.
+        Recebe e devolve EventTable.
+        """
+        open_mask = (problems.column('value') == 1) & (problems.column('r_eventid') == 0)
+        eventids = sorted({str(e) for e in problems.column('eventid')[open_mask].tolist()})
+        resolved = {}
+        for i in range(0, len(eventids), chunk_size):
+            body = {
+                'jsonrpc': '2.0',
+                'method': 'event.get',
+                'params': {'output': ['eventid', 'r_eventid'], 'eventids': eventids[i:i + chunk_size]},
+                'auth': self.token,
+                'id': 1
+            }
+            resposta = self.zabbix.request(body)
+            if not isinstance(resposta, list):
+                current_app.logger.warning(f"Falha ao atualizar problemas em aberto: {resposta}")
+                return problems
+            resolved.update({int(e['eventid']): int(e['r_eventid']) for e in resposta if int(e.get('r_eventid') or 0)})
+        return problems.with_resolutions(resolved) if resolved else problems
+
+    def obter_eventos_resolucao(self, problems, periodo, chunk_size=5000):
+        """
+        Busca somente os eventos de resolução referenciados pelos problemas (r_eventid),
+        em vez de trazer todo o fluxo de eventos do período.
+        Resoluções posteriores ao fim do período também voltam: o motor de SLA recorta os intervalos.
+        Recebe e devolve EventTable.
+        """
+        r_eventids = sorted(str(r) for r in np.unique(problems.column('r_eventid')) if r != 0)
+        resolucoes = []
+        for i in range(0, len(r_eventids), chunk_size):
+            body = {
+                'jsonrpc': '2.0',
+                'method': 'event.get',
+                'params': {
+                    'output': ['eventid', 'source', 'value', 'clock'],
+                    'eventids': r_eventids[i:i + chunk_size]
+                },
+                'auth': self.token,
+                'id': 1
+            }
+            resposta = self._cached_request('event.get', body['params'], periodo, lambda: self.zabbix.request(body))
+            if not isinstance(resposta, list):
+                current_app.logger.error(f"Falha ao buscar eventos de resolução: {resposta}")
+                return None
+            resolucoes.extend(resposta)
+        return EventTable.from_events(resolucoes)
+
+    def aggregate_trends(self, trends, items, **options):
+        """aggregate_trends (app/trend_engine.py) com a ponderação por num definida em REPORT_TREND_WEIGHTED."""
+        options.setdefault('weighted', bool(current_app.config.get('REPORT_TREND_WEIGHTED', False)))
+        return aggregate_trends(trends, items, **options)
 
     def _process_trends(self, trends, items, host_map, unit_conversion_factor=1, is_pavailable=False, agg_method='mean'):
-        if not isinstance(trends, list) or not trends:
+        if not isinstance(trends, TrendTable) or not trends:
             return pd.DataFrame(columns=['Host', 'Min', 'Max', 'Avg'])
-        df = pd.DataFrame(trends)
-        df[['value_min', 'value_avg', 'value_max']] = df[['value_min', 'value_avg', 'value_max']].astype(float)
-        item_to_host_map = {item['itemid']: item['hostid'] for item in items}
-        df['hostid'] = df['itemid'].map(item_to_host_map)
-        agg_functions = {
-            'Min': ('value_min', agg_method),
-            'Max': ('value_max', agg_method),
-            'Avg': ('value_avg', agg_method)
-        }
-        agg_results = df.groupby('hostid').agg(**agg_functions).reset_index()
-        if is_pavailable:
-            agg_results['Min_old'], agg_results['Max_old'] = agg_results['Min'], agg_results['Max']
-            agg_results['Min'], agg_results['Max'] = 100 - agg_results['Max_old'], 100 - agg_results['Min_old']
-            agg_results['Avg'] = 100 - agg_results['Avg']
-            agg_results.drop(columns=['Min_old', 'Max_old'], inplace=True)
-        for col in ['Min', 'Max', 'Avg']:
-            agg_results[col] *= unit_conversion_factor
+        agg_results = self.aggregate_trends(
+            trends, items,
+            reducer='sum' if agg_method == 'sum' else 'mean',
+            inverse=[item['itemid'] for item in items] if is_pavailable else (),
+            scale=unit_conversion_factor
+        )
         agg_results['Host'] = agg_results['hostid'].map(host_map)
         return agg_results[['Host', 'Min', 'Max', 'Avg']]
 
-    def _correlate_problems(self, problems, all_events):
-        correlated = []
-        resolution_events = {
-            p['eventid']: p for p in all_events
-            if p.get('source') == '0' and p.get('value') == '0'
-        }
-        for problem in problems:
-            r_eventid = problem.get('r_eventid', '0')
-            duration = dt.timedelta(seconds=0)
-            if r_eventid != '0' and r_eventid in resolution_events:
-                res_event = resolution_events[r_eventid]
-                if int(res_event['clock']) >= int(problem['clock']):
-                    duration = dt.timedelta(seconds=(int(res_event['clock']) - int(problem['clock'])))
-            correlated.append({
-                'hostid': problem.get('hosts')[0].get('hostid') if problem.get('hosts') else None,
-                'duration_seconds': duration.total_seconds()
-            })
-        return correlated
-
-    def _calculate_sla(self, correlated_problems, all_hosts, period):
-        period_seconds = period['end'] - period['start']
-        if period_seconds <= 0:
-            return []
-        sla_by_host = {h['hostid']: {'downtime': 0} for h in all_hosts}
-        for problem in correlated_problems:
-            if problem['hostid'] in sla_by_host:
-                sla_by_host[problem['hostid']]['downtime'] += problem['duration_seconds']
-        final_results = []
-        for host in all_hosts:
-            downtime = sla_by_host.get(host['hostid'], {}).get('downtime', 0)
-            sla_percent = max(0, 100.0 - (downtime / period_seconds * 100.0))
-            final_results.append({
-                'Host': host['nome_visivel'],
-                'IP': host['ip0'],
-                'Tempo Indisponível': str(dt.timedelta(seconds=int(downtime))),
-                'SLA (%)': sla_percent
-            })
-        return final_results
-
-    def _count_problems_by_host(self, problems, all_hosts):
-        host_map = {h['hostid']: h['nome_visivel'] for h in all_hosts}
-        problem_data = []
-        for p in problems:
-            if p.get('object') == '0' and p.get('hosts'):
-                host_name = host_map.get(p['hosts'][0]['hostid'])
-                if host_name:
-                    problem_data.append({
-                        'Host': host_name,
-                        'Problema': self._normalize_string(p['name']),
-                        'Ocorrências': 1,
-                        'clock': p['clock']
-                    })
-
-        if not problem_data:
-            return pd.DataFrame(columns=['Host', 'Problema', 'Ocorrências', 'clock'])
+    def _host_problems(self, problems, all_hosts):
+        """Problemas de trigger (object 0) dos hosts do relatório, com os nomes de host para agrupar."""
+        return problems.select(object=0).with_hosts([h for h in all_hosts if h['nome_visivel']])
 
-        df = pd.DataFrame(problem_data)
-        df_grouped = df.groupby(['Host', 'Problema', 'clock']).size().reset_index(name='Ocorrências')
+    def _count_problems_by_host(self, host_problems):
+        if not len(host_problems):
+            return pd.DataFrame(columns=['Host', 'Problema', 'Ocorrências', 'clock'])
+        df_grouped = host_problems.count_by('host', 'name', 'clock')
         return df_grouped.sort_values(by=['clock', 'Host'], ascending=True)
 
     def shared_collect_latency_and_loss(self, all_hosts, period):
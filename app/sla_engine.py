@@ -0,0 +1,102 @@
+# app/sla_engine.py
+"""
+Motor vetorizado de SLA por intervalos de indisponibilidade.
+
+Cada problema de PING vira um intervalo (host, início, fim). Os intervalos são
+recortados ao período, os sobrepostos do mesmo host são unidos e o downtime de
+todos os hosts sai de uma única passada em NumPy — sem laços por evento.
+"""
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+
+def problem_intervals(problems, resolutions, period_end):
+    """
+    Converte eventos de problema + eventos de resolução (EventTable) em arrays (hostid, start, end).
+
+    - Problema resolvido: fim = clock do evento de resolução (r_eventid).
+    - Problema ainda aberto (r_eventid == 0): fim = fim do período.
+    - Resolução desconhecida ou anterior ao início: intervalo vazio (ignorado).
+    """
+    records = problems.records[problems.records['hostid'] >= 0]
+    hostids = records['hostid']
+    starts = records['clock']
+    r_eventids = records['r_eventid']
+
+    # Resoluções de trigger (source 0, value 0); eventid repetido: vale o primeiro
+    res = resolutions.select(source=0, value=0).records
+    res_ids, first = np.unique(res['eventid'], return_index=True)
+    res_clocks = res['clock'][first]
+
+    ends = starts.copy()  # resolução não encontrada: sem duração conhecida (mesma regra de antes)
+    if len(res_ids):
+        pos = np.minimum(np.searchsorted(res_ids, r_eventids), len(res_ids) - 1)
+        found = res_ids[pos] == r_eventids
+        ends[found] = res_clocks[pos[found]]
+    ends[r_eventids == 0] = period_end
+    ends = np.maximum(ends, starts)
+
+    return hostids, starts, ends
+
+
+def merged_downtime(host_index, starts, ends, n_hosts, period_start, period_end):
+    """
+    Downtime (segundos) por host após recortar ao período e unir sobreposições.
+
+    host_index: posição do host (0..n_hosts-1) de cada intervalo; negativos são ignorados.
+    """
+    downtime = np.zeros(n_hosts, dtype=np.int64)
+    if len(starts) == 0 or period_end <= period_start:
+        return downtime
+
+    host_index = np.asarray(host_index, dtype=np.int64)
+    starts = np.clip(np.asarray(starts, dtype=np.int64), period_start, period_end)
+    ends = np.clip(np.asarray(ends, dtype=np.int64), period_start, period_end)
+    keep = (host_index >= 0) & (ends > starts)
+    if not keep.any():
+        return downtime
+    host_index, starts, ends = host_index[keep], starts[keep], ends[keep]
+
+    # Desloca cada host para uma faixa própria da reta: a união vira uma varredura global
+    span = period_end - period_start + 1
+    offset = host_index * span - period_start
+    starts, ends = starts + offset, ends + offset
+
+    order = np.lexsort((starts, host_index))
+    host_index, starts, ends = host_index[order], starts[order], ends[order]
+
+    running_end = np.maximum.accumulate(ends)
+    new_block = np.empty(len(starts), dtype=bool)
+    new_block[0] = True
+    new_block[1:] = starts[1:] > running_end[:-1]
+
+    block_pos = np.flatnonzero(new_block)
+    block_start = starts[block_pos]
+    block_end = np.maximum.reduceat(ends, block_pos)
+    np.add.at(downtime, host_index[block_pos], block_end - block_start)
+    return downtime
+
+
+def compute_sla(problems, resolutions, hosts, period):
+    """
+    SLA de todos os hosts em uma passada (problems/resolutions: EventTable). Retorna DataFrame com as colunas
+    Host, IP, Tempo Indisponível e SLA (%) na ordem de `hosts`.
+    """
+    period_start, period_end = int(period['start']), int(period['end'])
+    period_seconds = period_end - period_start
+    if period_seconds <= 0:
+        return pd.DataFrame(columns=['Host', 'IP', 'Tempo Indisponível', 'SLA (%)'])
+
+    hostids, starts, ends = problem_intervals(problems, resolutions, period_end)
+    host_index = pd.Index([int(h['hostid']) for h in hosts]).get_indexer(hostids) if len(hostids) else np.array([], dtype=np.int64)
+    downtime = merged_downtime(host_index, starts, ends, len(hosts), period_start, period_end)
+
+    sla = np.maximum(0.0, 100.0 - downtime / period_seconds * 100.0)
+    return pd.DataFrame({
+        'Host': [h['nome_visivel'] for h in hosts],
+        'IP': [h['ip0'] for h in hosts],
+        'Tempo Indisponível': [str(dt.timedelta(seconds=int(d))) for d in downtime],
+        'SLA (%)': sla,
+    })
@@ -6,6 +6,7 @@ document.addEventListener('DOMContentLoaded', function () {
     const moduleTitleInput = document.getElementById('module-title-input');
     const newPageCheck = document.getElementById('module-newpage-check');
     const addModuleBtn = document.getElementById('add-module-btn');
+    const refreshModulesBtn = document.getElementById('refresh-modules-btn');
     const layoutList = document.getElementById('report-layout-list');
     const jsonTextarea = document.getElementById('report_layout_json');
     const reportForm = document.getElementById('report-form');
@@ -13,6 +14,7 @@ document.addEventListener('DOMContentLoaded', function () {
     const statusArea = document.getElementById('status-area');
     const statusMessage = document.getElementById('status-message');
     const downloadLink = document.getElementById('download-link');
+    const statusProgress = document.getElementById('status-progress');
     const templateSelector = document.getElementById('templateSelector');
     const loadTemplateBtn = document.getElementById('loadTemplateBtn');
     const saveTemplateBtn = document.getElementById('saveTemplateBtn');
@@ -23,6 +25,7 @@ document.addEventListener('DOMContentLoaded', function () {
     let availableModules = [];
     let currentModuleToCustomize = null;
     let activePoll = null; // controle para polling de status
+    let activeStream = null; // EventSource do progresso (SSE)
 
     // ===================================================================================
     // --- CENTRO DE COMANDO DE CUSTOMIZAÇÃO DE MÓDULOS ---
@@ -142,18 +145,21 @@ document.addEventListener('DOMContentLoaded', function () {
         jsonTextarea.value = JSON.stringify(reportLayout);
     }
 
-    async function fetchClientData(clientId) {
+    async function fetchClientData(clientId, refresh = false) {
         if (!clientId) {
             moduleTypeSelect.innerHTML = '<option>Selecione um cliente primeiro</option>';
             moduleTypeSelect.disabled = true;
             addModuleBtn.disabled = true;
+            refreshModulesBtn.disabled = true;
             return;
         }
         moduleTypeSelect.innerHTML = '<option>Carregando módulos…</option>';
         moduleTypeSelect.disabled = true;
         addModuleBtn.disabled = true;
+        refreshModulesBtn.disabled = true;
 
-        const url = URLS.get_modules.replace('0', String(clientId));
+        // O servidor guarda as capacidades do cliente; refresh=1 força nova consulta ao Zabbix
+        const url = URLS.get_modules.replace('0', String(clientId)) + (refresh ? '?refresh=1' : '');
         logDebug('fetchClientData.start', { url });
 
         try {
@@ -190,6 +196,8 @@ document.addEventListener('DOMContentLoaded', function () {
         } catch (error) {
             logDebug('fetchClientData.exception', { error: String(error) });
             moduleTypeSelect.innerHTML = '<option>Erro ao carregar módulos</option>';
+        } finally {
+            refreshModulesBtn.disabled = false;
         }
     }
 
@@ -197,12 +205,97 @@ document.addEventListener('DOMContentLoaded', function () {
         statusArea.style.display = 'none';
         statusMessage.textContent = 'Iniciando...';
         statusArea.className = 'alert alert-info mt-4';
+        if (statusProgress) statusProgress.style.width = '100%';
         downloadLink.classList.add('disabled');
         downloadLink.href = '#';
         generateBtn.disabled = false;
         generateBtn.innerHTML = '<i class="bi bi-file-earmark-pdf"></i> Gerar Relatório';
     }
 
+    function formatEta(seconds) {
+        if (seconds === null || seconds === undefined) return '';
+        if (seconds < 60) return ` — ~${seconds}s restantes`;
+        return ` — ~${Math.round(seconds / 60)} min restantes`;
+    }
+
+    function stopStatusUpdates() {
+        if (activePoll) { clearInterval(activePoll); activePoll = null; }
+        if (activeStream) { activeStream.close(); activeStream = null; }
+    }
+
+    function showStatusError(message) {
+        stopStatusUpdates();
+        if (message) statusMessage.textContent = message;
+        statusArea.className = 'alert alert-danger mt-4';
+        generateBtn.disabled = false;
+        generateBtn.innerHTML = '<i class="bi bi-exclamation-triangle"></i> Tentar Novamente';
+    }
+
+    // Aplica um payload de status (SSE ou polling); retorna true quando a tarefa terminou.
+    function applyStatus(taskId, statusData) {
+        const progress = statusData.progress || {};
+        const hasPercent = typeof progress.percent === 'number' && statusData.state === 'running';
+        statusMessage.textContent = (statusData.status || 'Aguardando...') + (hasPercent ? ` (${Math.round(progress.percent)}%${formatEta(progress.eta_seconds)})` : '');
+        if (statusProgress) statusProgress.style.width = hasPercent ? `${Math.max(progress.percent, 2)}%` : '100%';
+
+        if (statusData.status === 'Concluído') {
+            stopStatusUpdates();
+            statusMessage.textContent = '✅ Relatório gerado com sucesso!';
+            if (statusProgress) statusProgress.style.width = '100%';
+            downloadLink.href = URLS.download_report.replace('0', taskId);
+            downloadLink.classList.remove('disabled');
+            generateBtn.disabled = false;
+            generateBtn.innerHTML = '<i class="bi bi-file-earmark-pdf"></i> Gerar Novo Relatório';
+            return true;
+        }
+        if (statusData.status && statusData.status.startsWith('Erro:')) {
+            showStatusError(null);
+            return true;
+        }
+        return false;
+    }
+
+    // Fallback: consulta /report_status a cada 2s
+    function startPolling(taskId) {
+        stopStatusUpdates();
+        activePoll = setInterval(async () => {
+            try {
+                const statusResponse = await fetch(URLS.report_status.replace('0', taskId));
+                if (!statusResponse.ok) throw new Error('Falha ao verificar status');
+                applyStatus(taskId, await statusResponse.json());
+            } catch (pollError) {
+                logDebug('poll.error', { error: String(pollError) });
+                showStatusError(`Erro ao consultar status: ${pollError.message}`);
+            }
+        }, 2000);
+    }
+
+    // Preferencial: progresso empurrado pelo servidor (SSE); cai para o polling se o stream falhar
+    function startProgressStream(taskId) {
+        if (!window.EventSource) { startPolling(taskId); return; }
+        stopStatusUpdates();
+        const stream = new EventSource(URLS.report_progress.replace('0', taskId));
+        activeStream = stream;
+        stream.addEventListener('progress', (event) => {
+            try {
+                applyStatus(taskId, JSON.parse(event.data));
+            } catch (parseError) {
+                logDebug('stream.parseError', { error: String(parseError) });
+            }
+        });
+        stream.addEventListener('end', () => {
+            // O payload final já chegou como 'progress'; sem ele, confirma pelo endpoint de status
+            if (activeStream === stream) startPolling(taskId);
+        });
+        stream.onerror = () => {
+            // CONNECTING = reconexão automática após o fim normal do stream; CLOSED = falha definitiva
+            if (stream.readyState === EventSource.CLOSED && activeStream === stream) {
+                logDebug('stream.closed', { taskId });
+                startPolling(taskId);
+            }
+        };
+    }
+
     // --- EVENTOS ---
 
     clientSelect.addEventListener('change', () => {
@@ -211,6 +304,10 @@ document.addEventListener('DOMContentLoaded', function () {
         renderLayoutList();
     });
 
+    refreshModulesBtn.addEventListener('click', () => {
+        fetchClientData(clientSelect.value, true);
+    });
+
     addModuleBtn.addEventListener('click', () => {
         const moduleType = moduleTypeSelect.value;
         if (!moduleType) return;
@@ -306,36 +403,7 @@ document.addEventListener('DOMContentLoaded', function () {
             const taskId = data.task_id;
 
             if (taskId) {
-                activePoll = setInterval(async () => {
-                    try {
-                        const statusResponse = await fetch(URLS.report_status.replace('0', taskId));
-                        if (!statusResponse.ok) throw new Error('Falha ao verificar status');
-                        const statusData = await statusResponse.json();
-
-                        statusMessage.textContent = statusData.status || 'Aguardando...';
-
-                        if (statusData.status === 'Concluído') {
-                            clearInterval(activePoll);
-                            statusMessage.textContent = '✅ Relatório gerado com sucesso!';
-                            downloadLink.href = URLS.download_report.replace('0', taskId);
-                            downloadLink.classList.remove('disabled');
-                            generateBtn.disabled = false;
-                            generateBtn.innerHTML = '<i class="bi bi-file-earmark-pdf"></i> Gerar Novo Relatório';
-                        } else if (statusData.status && statusData.status.startsWith('Erro:')) {
-                            clearInterval(activePoll);
-                            statusArea.className = 'alert alert-danger mt-4';
-                            generateBtn.disabled = false;
-                            generateBtn.innerHTML = '<i class="bi bi-exclamation-triangle"></i> Tentar Novamente';
-                        }
-                    } catch (pollError) {
-                        clearInterval(activePoll);
-                        logDebug('poll.error', { error: String(pollError) });
-                        statusMessage.textContent = `Erro ao consultar status: ${pollError.message}`;
-                        statusArea.className = 'alert alert-danger mt-4';
-                        generateBtn.disabled = false;
-                        generateBtn.innerHTML = '<i class="bi bi-exclamation-triangle"></i> Tentar Novamente';
-                    }
-                }, 2000);
+                startProgressStream(taskId);
             } else { throw new Error("Não foi possível iniciar a tarefa."); }
 
         } catch (error) {
@@ -0,0 +1,111 @@
+# app/trend_engine.py
+import numpy as np
+import pandas as pd
+
+from .trend_table import TrendTable
+
+# ---------------------------------
+# Agregação de trends (CPU, memória, disco, tráfego, latência, perda)
+# ---------------------------------
+#
+# Todos os módulos de métrica reduzem as trends de um mês a Min/Avg/Max por host.
+# aggregate_trends() faz isso sobre a TrendTable (colunas tipadas) com um único
+# groupby, variando só:
+#   - reducer: 'mean' (todas as linhas do host), 'sum' (soma das linhas do host),
+#     'worst' (o item de maior Avg médio do host) ou 'item' (um resultado por item);
+#   - minmax: 'mean' (média de value_min/value_max) ou 'extreme' (menor value_min
+#     e maior value_max);
+#   - inverse: itens com cálculo INVERSE (100 - valor, Min/Max trocados), aplicado
+#     ao resultado de cada grupo;
+#   - weighted: médias ponderadas pela coluna num (amostras de cada hora);
+#   - scale: fator de unidade aplicado ao final.
+
+TREND_REDUCERS = ('mean', 'sum', 'worst', 'item')
+AGGREGATE_COLUMNS = ['hostid', 'itemid', 'Min', 'Avg', 'Max']
+
+
+def aggregate_trends(trends, items, reducer='mean', minmax='mean', inverse=(), weighted=False, scale=1):
+    """
+    Min/Avg/Max por host (ou por item, com reducer='item') a partir de uma TrendTable.
+
+    items: dicts do item.get com itemid e hostid; para reducer='worst', o empate no
+    maior Avg é decidido pelo 'name' do item (ordem alfabética).
+    Retorna DataFrame com AGGREGATE_COLUMNS na ordem do groupby (hostid como texto e,
+    depois, itemid); itemid é -1 quando o grupo junta vários itens (mean/sum).
+    """
+    if reducer not in TREND_REDUCERS:
+        raise ValueError(f"reducer inválido: {reducer!r}")
+    if not isinstance(trends, TrendTable) or not len(trends) or not items:
+        return pd.DataFrame(columns=AGGREGATE_COLUMNS)
+
+    item_frame = pd.DataFrame({
+        'itemid': [int(item['itemid']) for item in items],
+        'hostid': [item['hostid'] for item in items],
+        'name': [item.get('name', '') for item in items],
+    }).drop_duplicates(subset='itemid').set_index('itemid')
+
+    df = trends.to_frame()
+    position = item_frame.index.get_indexer(df['itemid'])
+    known = position >= 0
+    df = df[known].assign(hostid=item_frame['hostid'].to_numpy()[position[known]])
+
+    per_item = reducer in ('item', 'worst')
+    keys = ['hostid', 'itemid'] if per_item else ['hostid']
+    result = _reduce(df, keys, 'sum' if reducer == 'sum' else 'mean', minmax, weighted)
+
+    if reducer == 'worst':
+        result['name'] = item_frame['name'].reindex(result['itemid']).to_numpy()
+        result = result.sort_values(['hostid', 'name'], kind='stable')
+        is_worst = result['Avg'] == result.groupby('hostid')['Avg'].transform('max')
+        result = result[is_worst].drop_duplicates(subset='hostid').drop(columns='name').reset_index(drop=True)
+    if not per_item:
+        result['itemid'] = -1
+
+    inverse = {int(itemid) for itemid in inverse}
+    if inverse:
+        if per_item:
+            flip = result['itemid'].isin(inverse).to_numpy()
+        else:
+            # Grupo por host: INVERSE só quando todos os itens do host são INVERSE
+            inverse_hosts = item_frame.assign(inv=item_frame.index.isin(inverse)).groupby('hostid')['inv'].all()
+            flip = result['hostid'].isin(inverse_hosts.index[inverse_hosts.to_numpy()]).to_numpy()
+        old_min, old_max = result['Min'].copy(), result['Max'].copy()
+        result.loc[flip, 'Min'] = 100 - old_max[flip]
+        result.loc[flip, 'Max'] = 100 - old_min[flip]
+        result.loc[flip, 'Avg'] = 100 - result.loc[flip, 'Avg']
+
+    if scale != 1:
+        for col in ('Min', 'Avg', 'Max'):
+            result[col] = result[col] * scale
+    return result[AGGREGATE_COLUMNS]
+
+
+def _reduce(df, keys, how, minmax, weighted):
+    """Um groupby sobre as colunas tipadas: médias (simples ou ponderadas por num), somas ou extremos."""
+    grouped_cols = {'Min': 'value_min', 'Avg': 'value_avg', 'Max': 'value_max'}
+    if how == 'sum':
+        return df.groupby(keys).agg(**{out: (col, 'sum') for out, col in grouped_cols.items()}).reset_index()
+
+    extremes = {'Min': 'min', 'Max': 'max'} if minmax == 'extreme' else {}
+    if not weighted:
+        spec = {out: (col, extremes.get(out, 'mean')) for out, col in grouped_cols.items()}
+        return df.groupby(keys).agg(**spec).reset_index()
+
+    # Média ponderada: soma de valor × num dividida pela soma de num, no mesmo groupby
+    weights = df['num'].to_numpy(dtype=np.float64)
+    work = df[keys].copy()
+    work['w'] = weights
+    spec = {'w': ('w', 'sum')}
+    for out, col in grouped_cols.items():
+        if out in extremes:
+            work[col] = df[col].to_numpy()
+            spec[out] = (col, extremes[out])
+        else:
+            work[f'{out}_w'] = df[col].to_numpy() * weights
+            spec[out] = (f'{out}_w', 'sum')
+    result = work.groupby(keys).agg(**spec).reset_index()
+    for out in grouped_cols:
+        if out not in extremes:
+            # Horas sem amostras (num = 0) não contam; grupo só com elas fica NaN
+            result[out] = result[out] / result['w'].where(result['w'] > 0)
+    return result.drop(columns='w')
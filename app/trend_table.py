@@ -0,0 +1,158 @@
+# app/trend_table.py
+import io
+import json
+from array import array
+
+import numpy as np
+import pandas as pd
+
+try:  # Opcional: parser incremental (backend C yajl2) para respostas grandes de trend.get
+    import ijson
+except ImportError:
+    ijson = None
+
+from .zabbix_api import decode_rpc_response
+
+# ---------------------------------
+# Trends em colunas tipadas (NumPy)
+# ---------------------------------
+#
+# Um trend.get grande virava uma lista de dicts de strings (~1 KB por linha) antes
+# de ir para o DataFrame. Aqui o `result` é decodificado direto para arrays
+# tipados, sem dict por linha:
+#   - com ijson instalado, a resposta é percorrida de forma incremental;
+#   - sem ele, o json da stdlib entrega cada objeto a um object_pairs_hook que
+#     grava os valores nas colunas e descarta o objeto.
+# orjson não é usado: ele sempre materializa a lista inteira de dicts.
+#
+# O cache em disco grava/lê a TrendTable já em colunas (ver zabbix_cache.py).
+
+TREND_FIELDS = ('itemid', 'clock', 'num', 'value_min', 'value_avg', 'value_max')
+TREND_DTYPES = {
+    'itemid': np.int64,
+    'clock': np.int64,
+    'num': np.int64,
+    'value_min': np.float64,
+    'value_avg': np.float64,
+    'value_max': np.float64,
+}
+_ARRAY_CODES = {np.int64: 'q', np.float64: 'd'}
+_ROW_KEYS = frozenset(('itemid', 'clock'))
+
+
+class TrendTable:
+    """
+    Trends do Zabbix em colunas NumPy (itemid/clock/num int64, valores float64).
+    Iterar devolve dicts no formato do Zabbix (strings), para o código que ainda
+    espera a lista de trend.get; o caminho rápido é columns/to_frame().
+    """
+    def __init__(self, columns=None):
+        columns = columns or {}
+        self.columns = {
+            field: np.asarray(columns.get(field, ()), dtype=TREND_DTYPES[field]) for field in TREND_FIELDS
+        }
+
+    @classmethod
+    def from_rows(cls, rows):
+        """A partir da lista de dicts do trend.get (ex.: entradas antigas do cache)."""
+        builder = TrendTableBuilder()
+        for row in rows:
+            builder.append_pairs(list(row.items()))
+        return builder.build()
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [t for t in tables if len(t)]
+        if len(tables) == 1:
+            return tables[0]
+        return cls({field: np.concatenate([t.columns[field] for t in tables]) if tables else ()
+                    for field in TREND_FIELDS})
+
+    def __len__(self):
+        return len(self.columns['itemid'])
+
+    def __iter__(self):
+        columns = [self.columns[field].tolist() for field in TREND_FIELDS]
+        for values in zip(*columns):
+            yield {field: str(value) for field, value in zip(TREND_FIELDS, values)}
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    def to_frame(self):
+        """DataFrame com as colunas tipadas (sem cópia das colunas numéricas)."""
+        return pd.DataFrame(self.columns, copy=False)
+
+    def to_lists(self):
+        """Colunas como listas Python (formato do cache em disco)."""
+        return {field: self.columns[field].tolist() for field in TREND_FIELDS}
+
+
+class TrendTableBuilder:
+    """Acumula linhas em array.array tipados (8 bytes por valor) até build()."""
+    def __init__(self):
+        self._buffers = {field: array(_ARRAY_CODES[TREND_DTYPES[field]]) for field in TREND_FIELDS}
+        self._targets = {
+            field: (self._buffers[field].append, int if TREND_DTYPES[field] is np.int64 else float)
+            for field in TREND_FIELDS
+        }
+
+    def append_pairs(self, pairs):
+        seen = 0
+        for key, value in pairs:
+            target = self._targets.get(key)
+            if target is not None:
+                target[0](target[1](value))
+                seen += 1
+        if seen != len(TREND_FIELDS):
+            self._fill_missing(pairs)
+
+    def _fill_missing(self, pairs):
+        # Campo ausente na linha (output diferente do pedido): completa para manter as colunas alinhadas
+        present = {key for key, _ in pairs}
+        for field in TREND_FIELDS:
+            if field not in present:
+                self._buffers[field].append(0 if TREND_DTYPES[field] is np.int64 else float('nan'))
+
+    def build(self):
+        # Cópia gravável (frombuffer é somente leitura); os buffers são liberados em seguida
+        columns = {field: np.frombuffer(buffer, dtype=TREND_DTYPES[field]).copy() if len(buffer) else ()
+                   for field, buffer in self._buffers.items()}
+        self._buffers = {field: array(buffer.typecode) for field, buffer in self._buffers.items()}
+        return TrendTable(columns)
+
+
+def decode_trend_response(content):
+    """
+    Resposta bruta (bytes) de um trend.get -> TrendTable, ou o dict de erro no mesmo
+    formato de decode_rpc_response.
+    """
+    if ijson is not None:
+        return _decode_with_ijson(content)
+    builder = TrendTableBuilder()
+
+    def _hook(pairs):
+        # Linhas de trend viram valores nas colunas; os demais objetos (envelope, erro) seguem como dict
+        if len(pairs) >= 2 and _ROW_KEYS.issubset(key for key, _ in pairs):
+            builder.append_pairs(pairs)
+            return None
+        return dict(pairs)
+
+    response_json = json.loads(content, object_pairs_hook=_hook)
+    if isinstance(response_json, dict) and 'result' in response_json:
+        return builder.build()
+    return decode_rpc_response(response_json)
+
+
+def _decode_with_ijson(content):
+    builder = TrendTableBuilder()
+    rows = 0
+    for row in ijson.items(io.BytesIO(content), 'result.item'):
+        builder.append_pairs(list(row.items()))
+        rows += 1
+    if rows:
+        return builder.build()
+    # Sem linhas: resposta pequena (vazia ou erro), decodificada inteira
+    response_json = json.loads(content)
+    return TrendTable() if 'result' in response_json else decode_rpc_response(response_json)
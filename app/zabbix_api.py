@@ -1,33 +1,394 @@
 # app/zabbix_api.py
+import re
+import atexit
 import requests
 import json
 import time
 import logging
+import threading
+from requests.adapters import HTTPAdapter
 
-def fazer_request_zabbix(body, zabbix_url, allow_retry=True):
-    headers = {'Content-Type': 'application/json-rpc', 'Accept-Encoding': 'gzip'}
-    max_retries = 2 if allow_retry else 1
-    for attempt in range(max_retries):
+from .metrics import observe_zabbix_request, observe_zabbix_batch, ZABBIX_TOKEN_LOOKUPS
+
+# --- Parâmetros padrão da sessão HTTP (sobrescritos via configure_zabbix_clients) ---
+_CLIENT_DEFAULTS = {
+    'pool_size': 10,
+    'keepalive': True,
+    'gzip': True,
+    'timeout': 120,
+}
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+# Erros do Zabbix que indicam sessão expirada/encerrada (5.x: "Session terminated, re-login, please.")
+_SESSION_ERROR_RE = re.compile(r'session terminated|re-login|not authori[sz]ed', re.IGNORECASE)
+
+
+class ZabbixClient:
+    """
+    Cliente JSON-RPC do Zabbix com sessão HTTP persistente (keep-alive) e
+    pool de conexões. Uma instância por URL é compartilhada entre as threads
+    de geração de relatório (requests.Session é seguro para uso concorrente
+    desde que a configuração não seja alterada após a criação).
+    """
+    def __init__(self, zabbix_url, pool_size=10, keepalive=True, gzip=True, timeout=120):
+        self.url = zabbix_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json-rpc',
+            'Accept-Encoding': 'gzip' if gzip else 'identity',
+        })
+        if not keepalive:
+            self.session.headers['Connection'] = 'close'
+        # Desligado na primeira recusa de lote JSON-RPC pelo servidor (request_batch cai para chamadas individuais)
+        self.batch_supported = True
+
+    def request(self, body, allow_retry=True, stats=None):
+        """
+        Executa a chamada JSON-RPC. Se `stats` (dict) for informado, recebe 'bytes'
+        (tamanho da resposta) e 'retries' (novas tentativas após erro 5xx).
+        """
+        stats = stats if stats is not None else {}
+        auth = body.get('auth')
+        if auth:
+            # Cópias antigas do token (ex.: guardadas por coletores) seguem para a sessão renovada
+            current = _TOKENS.current(auth)
+            if current != auth:
+                body = dict(body, auth=current)
+        started = time.perf_counter()
+        result = self._send(body, allow_retry, stats)
+        # user.logout de uma sessão expirada não é renovado (quem encerra já segura o lock da sessão)
+        if auth and body.get('method') != 'user.logout' and is_session_error(result):
+            renewed = _TOKENS.renew(body['auth'])
+            if renewed:
+                logging.info(f"[zabbix_api] Sessão do Zabbix renovada; repetindo {body.get('method')}.")
+                body = dict(body, auth=renewed)
+                result = self._send(body, allow_retry, stats)
+        observe_zabbix_request(body.get('method', '?'), time.perf_counter() - started, result, stats)
+        return result
+
+    def _send(self, body, allow_retry, stats, decode=True):
+        max_retries = 2 if allow_retry else 1
+        for attempt in range(max_retries):
+            stats['retries'] = attempt
+            try:
+                response = self.session.post(self.url, data=json.dumps(body), timeout=self.timeout)
+                stats['bytes'] = len(response.content)
+                if response.status_code >= 500 and attempt < max_retries - 1:
+                    logging.warning(f"Servidor Zabbix retornou erro {response.status_code}. Tentando novamente...")
+                    time.sleep(5)
+                    continue
+                response.raise_for_status()
+                return decode_rpc_response(response.json()) if decode else response.json()
+            except requests.exceptions.RequestException as e:
+                logging.error(f"ERRO DE CONEXÃO: Falha ao conectar com a API do Zabbix: {e}")
+                return {'error': 'RequestException', 'details': str(e)}
+        return None
+
+    def request_batch(self, bodies, allow_retry=True, stats=None):
+        """
+        Várias chamadas num único POST (lote JSON-RPC 2.0). Devolve os resultados na
+        ordem de `bodies`, cada um com o mesmo contrato de request(): o erro de uma
+        chamada fica só na sua posição; falha de transporte se repete em todas.
+        """
+        bodies = list(bodies)
+        if len(bodies) < 2 or not self.batch_supported:
+            return [self.request(body, allow_retry=allow_retry) for body in bodies]
+        stats = stats if stats is not None else {}
+        calls = []
+        for index, body in enumerate(bodies, start=1):
+            # Os ids do lote são atribuídos aqui: é por eles que as respostas voltam para cada posição
+            call = dict(body, id=index)
+            if call.get('auth'):
+                call['auth'] = _TOKENS.current(call['auth'])
+            calls.append(call)
+        started = time.perf_counter()
+        results = self._send_batch(calls, allow_retry, stats)
+        stale = [i for i, result in enumerate(results)
+                 if calls[i].get('auth') and calls[i].get('method') != 'user.logout' and is_session_error(result)]
+        if stale:
+            renewed = {}
+            for i in stale:
+                old_token = calls[i]['auth']
+                if old_token not in renewed:
+                    renewed[old_token] = _TOKENS.renew(old_token)
+            retry = [i for i in stale if renewed.get(calls[i]['auth'])]
+            if retry:
+                logging.info(f"[zabbix_api] Sessão do Zabbix renovada; repetindo {len(retry)} chamada(s) do lote.")
+                for i in retry:
+                    calls[i] = dict(calls[i], auth=renewed[calls[i]['auth']])
+                for i, result in zip(retry, self._send_batch([calls[i] for i in retry], allow_retry, stats)):
+                    results[i] = result
+        observe_zabbix_batch([call.get('method', '?') for call in calls], time.perf_counter() - started, results, stats)
+        return results
+
+    def _send_batch(self, calls, allow_retry, stats):
+        response_json = self._send(calls, allow_retry, stats, decode=False)
+        if isinstance(response_json, dict) and 'jsonrpc' not in response_json:
+            # Erro de transporte/HTTP (mesmo formato do request): vale para todas as chamadas
+            return [dict(response_json) for _ in calls]
+        if response_json is None:
+            return [None for _ in calls]
+        if not isinstance(response_json, list):
+            # Servidor sem suporte a lote responde um único erro "Invalid Request": segue chamada a chamada
+            logging.warning("[zabbix_api] Servidor Zabbix não aceitou lote JSON-RPC; usando chamadas individuais.")
+            self.batch_supported = False
+            return [self._send(call, allow_retry, stats) for call in calls]
+        by_id = {entry.get('id'): entry for entry in response_json if isinstance(entry, dict)}
+        results = []
+        for call in calls:
+            entry = by_id.get(call['id'])
+            if entry is None:
+                details = f"Resposta ausente no lote JSON-RPC para {call.get('method')} (id {call['id']})"
+                logging.error(f"ERRO API Zabbix: {details}")
+                results.append({'error': 'APIError', 'details': details})
+            else:
+                results.append(decode_rpc_response(entry))
+        return results
+
+    def close(self):
+        self.session.close()
+
+
+def decode_rpc_response(response_json):
+    """Resultado de uma resposta JSON-RPC já decodificada ({'error': 'APIError', ...} em caso de erro)."""
+    if 'result' in response_json:
+        return response_json['result']
+    elif 'error' in response_json:
+        error_details = f"{response_json['error']['message']}: {response_json['error']['data']}"
+        logging.error(f"ERRO API Zabbix: {error_details}")
+        return {'error': 'APIError', 'details': error_details}
+    return []
+
+
+def is_session_error(result):
+    return (isinstance(result, dict) and result.get('error') == 'APIError'
+            and bool(_SESSION_ERROR_RE.search(str(result.get('details', '')))))
+
+
+class _ZabbixSession:
+    def __init__(self, url, user):
+        self.url = url
+        self.user = user
+        self.password = None
+        self.token = None
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+
+
+class ZabbixTokenManager:
+    """
+    Sessões do Zabbix compartilhadas pelo processo, uma por (URL, usuário).
+
+    Cada user.login custa um bcrypt no servidor e cria uma sessão que ninguém
+    encerrava; aqui o token é reaproveitado por todas as requisições/relatórios,
+    renovado quando o Zabbix responde "Session terminated" (ou após idle_seconds
+    sem uso) e a sessão antiga é encerrada com user.logout. API tokens (Zabbix 5.4+)
+    são usados diretamente, sem login.
+    """
+    MAX_SUPERSEDED = 256
+
+    def __init__(self, idle_seconds=600):
+        self.idle_seconds = idle_seconds
+        self._sessions = {}
+        self._by_token = {}
+        self._superseded = {}
+        self._lock = threading.Lock()
+        self._counts = {'hit': 0, 'login': 0, 'refresh': 0, 'api_token': 0, 'error': 0}
+
+    def _count(self, result):
+        with self._lock:
+            self._counts[result] += 1
+        ZABBIX_TOKEN_LOOKUPS.inc(result=result)
+
+    def get_token(self, url, user, password, api_token=None):
+        """Token válido para (url, user): (token, erro). Só faz user.login quando necessário."""
+        if api_token:
+            self._count('api_token')
+            return api_token, None
+        with self._lock:
+            session = self._sessions.setdefault((url, user), _ZabbixSession(url, user))
+        with session.lock:
+            idle = time.time() - session.last_used
+            if session.token and session.password == password and (not self.idle_seconds or idle < self.idle_seconds):
+                session.last_used = time.time()
+                self._count('hit')
+                return session.token, None
+            if session.token:
+                self._retire(session, logout=True)
+            session.password = password
+            return self._login(session, 'login')
+
+    def current(self, token):
+        """Token a usar no lugar de `token` (o mesmo, ou o que o substituiu) e marca o uso da sessão."""
+        with self._lock:
+            session = self._superseded.get(token) or self._by_token.get(token)
+        if session is None:
+            return token
+        session.last_used = time.time()
+        return session.token or token
+
+    def renew(self, stale_token):
+        """Após "Session terminated": novo login da sessão dona do token (uma vez, mesmo com várias threads)."""
+        with self._lock:
+            session = self._by_token.get(stale_token) or self._superseded.get(stale_token)
+        if session is None or session.password is None:
+            return None  # API token ou token de fora do gerenciador
+        with session.lock:
+            if session.token and session.token != stale_token:
+                return session.token  # outra thread já renovou
+            if session.token:
+                self._retire(session, logout=False)  # o servidor já encerrou esta sessão
+            token, _ = self._login(session, 'refresh')
+            return token
+
+    def _login(self, session, result):
+        body = {'jsonrpc': '2.0', 'method': 'user.login',
+                'params': {'username': session.user, 'password': session.password}, 'id': 1}
+        response = get_zabbix_client(session.url).request(body)
+        if not response or not isinstance(response, str):
+            self._count('error')
+            details = response.get('details', 'N/A') if isinstance(response, dict) else 'Erro desconhecido'
+            return None, details
+        session.token = response
+        session.last_used = time.time()
+        with self._lock:
+            self._by_token[response] = session
+        self._count(result)
+        return response, None
+
+    def _retire(self, session, logout):
+        old_token, session.token = session.token, None
+        with self._lock:
+            self._by_token.pop(old_token, None)
+            self._superseded[old_token] = session
+            while len(self._superseded) > self.MAX_SUPERSEDED:
+                self._superseded.pop(next(iter(self._superseded)))
+        if logout:
+            self._logout(session.url, old_token)
+
+    @staticmethod
+    def _logout(url, token):
+        body = {'jsonrpc': '2.0', 'method': 'user.logout', 'params': [], 'auth': token, 'id': 1}
         try:
-            response = requests.post(zabbix_url, headers=headers, data=json.dumps(body), timeout=120)
-            # response = requests.post(zabbix_url, headers=headers, data=json.dumps(body), verify=False, timeout=120)
-            if response.status_code >= 500 and attempt < max_retries - 1:
-                logging.warning(f"Servidor Zabbix retornou erro {response.status_code}. Tentando novamente...")
-                time.sleep(5)
-                continue
-            response.raise_for_status()
-            response_json = response.json()
-            if 'result' in response_json:
-                return response_json['result']
-            elif 'error' in response_json:
-                error_details = f"{response_json['error']['message']}: {response_json['error']['data']}"
-                logging.error(f"ERRO API Zabbix: {error_details}")
-                return {'error': 'APIError', 'details': error_details}
-            return []
-        except requests.exceptions.RequestException as e:
-            logging.error(f"ERRO DE CONEXÃO: Falha ao conectar com a API do Zabbix: {e}")
-            return {'error': 'RequestException', 'details': str(e)}
-    return None
+            get_zabbix_client(url).request(body, allow_retry=False)
+        except Exception as e:
+            logging.debug(f"[zabbix_api] Falha ao encerrar sessão do Zabbix em {url}: {e}")
+
+    def stats(self):
+        """Contagens por resultado e taxa de reaproveitamento (hit_rate) das sessões com login."""
+        with self._lock:
+            counts = dict(self._counts)
+        logins = counts['login'] + counts['refresh']
+        counts['hit_rate'] = round(counts['hit'] / (counts['hit'] + logins), 4) if counts['hit'] + logins else None
+        return counts
+
+    def close_all(self):
+        """Encerra (user.logout) todas as sessões abertas por este processo."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            with session.lock:
+                if session.token:
+                    self._retire(session, logout=True)
+
+
+_TOKENS = ZabbixTokenManager()
+atexit.register(_TOKENS.close_all)
+
+
+def get_token_manager():
+    return _TOKENS
+
+
+class AdaptiveChunkSizer:
+    """
+    Ajusta o tamanho dos lotes (ex.: itemids por trend.get) a partir do que foi
+    observado nas chamadas anteriores: linhas retornadas por item e segundos por linha.
+    O objetivo é manter cada resposta perto de target_rows linhas e abaixo de
+    target_seconds, sem ultrapassar os limites [minimum, maximum].
+    """
+    def __init__(self, initial, minimum=1, maximum=1000, target_rows=50000, target_seconds=20.0):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.target_rows = max(1, int(target_rows))
+        self.target_seconds = float(target_seconds)
+        self._size = min(max(int(initial), self.minimum), self.maximum)
+        self._rows_per_unit = None
+        self._seconds_per_row = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        with self._lock:
+            return self._size
+
+    def record(self, units, rows, elapsed):
+        """Registra uma chamada bem-sucedida (units = itens pedidos, rows = linhas recebidas)."""
+        if units <= 0:
+            return
+        with self._lock:
+            rows_per_unit = max(rows, 1) / units
+            seconds_per_row = elapsed / max(rows, 1)
+            # Média móvel exponencial para suavizar respostas atípicas
+            self._rows_per_unit = rows_per_unit if self._rows_per_unit is None else 0.7 * self._rows_per_unit + 0.3 * rows_per_unit
+            self._seconds_per_row = seconds_per_row if self._seconds_per_row is None else 0.7 * self._seconds_per_row + 0.3 * seconds_per_row
+            by_rows = self.target_rows / self._rows_per_unit
+            by_time = self.target_seconds / max(self._seconds_per_row * self._rows_per_unit, 1e-9)
+            self._size = int(min(max(min(by_rows, by_time), self.minimum), self.maximum))
+
+    def shrink(self):
+        """Reduz o lote pela metade após erro/timeout."""
+        with self._lock:
+            self._size = max(self.minimum, self._size // 2)
+
+
+def configure_zabbix_clients(app_config):
+    """Aplica os parâmetros de pool/keep-alive/gzip/timeout definidos na configuração da aplicação."""
+    _CLIENT_DEFAULTS.update({
+        'pool_size': app_config.get('ZABBIX_POOL_SIZE', _CLIENT_DEFAULTS['pool_size']),
+        'keepalive': app_config.get('ZABBIX_KEEPALIVE', _CLIENT_DEFAULTS['keepalive']),
+        'gzip': app_config.get('ZABBIX_GZIP', _CLIENT_DEFAULTS['gzip']),
+        'timeout': app_config.get('ZABBIX_TIMEOUT', _CLIENT_DEFAULTS['timeout']),
+    })
+    _TOKENS.idle_seconds = int(app_config.get('ZABBIX_SESSION_IDLE_SECONDS', _TOKENS.idle_seconds) or 0)
+    # Sessões já abertas foram criadas com os parâmetros antigos
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            client.close()
+        _CLIENTS.clear()
+
+
+def get_zabbix_client(zabbix_url):
+    """Retorna o cliente compartilhado (sessão com pool) para a URL informada."""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(zabbix_url)
+        if client is None:
+            client = ZabbixClient(zabbix_url, **_CLIENT_DEFAULTS)
+            _CLIENTS[zabbix_url] = client
+        return client
+
+
+def new_zabbix_client(zabbix_url):
+    """
+    Cliente avulso (fora do cache por URL) para URLs de uso único, como o teste de
+    conexão do admin; quem cria deve chamar close().
+    """
+    return ZabbixClient(zabbix_url, **dict(_CLIENT_DEFAULTS, pool_size=1))
+
+
+def fazer_request_zabbix(body, zabbix_url, allow_retry=True):
+    """Fachada síncrona sobre o cliente assíncrono (limite por servidor e coalescência de chamadas)."""
+    from .zabbix_async import request_sync
+    return request_sync(body, zabbix_url, allow_retry=allow_retry)
+
+def fazer_batch_zabbix(bodies, zabbix_url, allow_retry=True):
+    """Várias chamadas num único POST (lote JSON-RPC); resultados na ordem de `bodies`."""
+    return get_zabbix_client(zabbix_url).request_batch(bodies, allow_retry=allow_retry)
 
 def obter_config_e_token_zabbix(app_config, task_id="generic_task"):
     is_threaded_task = task_id != "generic_task"
@@ -42,26 +403,26 @@ def obter_config_e_token_zabbix(app_config, task_id="generic_task"):
         'ZABBIX_PASSWORD': app_config['ZABBIX_PASSWORD'],
         'ZABBIX_TOKEN': app_config.get('ZABBIX_TOKEN')
     }
-    if not all([config_zabbix['ZABBIX_URL'], config_zabbix['ZABBIX_USER'], config_zabbix['ZABBIX_PASSWORD']]):
+    # Com API token (Zabbix 5.4+) usuário/senha são dispensáveis
+    has_credentials = config_zabbix['ZABBIX_TOKEN'] or (config_zabbix['ZABBIX_USER'] and config_zabbix['ZABBIX_PASSWORD'])
+    if not (config_zabbix['ZABBIX_URL'] and has_credentials):
         return None, "Variáveis de ambiente do Zabbix (URL, USER, PASSWORD) não configuradas."
 
-    if not config_zabbix.get('ZABBIX_TOKEN'):
-        body = {'jsonrpc': '2.0', 'method': 'user.login', 'params': {'username': config_zabbix['ZABBIX_USER'], 'password': config_zabbix['ZABBIX_PASSWORD']}, 'id': 1}
-        token_response = fazer_request_zabbix(body, config_zabbix['ZABBIX_URL'])
-        if token_response and 'error' not in token_response:
-            config_zabbix['ZABBIX_TOKEN'] = token_response
-            if is_threaded_task:
-                # Remova a chamada para a função update_status, pois ela não pertence a este módulo
-                pass
-        else:
-            details = token_response.get('details', 'N/A') if isinstance(token_response, dict) else 'Erro desconhecido'
-            return None, f"Falha no login do Zabbix. Verifique as credenciais. Detalhes: {details}"
+    # Sessão reaproveitada entre relatórios e requisições (login só quando não há token válido)
+    token, details = _TOKENS.get_token(
+        config_zabbix['ZABBIX_URL'], config_zabbix['ZABBIX_USER'], config_zabbix['ZABBIX_PASSWORD'],
+        api_token=config_zabbix['ZABBIX_TOKEN']
+    )
+    if not token:
+        return None, f"Falha no login do Zabbix. Verifique as credenciais. Detalhes: {details}"
+    config_zabbix['ZABBIX_TOKEN'] = token
 
     return config_zabbix, None
 
-def get_host_groups(config, url):
+def get_host_groups(config, url, client=None):
     """
     Busca todos os grupos de hosts disponíveis no Zabbix.
+    client: cliente já aberto (ex.: o avulso do teste de conexão); padrão é o compartilhado da URL.
     """
     body = {
         "jsonrpc": "2.0",
@@ -73,7 +434,7 @@ def get_host_groups(config, url):
         "auth": config['ZABBIX_TOKEN'],
         "id": 1
     }
-    response = fazer_request_zabbix(body, url)
+    response = (client or get_zabbix_client(url)).request(body)
     if isinstance(response, list):
         return response
     # Retorna lista vazia em caso de erro ou resposta inesperada
@@ -0,0 +1,233 @@
+# app/zabbix_async.py
+import json
+import time
+import atexit
+import asyncio
+import logging
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:  # Dependência do projeto; a ausência só é tolerada como contingência (requests em threads)
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .zabbix_api import get_zabbix_client, get_token_manager, decode_rpc_response, is_session_error
+from .metrics import observe_zabbix_request, ZABBIX_COALESCED
+
+# ---------------------------------
+# Cliente JSON-RPC assíncrono (Zabbix)
+# ---------------------------------
+#
+# As buscas com muitas chamadas (trend.get em lotes, event.get em janelas) rodam
+# como corrotinas num único event loop do processo, em vez de uma thread por chamada:
+#   - um semáforo por servidor (ZABBIX_ASYNC_CONCURRENCY) limita as chamadas em voo
+#     somando todos os relatórios do processo;
+#   - chamadas *.get idênticas em voo (mesmo método/parâmetros/token) são feitas uma
+#     única vez e a resposta é decodificada para cada chamador;
+#   - run_sync()/request_sync() são a fachada síncrona para o código existente.
+#
+# O transporte é o aiohttp (requirements.txt). Se ele faltar na instalação, a sessão
+# requests do ZabbixClient é usada num pool de threads, sob o mesmo semáforo: funciona,
+# mas volta a ser uma thread por chamada em voo (aviso no log ao configurar).
+
+_ASYNC_DEFAULTS = {
+    'concurrency': 8,
+    'timeout': 120,
+}
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+# Usado pelo transporte sem aiohttp e para logins de renovação (bloqueantes)
+_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="zabbix-async-io")
+
+_TRANSPORT_ERRORS = (requests.exceptions.RequestException, asyncio.TimeoutError) + (
+    (aiohttp.ClientError,) if aiohttp is not None else ()
+)
+
+
+class AsyncZabbixClient:
+    """Cliente de um servidor Zabbix no loop do processo (mesmo contrato de retorno do ZabbixClient.request)."""
+    def __init__(self, zabbix_url, concurrency=8, timeout=120):
+        self.url = zabbix_url
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+        self._concurrency = max(1, int(concurrency))
+        self._inflight = {}
+        self._session = None
+
+    async def request(self, body, allow_retry=True, stats=None, decoder=None):
+        """
+        decoder: função bytes -> resultado (ex.: decode_trend_response) no lugar do
+        json + decode_rpc_response padrão; cada chamador coalescido decodifica a sua cópia.
+        """
+        stats = stats if stats is not None else {}
+        tokens = get_token_manager()
+        auth = body.get('auth')
+        if auth:
+            current = tokens.current(auth)
+            if current != auth:
+                body = dict(body, auth=current)
+        started = time.perf_counter()
+        result = await self._request_coalesced(body, allow_retry, stats, decoder)
+        if auth and body.get('method') != 'user.logout' and is_session_error(result):
+            loop = asyncio.get_running_loop()
+            renewed = await loop.run_in_executor(_EXECUTOR, tokens.renew, body['auth'])
+            if renewed:
+                logging.info(f"[zabbix_async] Sessão do Zabbix renovada; repetindo {body.get('method')}.")
+                body = dict(body, auth=renewed)
+                result = await self._request_coalesced(body, allow_retry, stats, decoder)
+        observe_zabbix_request(body.get('method', '?'), time.perf_counter() - started, result, stats)
+        return result
+
+    async def _request_coalesced(self, body, allow_retry, stats, decoder=None):
+        method = body.get('method', '')
+        if not method.endswith('.get'):
+            return self._decode(await self._post(body, allow_retry, stats), decoder)
+        key = json.dumps({k: v for k, v in body.items() if k != 'id'}, sort_keys=True, default=str)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._post(body, allow_retry, stats))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            ZABBIX_COALESCED.inc(method=method)
+        # shield: se um dos chamadores for cancelado, os demais continuam esperando a mesma resposta
+        return self._decode(await asyncio.shield(task), decoder)
+
+    async def _post(self, body, allow_retry, stats):
+        """Bytes da resposta, ou o dict de erro/None no mesmo formato do cliente síncrono."""
+        max_retries = 2 if allow_retry else 1
+        payload = json.dumps(body)
+        for attempt in range(max_retries):
+            stats['retries'] = attempt
+            try:
+                async with self._semaphore:
+                    status, content = await self._transport(payload)
+            except _TRANSPORT_ERRORS as e:
+                logging.error(f"ERRO DE CONEXÃO: Falha ao conectar com a API do Zabbix: {e}")
+                return {'error': 'RequestException', 'details': str(e)}
+            stats['bytes'] = len(content)
+            if status >= 500 and attempt < max_retries - 1:
+                logging.warning(f"Servidor Zabbix retornou erro {status}. Tentando novamente...")
+                await asyncio.sleep(5)
+                continue
+            if status >= 400:
+                logging.error(f"ERRO DE CONEXÃO: Falha ao conectar com a API do Zabbix: HTTP {status}")
+                return {'error': 'RequestException', 'details': f"HTTP {status}"}
+            return content
+        return None
+
+    async def _transport(self, payload):
+        if aiohttp is not None:
+            session = self._get_session()
+            async with session.post(self.url, data=payload) as response:
+                return response.status, await response.read()
+        sync_client = get_zabbix_client(self.url)
+        post = functools.partial(sync_client.session.post, self.url, data=payload, timeout=sync_client.timeout)
+        response = await asyncio.get_running_loop().run_in_executor(_EXECUTOR, post)
+        return response.status_code, response.content
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=self._concurrency),
+                headers={'Content-Type': 'application/json-rpc'},
+            )
+        return self._session
+
+    @staticmethod
+    def _decode(outcome, decoder=None):
+        if not isinstance(outcome, (bytes, bytearray)):
+            return dict(outcome) if isinstance(outcome, dict) else outcome
+        try:
+            if decoder is not None:
+                return decoder(outcome)
+            return decode_rpc_response(json.loads(outcome))
+        except ValueError as e:
+            logging.error(f"ERRO DE CONEXÃO: Resposta inválida da API do Zabbix: {e}")
+            return {'error': 'RequestException', 'details': str(e)}
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+def _get_loop():
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="zabbix-async", daemon=True).start()
+            _LOOP = loop
+        return _LOOP
+
+
+def _close_clients():
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    if clients and _LOOP is not None and not _LOOP.is_closed():
+        for client in clients:
+            future = asyncio.run_coroutine_threadsafe(client.close(), _LOOP)
+            try:
+                future.result(timeout=5)
+            except Exception:
+                pass
+
+
+atexit.register(_close_clients)
+
+
+def configure_async_zabbix(app_config):
+    """Aplica o limite de chamadas simultâneas por servidor (ZABBIX_ASYNC_CONCURRENCY) e o timeout."""
+    _ASYNC_DEFAULTS.update({
+        'concurrency': app_config.get('ZABBIX_ASYNC_CONCURRENCY', _ASYNC_DEFAULTS['concurrency']),
+        'timeout': app_config.get('ZABBIX_TIMEOUT', _ASYNC_DEFAULTS['timeout']),
+    })
+    _close_clients()
+    if aiohttp is None:
+        logging.warning("[zabbix_async] aiohttp não instalado (ver requirements.txt); chamadas assíncronas "
+                        "usam requests em threads, uma por chamada em voo.")
+
+
+def get_async_client(zabbix_url):
+    """Cliente assíncrono compartilhado (um semáforo por servidor) para a URL informada."""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(zabbix_url)
+        if client is None:
+            client = AsyncZabbixClient(zabbix_url, **_ASYNC_DEFAULTS)
+            _CLIENTS[zabbix_url] = client
+        return client
+
+
+def run_sync(coro):
+    """Fachada síncrona: executa a corrotina no loop do processo e devolve o resultado."""
+    loop = _get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync() chamado de dentro do loop assíncrono do Zabbix.")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def request_sync(body, zabbix_url, allow_retry=True, stats=None):
+    """Uma chamada pelo cliente assíncrono, para código síncrono."""
+    return run_sync(get_async_client(zabbix_url).request(body, allow_retry=allow_retry, stats=stats))
+
+
+def request_many_sync(bodies, zabbix_url, allow_retry=True):
+    """Várias chamadas concorrentes (limitadas pelo semáforo do servidor); resultados na mesma ordem."""
+    client = get_async_client(zabbix_url)
+
+    async def _gather():
+        return await asyncio.gather(*(client.request(body, allow_retry=allow_retry) for body in bodies))
+
+    return run_sync(_gather())
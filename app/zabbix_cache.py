@@ -0,0 +1,249 @@
+# app/zabbix_cache.py
+import os
+import json
+import time
+import zlib
+import hashlib
+import logging
+import threading
+
+from .trend_table import TrendTable
+
+# --- Parâmetros padrão do cache em disco (sobrescritos via configure_zabbix_cache) ---
+_CACHE_DEFAULTS = {
+    'enabled': True,
+    'directory': os.path.join(os.getcwd(), 'zabbix_cache'),
+    'max_bytes': 512 * 1024 * 1024,
+    'open_ttl': 900,
+}
+# Trends são consolidadas de hora em hora: um período só é "fechado" depois desta folga
+_CLOSED_PERIOD_GRACE = 2 * 3600
+# Gravações entre varreduras completas do diretório (o total de bytes é mantido em
+# memória, mas outros processos, ex. workers do gunicorn, gravam no mesmo diretório)
+_RESCAN_WRITES = 256
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+class ZabbixDiskCache:
+    """
+    Cache em disco das respostas do Zabbix (trend.get, item.get, event.get).
+    Chave: (URL do Zabbix, método, parâmetros normalizados, período).
+
+    Cada entrada é gravada em formato colunar (uma lista por campo) serializado em
+    JSON e comprimido com zlib, o que reduz bastante o tamanho de respostas com
+    milhares de linhas repetindo os mesmos nomes de campo. TrendTable (trend.get)
+    é gravada e lida já tipada, sem passar por dicts.
+
+    Períodos fechados (mês já encerrado) não expiram; períodos abertos (ou sem
+    período, como item.get) expiram após open_ttl segundos. event.get com problema
+    ainda não resolvido também expira pelo open_ttl, mesmo em período fechado: o
+    r_eventid do problema muda quando ele for resolvido. Quando o diretório passa
+    de max_bytes, as entradas menos usadas recentemente são removidas.
+    """
+    SUFFIX = '.rzc'
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, open_ttl=900):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.open_ttl = int(open_ttl)
+        self._lock = threading.Lock()
+        self._size = None  # bytes no diretório (None = ainda não varrido)
+        self._writes = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    # --- Chave ---
+    @staticmethod
+    def _normalize(value):
+        if isinstance(value, dict):
+            return {str(k): ZabbixDiskCache._normalize(v) for k, v in sorted(value.items())}
+        if isinstance(value, (list, tuple, set)):
+            items = [ZabbixDiskCache._normalize(v) for v in value]
+            # Listas de ids/campos não dependem de ordem para o resultado
+            if all(isinstance(v, (str, int, float)) for v in items):
+                return sorted({str(v) for v in items})
+            return items
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        return str(value)
+
+    def make_key(self, zabbix_url, method, params, period=None):
+        period_key = [int(period['start']), int(period['end'])] if period else None
+        raw = json.dumps(
+            [zabbix_url, method, self._normalize(params or {}), period_key],
+            sort_keys=True, separators=(',', ':')
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.SUFFIX)
+
+    @staticmethod
+    def is_closed(period):
+        return bool(period) and int(period['end']) + _CLOSED_PERIOD_GRACE < time.time()
+
+    @staticmethod
+    def has_open_problems(method, rows):
+        """event.get com algum problema sem resolução (value=1, r_eventid=0)."""
+        if method != 'event.get' or not isinstance(rows, list):
+            return False
+        return any(str(row.get('value')) == '1' and str(row.get('r_eventid') or '0') == '0' for row in rows)
+
+    # --- Codificação colunar ---
+    @staticmethod
+    def _encode(rows, closed):
+        if isinstance(rows, TrendTable):
+            payload = {'v': 1, 'closed': closed, 'created': int(time.time()), 'n': len(rows),
+                       'table': 'trend', 'data': rows.to_lists()}
+            return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), 6)
+        columns = []
+        for row in rows:
+            for field in row:
+                if field not in columns:
+                    columns.append(field)
+        data = {field: [row.get(field) for row in rows] for field in columns}
+        payload = {'v': 1, 'closed': closed, 'created': int(time.time()), 'n': len(rows), 'columns': columns, 'data': data}
+        return zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'), 6)
+
+    @staticmethod
+    def _decode(blob):
+        payload = json.loads(zlib.decompress(blob).decode('utf-8'))
+        if payload.get('table') == 'trend':
+            return payload, TrendTable(payload['data'])
+        columns, data = payload['columns'], payload['data']
+        rows = []
+        for i in range(payload['n']):
+            # O Zabbix nunca devolve null: None indica campo ausente naquela linha
+            rows.append({field: data[field][i] for field in columns if data[field][i] is not None})
+        return payload, rows
+
+    # --- Leitura / escrita ---
+    def get(self, zabbix_url, method, params, period=None):
+        path = self._path(self.make_key(zabbix_url, method, params, period))
+        try:
+            with open(path, 'rb') as fh:
+                payload, rows = self._decode(fh.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"[ZabbixDiskCache] Entrada corrompida descartada ({path}): {e}")
+            self._remove(path)
+            return None
+        if not payload.get('closed') and time.time() - payload.get('created', 0) > self.open_ttl:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # marca uso recente para a política LRU
+        except OSError:
+            pass
+        return rows
+
+    def set(self, zabbix_url, method, params, period, rows):
+        if not isinstance(rows, (list, TrendTable)):
+            return
+        path = self._path(self.make_key(zabbix_url, method, params, period))
+        try:
+            closed = self.is_closed(period) and not self.has_open_problems(method, rows)
+            blob = self._encode(rows, closed)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            # pid + thread: workers do gunicorn compartilham o diretório e podem repetir o ident da thread
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as fh:
+                fh.write(blob)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.warning(f"[ZabbixDiskCache] Falha ao gravar entrada de cache ({method}): {e}")
+            return
+        self._account(len(blob) - previous)
+
+    def get_or_fetch(self, zabbix_url, method, params, period, fetch):
+        """Leitura através do cache: só chama fetch() em caso de ausência; grava apenas respostas válidas (lista/TrendTable)."""
+        rows = self.get(zabbix_url, method, params, period)
+        if rows is not None:
+            return rows
+        result = fetch()
+        if isinstance(result, (list, TrendTable)):
+            self.set(zabbix_url, method, params, period, result)
+        return result
+
+    # --- Manutenção ---
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _entries(self):
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(self.SUFFIX):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def _account(self, delta):
+        """Soma a gravação ao total em memória; varre o diretório só acima do limite ou a cada _RESCAN_WRITES gravações."""
+        with self._lock:
+            self._writes += 1
+            if self._size is not None and self._writes % _RESCAN_WRITES:
+                self._size += delta
+                if self._size <= self.max_bytes:
+                    return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = list(self._entries())
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                for path, size, _ in sorted(entries, key=lambda e: e[2]):
+                    self._remove(path)
+                    total -= size
+                    if total <= self.max_bytes * 0.9:
+                        break
+            self._size = total
+
+    def clear(self):
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                self._remove(path)
+            self._size = 0
+
+
+def configure_zabbix_cache(app_config):
+    """Aplica diretório/limite/TTL do cache em disco definidos na configuração da aplicação."""
+    global _CACHE
+    _CACHE_DEFAULTS.update({
+        'enabled': app_config.get('ZABBIX_CACHE_ENABLED', _CACHE_DEFAULTS['enabled']),
+        'directory': app_config.get('ZABBIX_CACHE_DIR', _CACHE_DEFAULTS['directory']),
+        'max_bytes': app_config.get('ZABBIX_CACHE_MAX_MB', _CACHE_DEFAULTS['max_bytes'] // (1024 * 1024)) * 1024 * 1024,
+        'open_ttl': app_config.get('ZABBIX_CACHE_OPEN_TTL', _CACHE_DEFAULTS['open_ttl']),
+    })
+    with _CACHE_LOCK:
+        _CACHE = None
+
+
+def get_zabbix_cache():
+    """Retorna o cache em disco compartilhado, ou None se estiver desabilitado."""
+    global _CACHE
+    if not _CACHE_DEFAULTS['enabled']:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            try:
+                _CACHE = ZabbixDiskCache(
+                    _CACHE_DEFAULTS['directory'],
+                    max_bytes=_CACHE_DEFAULTS['max_bytes'],
+                    open_ttl=_CACHE_DEFAULTS['open_ttl'],
+                )
+            except OSError as e:
+                logging.error(f"[ZabbixDiskCache] Diretório de cache indisponível, cache desabilitado: {e}")
+                return None
+        return _CACHE
@@ -62,6 +62,8 @@ class Config:
     # --- Pastas (absolutas) ---
     UPLOAD_FOLDER = str((BASE_DIR / (os.getenv("UPLOAD_FOLDER") or "uploads")).resolve())
     GENERATED_REPORTS_FOLDER = str((BASE_DIR / (os.getenv("GENERATED_REPORTS_FOLDER") or "relatorios_gerados")).resolve())
+    ZABBIX_CACHE_DIR = str((BASE_DIR / (os.getenv("ZABBIX_CACHE_DIR") or "zabbix_cache")).resolve())
+    CHART_CACHE_DIR = str((BASE_DIR / (os.getenv("CHART_CACHE_DIR") or "chart_cache")).resolve())
 
     # --- Uploads / tamanhos ---
     ALLOWED_EXTENSIONS = set(
@@ -75,7 +77,43 @@ class Config:
     ZABBIX_URL = os.getenv("ZABBIX_URL")
     ZABBIX_USER = os.getenv("ZABBIX_USER")
     ZABBIX_PASSWORD = os.getenv("ZABBIX_PASSWORD")  # ⚠ nunca logar
-    ZABBIX_TOKEN = os.getenv("ZABBIX_TOKEN")  # opcional (debug apenas)
+    ZABBIX_TOKEN = os.getenv("ZABBIX_TOKEN")  # opcional: API token (Zabbix 5.4+), dispensa user.login
+    ZABBIX_SESSION_IDLE_SECONDS = _int(os.getenv("ZABBIX_SESSION_IDLE_SECONDS"), 600)  # sessão ociosa => novo login (0 = só quando expirar)
+    ZABBIX_POOL_SIZE = _int(os.getenv("ZABBIX_POOL_SIZE"), 10)  # conexões HTTP reutilizáveis por servidor
+    ZABBIX_KEEPALIVE = _bool(os.getenv("ZABBIX_KEEPALIVE"), True)
+    ZABBIX_GZIP = _bool(os.getenv("ZABBIX_GZIP"), True)
+    ZABBIX_TIMEOUT = _int(os.getenv("ZABBIX_TIMEOUT"), 120)  # segundos
+    ZABBIX_ASYNC_CONCURRENCY = _int(os.getenv("ZABBIX_ASYNC_CONCURRENCY"), 8)  # chamadas em voo por servidor (loop assíncrono)
+    ZABBIX_TREND_WORKERS = _int(os.getenv("ZABBIX_TREND_WORKERS"), 4)  # trend.get simultâneos por coleta
+    ZABBIX_TREND_CHUNK_ITEMS = _int(os.getenv("ZABBIX_TREND_CHUNK_ITEMS"), 100)  # lote inicial (adaptativo)
+    ZABBIX_TREND_TARGET_ROWS = _int(os.getenv("ZABBIX_TREND_TARGET_ROWS"), 50000)  # linhas alvo por resposta
+    ZABBIX_EVENT_WORKERS = _int(os.getenv("ZABBIX_EVENT_WORKERS"), 4)  # janelas de event.get simultâneas
+    ZABBIX_EVENT_WINDOW_ROWS = _int(os.getenv("ZABBIX_EVENT_WINDOW_ROWS"), 20000)  # eventos estimados por janela
+    ZABBIX_EVENTS_PER_OBJECT_DAY = _int(os.getenv("ZABBIX_EVENTS_PER_OBJECT_DAY"), 2)  # estimativa quando countOutput falha
+    ZABBIX_CACHE_ENABLED = _bool(os.getenv("ZABBIX_CACHE_ENABLED"), True)  # cache em disco de meses fechados
+    ZABBIX_CACHE_MAX_MB = _int(os.getenv("ZABBIX_CACHE_MAX_MB"), 512)  # acima disso remove entradas menos usadas
+    ZABBIX_CACHE_OPEN_TTL = _int(os.getenv("ZABBIX_CACHE_OPEN_TTL"), 900)  # segundos (mês corrente / item.get)
+    CLIENT_CAPABILITY_TTL = _int(os.getenv("CLIENT_CAPABILITY_TTL"), 600)  # módulos/interfaces por cliente (0 = sem cache)
+
+    # --- Geração de relatórios ---
+    REPORT_PARALLEL_MODULES = _bool(os.getenv("REPORT_PARALLEL_MODULES"), True)  # módulos coletados em paralelo
+    REPORT_MODULE_WORKERS = _int(os.getenv("REPORT_MODULE_WORKERS"), 4)  # threads por relatório
+    REPORT_SLA_LOOKBACK_DAYS = _int(os.getenv("REPORT_SLA_LOOKBACK_DAYS"), 30)  # problemas abertos antes do mês
+    REPORT_TREND_WEIGHTED = _bool(os.getenv("REPORT_TREND_WEIGHTED"), False)  # médias de trends ponderadas por num
+    REPORT_WORKERS = _int(os.getenv("REPORT_WORKERS"), 2)  # gerações simultâneas por processo (0 = não consome a fila)
+    REPORT_MAX_JOBS_PER_ZABBIX = _int(os.getenv("REPORT_MAX_JOBS_PER_ZABBIX"), 2)  # entre todos os processos
+    REPORT_JOB_POLL_SECONDS = _int(os.getenv("REPORT_JOB_POLL_SECONDS"), 2)
+    REPORT_JOB_STALE_SECONDS = _int(os.getenv("REPORT_JOB_STALE_SECONDS"), 300)  # sem heartbeat => job interrompido
+    REPORT_JOB_MAX_ATTEMPTS = _int(os.getenv("REPORT_JOB_MAX_ATTEMPTS"), 2)
+    REPORT_PROGRESS_SSE = _bool(os.getenv("REPORT_PROGRESS_SSE"), True)  # só vale em servidor com threads (gthread)
+    REPORT_PROGRESS_STREAM_SECONDS = _int(os.getenv("REPORT_PROGRESS_STREAM_SECONDS"), 120)  # SSE reconecta após isso
+    REPORT_PROFILER = (os.getenv("REPORT_PROFILER") or "cprofile").strip().lower()  # cprofile | pyinstrument
+    CHART_RENDER_PROCESSES = _int(os.getenv("CHART_RENDER_PROCESSES"), 2)  # 0 = renderiza na thread do relatório
+    CHART_CACHE_ENABLED = _bool(os.getenv("CHART_CACHE_ENABLED"), True)  # PNGs reaproveitados por hash do spec
+    CHART_CACHE_MEMORY_MB = _int(os.getenv("CHART_CACHE_MEMORY_MB"), 64)
+    CHART_CACHE_DISK_MB = _int(os.getenv("CHART_CACHE_DISK_MB"), 256)  # 0 = só memória
+    PDF_RENDER_PROCESSES = _int(os.getenv("PDF_RENDER_PROCESSES"), 2)  # seções do miolo em paralelo (0 = pisa único)
+    PDF_SECTION_MODE = (os.getenv("PDF_SECTION_MODE") or "newpage").strip().lower()  # newpage | module
 
     # --- Superadmin ---
     SUPERADMIN_PASSWORD = os.getenv("SUPERADMIN_PASSWORD")
@@ -88,6 +126,8 @@ class Config:
     # --- Logging / observabilidade ---
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     LOG_JSON = _bool(os.getenv("LOG_JSON"), True)
+    METRICS_ENABLED = _bool(os.getenv("METRICS_ENABLED"), True)  # endpoint /metrics (Prometheus)
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # exige "Authorization: Bearer <token>"; vazio = /metrics não é servido
 
     # --- Proxy / URL building ---
     PREFERRED_URL_SCHEME = os.getenv("PREFERRED_URL_SCHEME", "https")
@@ -0,0 +1,16 @@
+# gunicorn.conf.py
+# Uso: gunicorn -c gunicorn.conf.py -w 4 -b 0.0.0.0:5000 'run:app'
+import os
+
+# Threads por processo: cada stream de progresso (SSE) aberto ocupa uma enquanto dura
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+
+
+def post_worker_init(worker):
+    """
+    Sobe os workers da fila de relatórios em cada processo do gunicorn, depois do
+    fork e da carga da app (funciona com e sem --preload).
+    """
+    from app.jobs import start_report_workers
+    start_report_workers(worker.wsgi)
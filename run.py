@@ -37,5 +37,12 @@ if __name__ == "__main__":
     if debug:
         logger.warning("⚠️ Rodando em modo DEBUG. Não use em produção!")
 
+    # Com o reloader, este bloco roda no observador e no processo servidor (WERKZEUG_RUN_MAIN);
+    # só o servidor consome a fila de relatórios
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from app.jobs import start_report_workers
+        start_report_workers(app)
+
     app.run(host=host, port=port, debug=debug)
-    # 🚨 Em produção use: gunicorn -w 4 -b 0.0.0.0:5000 'run:app'
+    # 🚨 Em produção use: gunicorn -c gunicorn.conf.py -w 4 -b 0.0.0.0:5000 'run:app'
+    #    (o gunicorn.conf.py sobe os workers da fila de relatórios em cada processo)
@@ -4,6 +4,7 @@ import functools
 import json
 import logging
 import os
+import threading
 import time
 import uuid
 from typing import Any, Callable, Iterable, Mapping, Optional
@@ -66,6 +67,25 @@ def _scrub_mapping(d: Mapping[str, Any]) -> Mapping[str, Any]:
             cleaned[k] = v
     return cleaned
 
+# Agregados por função instrumentada (chamadas, erros, tempo total/máximo), expostos em /metrics
+_STATS: dict = {}
+_STATS_LOCK = threading.Lock()
+
+def _record_stats(label: str, seconds: float, failed: bool) -> None:
+    with _STATS_LOCK:
+        entry = _STATS.get(label)
+        if entry is None:
+            entry = _STATS[label] = {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0}
+        entry["calls"] += 1
+        entry["errors"] += int(failed)
+        entry["seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+def debug_stats() -> dict:
+    """Cópia dos agregados por função decorada com with_debug."""
+    with _STATS_LOCK:
+        return {label: dict(entry) for label, entry in _STATS.items()}
+
 def _now_ms() -> float:
     return time.perf_counter() * 1000.0
 
@@ -121,10 +141,12 @@ def with_debug(name: Optional[str] = None) -> Callable[[Callable[..., Any]], Cal
             }))
 
             out = None
+            failed = False
             try:
                 out = fn(*args, **kwargs)
                 return out
             except Exception as e:
+                failed = True
                 LOG.exception(_safe_serialize({
                     "rid": rid,
                     "evt": "error",
@@ -135,6 +157,7 @@ def with_debug(name: Optional[str] = None) -> Callable[[Callable[..., Any]], Cal
                 raise
             finally:
                 dt = max(_now_ms() - t0, 0.01)
+                _record_stats(label, dt / 1000.0, failed)
                 result_info = {"type": None, "len": None}
                 try:
                     if isinstance(out, (str, bytes)):